@@ -14,19 +14,58 @@ After deploy, Modal prints the web endpoint URL. Add it to .env:
 
 Call:
     POST <URL>
-    Content-Type: audio/wav
-    Body: raw WAV bytes
+    Content-Type: audio/x-classrec-pcm   raw samples, decoded in memory (live chunks)
+                  audio/flac, audio/ogg (Opus), audio/wav
+                                         16kHz mono is decoded in memory too
+                  anything else ffmpeg reads — uploads; through a temp file
+    Body: the audio bytes
+
+    audio/x-classrec-pcm is a 12-byte header then the samples, little-endian:
+        magic "CRPC" | version u16 = 1 | dtype u16 (1 int16, 2 float16) | rate u32
+    Written by encode_pcm in src/audio.py, which this mirrors.
 
 Response:
     JSON array: [{"word": str, "start": float, "end": float}, ...]
+
+Streaming — the same words, a segment at a time, as Whisper decodes them:
+    POST <URL>/stream          same bodies as /, decodable in memory (PCM, FLAC, ...)
+    Response: application/x-ndjson, one JSON object per line —
+        {"words": [...]}                  each segment's words, as it is decoded
+        {"done": true, "words": [...]}    last: every word, the final answer
+
+Warm-up — start a container and load the model, transcribing nothing:
+    POST <URL>/warmup          → {"ok": true, "loaded_in": <seconds, 0 if it already was>}
+
+Batch — several clips, usually from different recordings, in one request:
+    POST <URL>/batch
+    Content-Type: application/x-classrec-batch
+    Body: one line of JSON, then the clips back to back:
+          {"items": [{"size": <bytes>, "type": "audio/wav"}, ...]}\n<clip 1><clip 2>...
+
+Response:
+    JSON array, one entry per clip, in order — a word array as above, or
+    {"error": str} for a clip that could not be decoded.
 """
 
+import json
+
 import modal
 from starlette.requests import Request
 
 MODEL_DIR = "/models/whisper"
 MODEL_NAME = "large-v3"
 
+SAMPLE_RATE = 16000
+
+# The in-memory body format — see the module docstring and src/audio.py.
+PCM_CONTENT_TYPE = "audio/x-classrec-pcm"
+PCM_MAGIC        = b"CRPC"
+PCM_VERSION      = 1
+PCM_HEADER_SIZE  = 12
+# Whisper's window. Each clip of a batch gets a slot this long to itself, so the
+# pipeline cannot merge two clips into one window — see _transcribe_batch.
+SLOT_SEC = 30
+
 # ======= IMAGE =======
 # Bake the model into the image layer so it's cached across cold starts.
 # run_function() executes _download_model() once during image build, not at runtime.
@@ -59,6 +98,142 @@ app = modal.App("classrec-whisper", image=image)
 # warm. Most of that is booting the container and pulling a multi-GB CUDA image,
 # not the model itself.
 _model = None
+_batched = None
+
+
+def _load():
+    global _model, _batched
+    if _model is None:
+        import stable_whisper
+        from faster_whisper import BatchedInferencePipeline
+        _model = stable_whisper.load_faster_whisper(
+            MODEL_NAME,
+            device="cuda",
+            compute_type="float16",
+            download_root=MODEL_DIR,
+        )
+        # Same weights, no second copy: the pipeline drives the model it is given.
+        _batched = BatchedInferencePipeline(model=_model)
+    return _model, _batched
+
+
+def _words(segments) -> list[dict]:
+    return [{"word": w.word.strip(), "start": float(w.start), "end": float(w.end)}
+            for segment in segments for w in segment.words]
+
+
+def _decode(data: bytes, content_type: str):
+    """
+    The body as a float32 array Whisper can take directly, or None if it needs
+    ffmpeg. No temp file and no subprocess for what the live server sends.
+    """
+    import io
+    import struct
+    import numpy as np
+
+    content_type = content_type.split(";")[0].strip().lower()
+    if content_type == PCM_CONTENT_TYPE:
+        magic, version, code, rate = struct.unpack_from("<4sHHI", data)
+        if magic != PCM_MAGIC or version != PCM_VERSION or code not in (1, 2):
+            raise ValueError("malformed PCM header")
+        if rate != SAMPLE_RATE:
+            raise ValueError(f"PCM must be {SAMPLE_RATE}Hz, got {rate}")
+        if code == 1:
+            return np.frombuffer(data, np.int16, offset=PCM_HEADER_SIZE) * np.float32(1 / 32768)
+        return np.frombuffer(data, np.float16, offset=PCM_HEADER_SIZE).astype(np.float32)
+    if content_type in ("audio/wav", "audio/x-wav", "audio/wave",
+                        "audio/flac", "audio/x-flac", "audio/ogg", "audio/opus"):
+        import soundfile as sf
+        clip, rate = sf.read(io.BytesIO(data), dtype="float32")
+        if rate == SAMPLE_RATE and clip.ndim == 1:
+            return clip
+    return None
+
+
+def _transcribe_one(audio_bytes: bytes, content_type: str) -> list[dict]:
+    """
+    One clip, through stable-ts. An array when _decode can make one; anything
+    else — an upload's mp3, a stereo WAV — through a temp file, so stable-ts can
+    have ffmpeg decode and resample it as it always did.
+    """
+    import tempfile
+    import os
+
+    model, _ = _load()
+    options = dict(language="en", word_timestamps=True, regroup=False)
+
+    audio = _decode(audio_bytes, content_type)
+    if audio is not None:
+        return _words(model.transcribe(audio, **options).segments)
+
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+        f.write(audio_bytes)
+        tmp_path = f.name
+
+    try:
+        result = model.transcribe(tmp_path, **options)
+    finally:
+        os.unlink(tmp_path)
+    return _words(result.segments)
+
+
+def _transcribe_batch(clips: list) -> list[list[dict]]:
+    """
+    Several clips in one batched decode — one pass of the encoder over all of
+    them, instead of one pass each with the GPU idle in between.
+
+    Each clip is laid in its own SLOT_SEC slot of one long array, zero-padded to
+    the end of the slot, and clip_timestamps marks the slots out. A full slot is
+    what Whisper would have padded a lone clip to anyway, so each clip is decoded
+    exactly as if it had come alone — and because no two slots fit in one window,
+    the pipeline never joins two recordings into the same decode. A word belongs
+    to the slot its start falls in, and is moved back to that clip's own time.
+
+    scripts/check-modal-batch.py posts clips through /batch and through / and
+    compares the text, against a deployed endpoint.
+
+    Faster-whisper's batched pipeline, not stable-ts: stable-ts has no batched
+    path, so batched words carry faster-whisper's own timestamps.
+    """
+    import numpy as np
+
+    _, batched = _load()
+    slot  = SLOT_SEC * SAMPLE_RATE
+    audio = np.zeros(slot * len(clips), dtype=np.float32)
+    for i, clip in enumerate(clips):
+        audio[i * slot: i * slot + len(clip)] = clip
+    segments, _ = batched.transcribe(
+        audio,
+        language="en",
+        word_timestamps=True,
+        vad_filter=False,
+        # In samples, not seconds: the batched pipeline slices the audio with
+        # these directly (collect_chunks), as it does the VAD's own timestamps.
+        # The words it returns are in seconds again.
+        clip_timestamps=[{"start": i * slot, "end": (i + 1) * slot}
+                         for i in range(len(clips))],
+        batch_size=len(clips),
+    )
+    out: list[list[dict]] = [[] for _ in clips]
+    for w in _words(segments):
+        i = min(len(clips) - 1, max(0, int(w["start"] // SLOT_SEC)))
+        length = len(clips[i]) / SAMPLE_RATE
+        if w["start"] - i * SLOT_SEC >= length:
+            continue        # in the padding — nothing was said there
+        out[i].append({"word": w["word"],
+                       "start": w["start"] - i * SLOT_SEC,
+                       "end": min(w["end"] - i * SLOT_SEC, length)})
+    return out
+
+
+def _split_batch(body: bytes) -> list[tuple[bytes, str]]:
+    header, _, rest = body.partition(b"\n")
+    items, pos = [], 0
+    for item in json.loads(header)["items"]:
+        items.append((rest[pos: pos + item["size"]], item.get("type", "audio/wav")))
+        pos += item["size"]
+    return items
+
 
 @app.function(
     gpu="T4",
@@ -70,56 +245,95 @@ _model = None
     # instead, at 1.0s per place in line. Two lets a genuinely sustained queue
     # (still there 43s later) buy a second container, which is the only case
     # where the cold start earns its cost.
+    #
+    # Batching is how a container does more without a third one: the server
+    # collects the chunks that arrive together into one /batch request.
     max_containers=2,
 )
-@modal.fastapi_endpoint(method="POST")
-async def transcribe(request: Request):
+@modal.asgi_app()
+def transcribe():
     """
-    Receive raw WAV bytes, return word-level timestamps as JSON.
-
-    Input:  POST body = raw WAV bytes
-    Output: [{"word": str, "start": float, "end": float}, ...]
+    The endpoint. Still one function named `transcribe`, so the URL is the one
+    already in MODAL_WHISPER_URL; `/` behaves exactly as the old single endpoint.
 
     Why transcribe the full chunk before any filtering?
     Whisper needs full audio context for accurate transcription.
     Filtering by speaker happens in main.py after this returns.
     """
-    import tempfile
-    import os
-    import stable_whisper
+    from fastapi import FastAPI
 
-    global _model
-    if _model is None:
-        _model = stable_whisper.load_faster_whisper(
-            MODEL_NAME,
-            device="cuda",
-            compute_type="float16",
-            download_root=MODEL_DIR,
-        )
+    web = FastAPI()
 
-    audio_bytes = await request.body()
+    @web.post("/")
+    async def one(request: Request):
+        """POST body = audio bytes → [{"word", "start", "end"}, ...]"""
+        return _transcribe_one(await request.body(),
+                               request.headers.get("content-type", ""))
 
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-        f.write(audio_bytes)
-        tmp_path = f.name
+    @web.post("/stream")
+    async def stream(request: Request):
+        """
+        Words as they are decoded, not when the whole clip is. The server shows
+        them as interim text, so the page is no longer blank for the length of
+        a chunk plus the round trip and then filled all at once.
 
-    try:
-        result = _model.transcribe(
-            tmp_path,
-            language="en",
-            word_timestamps=True,
-            regroup=False,
-        )
-    finally:
-        os.unlink(tmp_path)
+        faster-whisper's own transcribe, which stable-ts keeps as
+        transcribe_original: it yields segments lazily, where stable-ts's
+        returns only once every segment is done. So streamed words carry
+        faster-whisper's timestamps, as /batch's do — the final ones included.
+        scripts/check-modal-stream.py measures how far they move from /'s.
+        """
+        from fastapi import HTTPException
+        from fastapi.responses import StreamingResponse
+
+        audio = _decode(await request.body(), request.headers.get("content-type", ""))
+        if audio is None:
+            raise HTTPException(415, "stream bodies must be PCM, or 16kHz mono FLAC/Opus/WAV")
+
+        def lines():
+            # A plain generator: Starlette runs it in a thread, so the decode
+            # does not hold the event loop between segments.
+            model, _ = _load()
+            segments, _ = model.transcribe_original(
+                audio, language="en", word_timestamps=True, vad_filter=False)
+            words = []
+            for segment in segments:
+                new = _words([segment])
+                words.extend(new)
+                yield json.dumps({"words": new}) + "\n"
+            yield json.dumps({"done": True, "words": words}) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @web.post("/warmup")
+    async def warmup():
+        """Load the model if this container has not, and return. The server calls
+        this when a lecture starts, so the cold start is paid while the first
+        chunk is still being recorded instead of after it is sent."""
+        import time
+        t0 = time.perf_counter()
+        _load()
+        return {"ok": True, "loaded_in": round(time.perf_counter() - t0, 2)}
 
-    words = []
-    for segment in result.segments:
-        for w in segment.words:
-            words.append({
-                "word": w.word.strip(),
-                "start": float(w.start),
-                "end": float(w.end),
-            })
+    @web.post("/batch")
+    async def batch(request: Request):
+        """Several clips → one word list per clip, in order. See the module docstring."""
+        items = _split_batch(await request.body())
+        clips, errors = [], {}
+        for i, (data, content_type) in enumerate(items):
+            try:
+                clip = _decode(data, content_type)
+                if clip is None:
+                    raise ValueError("batch clips must be PCM, or 16kHz mono FLAC/Opus/WAV")
+                if len(clip) > SLOT_SEC * SAMPLE_RATE:
+                    raise ValueError(f"at most {SLOT_SEC}s per clip")
+                clips.append((i, clip))
+            except Exception as e:
+                errors[i] = {"error": str(e)}
+        results = _transcribe_batch([c for _, c in clips]) if clips else []
+        out = dict(errors)
+        for (i, _), words in zip(clips, results):
+            out[i] = words
+        return [out[i] for i in range(len(items))]
 
-    return words
+    return web
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""Allocations and time on the socket's audio path, per chunk.
+
+Feeds a recording's worth of 4096-sample packets — what the browser's script
+processor sends — through the old path (bytearray, bytes() to cut a chunk,
+del to drop it, the five-array pcm_to_float) and the new one (AudioBuffer, a view
+per chunk, the in-place pcm_to_float), and reports the peak memory tracemalloc
+saw and the time each spends per chunk. Also checks the new path's chunks are
+the audio that was sent, sample for sample.
+
+Run:
+    python scripts/bench-audio-buffer.py
+    python scripts/bench-audio-buffer.py --minutes 60
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from audio import AudioBuffer, pcm_to_float                              # noqa: E402
+
+SAMPLE_RATE   = 16000
+CHUNK_SAMPLES = SAMPLE_RATE * 10
+CHUNK_BYTES   = CHUNK_SAMPLES * 2
+FRAME         = 4096
+
+
+def _old_pcm_to_float(pcm_bytes):
+    samples = np.frombuffer(pcm_bytes, dtype=np.int16).astype(np.float32) / 32768.0
+    if np.abs(samples).max() > 0:
+        samples = samples / np.abs(samples).max()
+    return samples
+
+
+def run_old(packets, sink):
+    buf = bytearray()
+    for packet in packets:
+        buf.extend(packet)
+        if len(buf) >= CHUNK_BYTES:
+            chunk = bytes(buf)
+            del buf[:CHUNK_BYTES]
+            sink(_old_pcm_to_float(chunk))
+
+
+def run_new(packets, sink):
+    buf = AudioBuffer(CHUNK_SAMPLES * 2)
+    for packet in packets:
+        buf.write(packet)
+        if buf.buffered >= CHUNK_SAMPLES:
+            sink(pcm_to_float(buf.take(CHUNK_SAMPLES)))
+
+
+def _sink():
+    # The pipeline keeps each chunk's float array until it is transcribed, which
+    # costs the same on both paths. Dropped here, so the peak is the path's own:
+    # its buffer plus whatever it allocates to produce one chunk.
+    return lambda a: None
+
+
+def timed(run, packets, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run(packets, _sink())
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def peak_bytes(run, packets):
+    # Separate from the timing: tracemalloc hooks every allocation and would
+    # bill its own overhead to whichever path allocates more often.
+    tracemalloc.start()
+    run(packets, _sink())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main(args):
+    rng = np.random.default_rng(0)
+    total = int(args.minutes * 60 * SAMPLE_RATE)
+    pcm = (rng.standard_normal(total) * 3000).clip(-32768, 32767).astype(np.int16)
+    packets = [pcm[i:i + FRAME].tobytes() for i in range(0, total, FRAME)]
+    n_chunks = total // CHUNK_SAMPLES
+
+    # Sample-exact: every chunk is the next 10s of what was sent.
+    got = []
+    run_new(packets, lambda a: got.append(a))
+    for i, chunk in enumerate(got):
+        assert np.allclose(chunk, _old_pcm_to_float(pcm[i * CHUNK_SAMPLES:(i + 1) * CHUNK_SAMPLES].tobytes())), i
+    print(f"{len(got)} chunks, sample-exact against the sent audio")
+
+    for name, run in (("old", run_old), ("new", run_new)):
+        elapsed = timed(run, packets, args.repeat)
+        peak = peak_bytes(run, packets)
+        print(f"{name}: {elapsed / n_chunks * 1000:.3f} ms/chunk  "
+              f"peak {peak / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--minutes", type=float, default=10.0)
+    ap.add_argument("--repeat", type=int, default=3)
+    main(ap.parse_args())
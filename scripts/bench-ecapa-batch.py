@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+"""ECAPA-TDNN throughput, a segment at a time against a chunk's segments batched.
+
+Builds --chunks chunks of segments the way Step 3 hands them over — a few per
+chunk, 0.5s to 8s — and embeds every chunk's segments three ways:
+
+    single    one forward pass per segment (get_embedding as it was)
+    batched   TorchSpeakerEncoder.embed on the chunk's segments, split by --max-padding
+    shared    as batched, through an EmbeddingBatcher with --wait-ms, so chunks
+              embedded at the same moment share forward passes
+
+on --workers threads at once with torch held to one thread each — the 2 vCPU
+droplet's profile, two pipelines of INFERENCE_THREADS=1. Reports chunks/sec for
+each, and how far the batched embeddings are from the single ones: the lowest
+cosine between the two, the largest change in similarity to a reference
+speaker, and how many segments would change side of SIMILARITY_THRESHOLD.
+
+Needs torch and speechbrain, and the model in models/ecapa_tdnn. Use a recording
+(--wav) for the accuracy numbers to mean anything; synthetic audio only times.
+--random-init builds the same network, front end included, with untrained
+weights, for a machine without the model: the timings hold, and the drift says
+how far padding reaches into this architecture — but only the trained model's
+numbers say whether ECAPA_MAX_PADDING can be raised.
+
+Run:
+    python scripts/bench-ecapa-batch.py
+    python scripts/bench-ecapa-batch.py --wav lecture.wav --chunks 40 --workers 2
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from speaker_encoder import TorchSpeakerEncoder, EmbeddingBatcher        # noqa: E402
+
+SAMPLE_RATE          = 16000
+SIMILARITY_THRESHOLD = 0.20
+
+
+def random_ecapa():
+    """spkrec-ecapa-voxceleb's encode_batch — Fbank, per-sentence mean
+    normalisation, ECAPA-TDNN — with untrained weights."""
+    import torch
+    from speechbrain.lobes.features import Fbank
+    from speechbrain.lobes.models.ECAPA_TDNN import ECAPA_TDNN
+    from speechbrain.processing.features import InputNormalization
+
+    class RandomEcapa(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.compute_features = Fbank(n_mels=80)
+            self.mean_var_norm    = InputNormalization(norm_type="sentence", std_norm=False)
+            self.embedding_model  = ECAPA_TDNN(
+                input_size=80, channels=[1024, 1024, 1024, 1024, 3072],
+                kernel_sizes=[5, 3, 3, 3, 1], dilations=[1, 2, 3, 4, 1],
+                attention_channels=128, lin_neurons=192)
+
+        def encode_batch(self, wavs, wav_lens):
+            feats = self.mean_var_norm(self.compute_features(wavs), wav_lens)
+            return self.embedding_model(feats, wav_lens)
+
+    torch.manual_seed(0)
+    return RandomEcapa()
+
+
+def make_chunks(source, n, seed=0):
+    """n chunks of segments cut from `source`, 2–6 per chunk, 0.5–8s each."""
+    rng = np.random.default_rng(seed)
+    chunks = []
+    for _ in range(n):
+        segs = []
+        for _ in range(int(rng.integers(2, 7))):
+            length = int(rng.uniform(0.5, 8.0) * SAMPLE_RATE)
+            start  = int(rng.integers(0, len(source) - length))
+            segs.append(source[start:start + length])
+        chunks.append(segs)
+    return chunks
+
+
+def synthetic(seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    voice = np.sin(2 * np.pi * 140 * t * (1 + 0.3 * np.sin(2 * np.pi * 4 * t)))
+    return (0.3 * voice + 0.02 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+def throughput(embed_chunk, chunks, workers):
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(embed_chunk, chunks[:workers]))          # warm-up
+        t0 = time.perf_counter()
+        results = list(pool.map(embed_chunk, chunks))
+        return len(chunks) / (time.perf_counter() - t0), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=2, help="pipelines at once")
+    parser.add_argument("--max-padding", type=float, default=0.5)
+    parser.add_argument("--wait-ms", type=int, default=20)
+    parser.add_argument("--wav", help="16kHz mono speech to cut segments from")
+    parser.add_argument("--random-init", action="store_true",
+                        help="untrained weights, without models/ecapa_tdnn")
+    args = parser.parse_args()
+
+    import torch
+    torch.set_num_threads(1)
+    torch.backends.nnpack.enabled = False
+    if args.random_init:
+        model = random_ecapa()
+    else:
+        from speechbrain.inference.speaker import EncoderClassifier
+        model = EncoderClassifier.from_hparams(
+            source="speechbrain/spkrec-ecapa-voxceleb",
+            savedir=str(ROOT / "models" / "ecapa_tdnn"),
+            run_opts={"device": "cpu"},
+        )
+    model.eval()
+
+    if args.wav:
+        import soundfile as sf
+        source, rate = sf.read(args.wav, dtype="float32")
+        if rate != SAMPLE_RATE or source.ndim != 1:
+            raise SystemExit("--wav must be 16kHz mono")
+    else:
+        source = synthetic(120)
+    chunks = make_chunks(source, args.chunks)
+    print(f"{len(chunks)} chunks, {sum(map(len, chunks))} segments, "
+          f"{sum(len(s) for c in chunks for s in c) / SAMPLE_RATE:.0f}s of audio, "
+          f"{args.workers} workers at 1 torch thread each")
+
+    encoder = TorchSpeakerEncoder(model, max_padding=args.max_padding)
+    shared  = EmbeddingBatcher(encoder, wait_ms=args.wait_ms)
+    modes = {
+        "single":  lambda segs: np.vstack([encoder.embed([s]) for s in segs]),
+        "batched": encoder.embed,
+        "shared":  shared.embed,
+    }
+    results = {}
+    for name, fn in modes.items():
+        rate, results[name] = throughput(fn, chunks, args.workers)
+        print(f"  {name:8s} {rate:6.2f} chunks/s")
+
+    # The reference speaker: the source's first 10s, embedded alone.
+    reference = encoder.embed([source[:10 * SAMPLE_RATE]])[0]
+    single  = np.vstack(results["single"])
+    for name in ("batched", "shared"):
+        other = np.vstack(results[name])
+        cos   = np.sum(single * other, axis=1)
+        s_sim, o_sim = single @ reference, other @ reference
+        flips = int(np.sum((s_sim >= SIMILARITY_THRESHOLD) != (o_sim >= SIMILARITY_THRESHOLD)))
+        print(f"  {name} vs single: lowest cosine {cos.min():.5f}, "
+              f"largest similarity change {np.abs(s_sim - o_sim).max():.5f}, "
+              f"{flips} of {len(cos)} decisions changed")
+
+
+if __name__ == "__main__":
+    main()
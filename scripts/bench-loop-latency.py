@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""Event-loop latency while recordings write to the database.
+
+Every chunk of every recording writes twice — the chunk row and the usage
+increment. Done with the sync session on the loop, each commit stops the loop
+for as long as SQLite takes, and every other socket's audio waits behind it.
+This measures that directly: N simulated recordings write on a schedule while a
+probe sleeps 5ms at a time and records how late it wakes up.
+
+Run both and compare:
+    python scripts/bench-loop-latency.py --mode sync
+    python scripts/bench-loop-latency.py --mode async
+
+Time is compressed — a chunk every --period seconds rather than every ten — so
+a few seconds of run is many minutes of lecture's worth of writes. The database
+is a throwaway file in a temp directory; nothing touches data/classrec.db.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from sqlalchemy import create_engine, event, update                    # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker                                # noqa: E402
+
+import repository as repo                                              # noqa: E402
+from database import _sqlite_pragmas                                   # noqa: E402
+from models import Base, User                                          # noqa: E402
+
+PROBE_SEC = 0.005
+WORDS = [{"w": "word", "s": i * 0.4, "e": i * 0.4 + 0.3} for i in range(25)]
+
+
+def _engines(path: Path):
+    sync_engine = create_engine(f"sqlite:///{path}",
+                                connect_args={"check_same_thread": False})
+    event.listen(sync_engine, "connect", _sqlite_pragmas)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+    Base.metadata.create_all(sync_engine)
+    return (sync_engine, async_engine,
+            sessionmaker(bind=sync_engine, expire_on_commit=False),
+            async_sessionmaker(bind=async_engine, expire_on_commit=False))
+
+
+async def _recording_sync(Sessions, user_id, session_id, period, stop, counts):
+    idx = 0
+    while not stop.is_set():
+        with Sessions() as db:
+            repo.add_chunk(db, session_id=session_id, idx=idx, text="text " * 25, words=WORDS)
+        with Sessions() as db:
+            db.execute(update(User).where(User.id == user_id)
+                       .values(live_seconds=User.live_seconds + 10))
+            db.commit()
+            db.get(User, user_id)
+        idx += 1
+        counts[0] += 1
+        await asyncio.sleep(period)
+
+
+async def _recording_async(ASessions, user_id, session_id, period, stop, counts):
+    idx = 0
+    while not stop.is_set():
+        async with ASessions() as db:
+            await repo.add_chunks_async(db, [dict(session_id=session_id, idx=idx,
+                                                  text="text " * 25, words=WORDS)])
+        async with ASessions() as db:
+            await db.execute(update(User).where(User.id == user_id)
+                             .values(live_seconds=User.live_seconds + 10))
+            await db.commit()
+            await db.get(User, user_id)
+        idx += 1
+        counts[0] += 1
+        await asyncio.sleep(period)
+
+
+async def _probe(stop, lags):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(PROBE_SEC)
+        lags.append(time.perf_counter() - t0 - PROBE_SEC)
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        sync_engine, async_engine, Sessions, ASessions = _engines(Path(tmp) / "bench.db")
+        with Sessions() as db:
+            ids = []
+            for n in range(args.recordings):
+                u = User(clerk_user_id=f"bench_{n}")
+                db.add(u); db.commit()
+                ids.append((u.id, repo.start_session(db, user_id=u.id, voice_id=None,
+                                                     title="bench").id))
+
+        stop, lags, counts = asyncio.Event(), [], [0]
+        run = _recording_sync if args.mode == "sync" else _recording_async
+        factory = Sessions if args.mode == "sync" else ASessions
+        tasks = [asyncio.create_task(run(factory, uid, sid, args.period, stop, counts))
+                 for uid, sid in ids]
+        probe = asyncio.create_task(_probe(stop, lags))
+        await asyncio.sleep(args.seconds)
+        stop.set()
+        await asyncio.gather(probe, *tasks)
+        await async_engine.dispose()
+        sync_engine.dispose()
+
+    lags_ms = sorted(x * 1000 for x in lags)
+    p = lambda q: lags_ms[min(len(lags_ms) - 1, int(q * len(lags_ms)))]
+    print(f"mode={args.mode}  recordings={args.recordings}  period={args.period}s  "
+          f"chunks written={counts[0]}")
+    print(f"loop lag  p50={statistics.median(lags_ms):.2f}ms  p99={p(0.99):.2f}ms  "
+          f"max={lags_ms[-1]:.2f}ms  ({len(lags_ms)} probes)")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--mode", choices=["sync", "async"], default="async")
+    ap.add_argument("--recordings", type=int, default=50)
+    ap.add_argument("--period", type=float, default=0.5,
+                    help="seconds between a recording's chunks (10 in production)")
+    ap.add_argument("--seconds", type=float, default=10.0)
+    asyncio.run(main(ap.parse_args()))
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""Bytes on the wire, and time, for each MODAL_AUDIO_CODEC on a 10s chunk.
+
+Per codec: the body's size, the server's encode time, the endpoint's decode time
+(both as main.py and modal_whisper.py do them, with soundfile), the time that
+many bytes take on an uplink of --mbps, and the sum — the part of a round trip
+the codec decides. Lossy codecs also report how far the decoded audio is from
+the original (SNR).
+
+Run:
+    python scripts/bench-modal-codec.py
+    python scripts/bench-modal-codec.py --input lecture.wav --mbps 20
+    python scripts/bench-modal-codec.py --url "$MODAL_WHISPER_URL"
+
+--input takes any file soundfile reads; 10s from its middle, as 16kHz mono. The
+default is synthetic — voiced harmonics under a syllable envelope, with pauses
+and a room noise floor — which compresses more like speech than white noise
+does, but a real recording is the number to trust.
+
+--url also POSTs each body to a deployed endpoint and reports the real round
+trip, model included (take the second of several runs: the first may be cold).
+"""
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from audio import PCM_CONTENT_TYPE, decode_pcm, encode_pcm             # noqa: E402
+
+SAMPLE_RATE = 16000
+CODECS = {   # name: (format, subtype, content type) — as encode_for_modal in main.py
+    "wav":  ("WAV",  "PCM_16", "audio/wav"),
+    "flac": ("FLAC", "PCM_16", "audio/flac"),
+    "opus": ("OGG",  "OPUS",   "audio/ogg"),
+}
+
+
+def synthetic(seconds, rng):
+    t = np.arange(seconds * SAMPLE_RATE) / SAMPLE_RATE
+    f0 = 120 + 20 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12))
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 2
+    pauses = (np.sin(2 * np.pi * 0.25 * t) > -0.5).astype(float)
+    audio = voice * syllables * pauses + rng.standard_normal(len(t)) * 0.01
+    return (audio / np.abs(audio).max()).astype(np.float32)
+
+
+def load(path, seconds):
+    audio, rate = sf.read(path, dtype="float32", always_2d=True)
+    audio = audio.mean(axis=1)
+    if rate != SAMPLE_RATE:
+        idx = np.arange(0, len(audio), rate / SAMPLE_RATE)
+        audio = np.interp(idx, np.arange(len(audio)), audio).astype(np.float32)
+    mid, n = len(audio) // 2, seconds * SAMPLE_RATE
+    return audio[max(0, mid - n // 2): max(0, mid - n // 2) + n]
+
+
+def encoder(name):
+    if name == "pcm16":
+        return lambda s: encode_pcm(s, SAMPLE_RATE, np.int16), PCM_CONTENT_TYPE
+    fmt, subtype, content_type = CODECS[name]
+
+    def encode(s):
+        buf = io.BytesIO()
+        sf.write(buf, s, SAMPLE_RATE, format=fmt, subtype=subtype)
+        return buf.getvalue()
+    return encode, content_type
+
+
+def decoder(name):
+    if name == "pcm16":
+        return lambda b: decode_pcm(b)[0]
+    return lambda b: sf.read(io.BytesIO(b), dtype="float32")[0]
+
+
+def per_call_ms(fn, arg, repeat):
+    fn(arg)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg)
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def snr_db(ref, got):
+    n = min(len(ref), len(got))
+    # Opus delays its output; line the two up before comparing.
+    lag = int(np.argmax(np.correlate(got[:n], ref[:SAMPLE_RATE], "valid"))) if n > SAMPLE_RATE else 0
+    got = got[lag:lag + n]
+    n = min(len(ref), len(got))
+    noise = np.sum((ref[:n] - got[:n]) ** 2)
+    return float("inf") if noise == 0 else 10 * np.log10(np.sum(ref[:n] ** 2) / noise)
+
+
+def main(args):
+    rng = np.random.default_rng(0)
+    samples = load(args.input, args.seconds) if args.input else synthetic(args.seconds, rng)
+    client = None
+    if args.url:
+        import httpx
+        client = httpx.Client(timeout=120)
+
+    print(f"{len(samples) / SAMPLE_RATE:.0f}s chunk, uplink {args.mbps} Mbit/s")
+    print(f"{'codec':6s} {'bytes':>8s} {'ratio':>6s} {'enc ms':>7s} {'dec ms':>7s} "
+          f"{'wire ms':>8s} {'total':>7s} {'SNR dB':>7s}" + ("  round trip" if client else ""))
+    raw = len(samples) * 2
+    for name in ("wav", "pcm16", "flac", "opus"):
+        encode, content_type = encoder(name)
+        decode = decoder(name)
+        body = encode(samples)
+        enc = per_call_ms(encode, samples, args.repeat)
+        dec = per_call_ms(decode, body, args.repeat)
+        wire = len(body) * 8 / (args.mbps * 1e6) * 1000
+        line = (f"{name:6s} {len(body):8d} {len(body) / raw:6.2f} {enc:7.2f} {dec:7.2f} "
+                f"{wire:8.1f} {enc + dec + wire:7.1f} {snr_db(samples, decode(body)):7.1f}")
+        if client:
+            times = []
+            for _ in range(3):
+                t0 = time.perf_counter()
+                client.post(args.url, content=body,
+                            headers={"Content-Type": content_type}).raise_for_status()
+                times.append((time.perf_counter() - t0) * 1000)
+            line += f"  {sorted(times)[1]:8.0f} ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--input")
+    ap.add_argument("--seconds", type=int, default=10)
+    ap.add_argument("--mbps", type=float, default=10.0, help="uplink to Modal, Mbit/s")
+    ap.add_argument("--repeat", type=int, default=50)
+    ap.add_argument("--url", help="a deployed endpoint, to time real round trips")
+    main(ap.parse_args())
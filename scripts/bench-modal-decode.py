@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""Per-request overhead of getting a chunk from the server into Whisper.
+
+Everything the Modal endpoint does to a body before the model sees an array,
+and everything the server does to make the body, for one 10s chunk:
+
+    wav-tempfile  WAV written to a temp file and read back — what the endpoint
+                  did for every chunk. stable-ts then decodes it with ffmpeg;
+                  if ffmpeg is on PATH that process is timed too, as stable-ts
+                  runs it (s16le, 16kHz, mono, to a pipe).
+    wav-memory    WAV read from the body in memory (soundfile)
+    pcm16 / f16   the ClassRec PCM body (audio.encode_pcm / decode_pcm)
+
+Run:
+    python scripts/bench-modal-decode.py
+    python scripts/bench-modal-decode.py --repeat 200
+
+Not measured: the network, and the model. This is the part that was pure
+overhead, which is the part the PCM body removes.
+"""
+import argparse
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from audio import decode_pcm, encode_pcm                               # noqa: E402
+
+SAMPLE_RATE = 16000
+
+
+def wav_bytes(samples):
+    buf = io.BytesIO()
+    sf.write(buf, samples, SAMPLE_RATE, format="WAV")
+    return buf.getvalue()
+
+
+def wav_tempfile(body):
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+        f.write(body)
+        path = f.name
+    try:
+        if shutil.which("ffmpeg"):
+            out = subprocess.run(
+                ["ffmpeg", "-nostdin", "-threads", "0", "-i", path, "-f", "s16le",
+                 "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-"],
+                capture_output=True, check=True).stdout
+            return np.frombuffer(out, np.int16).astype(np.float32) / 32768
+        return sf.read(path, dtype="float32")[0]
+    finally:
+        os.unlink(path)
+
+
+def wav_memory(body):
+    return sf.read(io.BytesIO(body), dtype="float32")[0]
+
+
+def pcm(body):
+    return decode_pcm(body)[0]
+
+
+def per_call_ms(fn, arg, repeat):
+    fn(arg)                                   # warm: imports, page cache
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg)
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main(args):
+    rng = np.random.default_rng(0)
+    samples = (rng.standard_normal(SAMPLE_RATE * args.seconds) * 0.1).clip(-1, 1).astype(np.float32)
+
+    cases = [
+        ("wav-tempfile", wav_bytes,                                   wav_tempfile),
+        ("wav-memory",   wav_bytes,                                   wav_memory),
+        ("pcm16",        lambda s: encode_pcm(s, SAMPLE_RATE, np.int16),   pcm),
+        ("f16",          lambda s: encode_pcm(s, SAMPLE_RATE, np.float16), pcm),
+    ]
+    print(f"{args.seconds}s chunk, {args.repeat} calls each"
+          f"{'' if shutil.which('ffmpeg') else ' — ffmpeg not on PATH, its process is not timed'}")
+    for name, encode, decode in cases:
+        body = encode(samples)
+        back = decode(body)
+        assert len(back) == len(samples) and np.abs(back - samples).max() < 1e-2, name
+        print(f"{name:13s} encode {per_call_ms(encode, samples, args.repeat):7.3f} ms   "
+              f"decode {per_call_ms(decode, body, args.repeat):7.3f} ms   "
+              f"{len(body) / 1024:6.0f} KiB")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--seconds", type=int, default=10)
+    ap.add_argument("--repeat", type=int, default=100)
+    main(ap.parse_args())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""VAD and segmentation latency under each ONNX Runtime configuration.
+
+For each configuration, opens the model as ort_sessions.load_session would (or
+bare, as main.py used to) and reports:
+
+    load      time to open the session — cold, and from the optimised-model cache
+    vad       one 10s chunk through Silero, 312 windows, plain run() or IOBinding
+    seg       one 5s region through the segmentation model, if it is present
+
+Best of --repeat for each. Run it on the droplet it is meant for: thread counts
+that win on a laptop's eight cores say nothing about two.
+
+Run:
+    python scripts/bench-ort-sessions.py
+    python scripts/bench-ort-sessions.py --threads 1 2 --repeat 20
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import onnxruntime as ort
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from ort_sessions import load_session, VadStepper                        # noqa: E402
+
+SAMPLE_RATE = 16000
+WINDOW      = 512
+VAD_PATH    = ROOT / "models" / "silero_vad.onnx"
+SEG_PATH    = ROOT / "models" / "segmentation.onnx"
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def vad_chunk(session, samples, io_binding):
+    zeros = np.zeros((2, 1, 64), dtype=np.float32)
+    vad = VadStepper(session, zeros, zeros, io_binding=io_binding)
+    for i in range(0, len(samples) - WINDOW + 1, WINDOW):
+        vad.step(samples[i:i + WINDOW].reshape(1, WINDOW))
+
+
+def seg_region(session, samples):
+    session.run(None, {'input_values': samples.reshape(1, 1, -1)})
+
+
+def configurations(threads):
+    yield "bare InferenceSession (before)", None, False
+    for n in threads:
+        for level in ("basic", "extended", "all"):
+            yield f"{n} thread(s), {level}", (n, level), False
+        yield f"{n} thread(s), all, IOBinding", (n, "all"), True
+
+
+def open_session(path, config, cache_dir):
+    if config is None:
+        return ort.InferenceSession(str(path), providers=["CPUExecutionProvider"])
+    n, level = config
+    return load_session(path, intra_threads=n, level=level, cache_dir=cache_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    chunk  = (0.1 * rng.standard_normal(10 * SAMPLE_RATE)).astype(np.float32)
+    region = chunk[:5 * SAMPLE_RATE]
+    models = [("vad", VAD_PATH)] + ([("seg", SEG_PATH)] if SEG_PATH.exists() else [])
+    if not SEG_PATH.exists():
+        print(f"({SEG_PATH.name} not found — segmentation skipped)")
+
+    print(f"{'configuration':34} {'model':5} {'load cold':>10} {'load cached':>12} {'run':>10}")
+    for label, config, io_binding in configurations(args.threads):
+        for name, path in models:
+            if io_binding and name != "vad":
+                continue
+            with tempfile.TemporaryDirectory() as cache_dir:
+                cache = cache_dir if config is not None else None
+                t0 = time.perf_counter()
+                session = open_session(path, config, cache)
+                cold = time.perf_counter() - t0
+                cached = ""
+                if cache is not None:
+                    t0 = time.perf_counter()
+                    session = open_session(path, config, cache)
+                    cached = f"{(time.perf_counter() - t0) * 1000:9.1f}ms"
+            if name == "vad":
+                run = best_of(lambda: vad_chunk(session, chunk, io_binding), args.repeat)
+            else:
+                run = best_of(lambda: seg_region(session, region), args.repeat)
+            print(f"{label:34} {name:5} {cold * 1000:8.1f}ms {cached:>12} {run * 1000:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""Event-loop latency and throughput of the pipeline on threads against processes.
+
+PIPELINE_MODE=thread runs Steps 2-7 on the inference pool's threads;
+PIPELINE_MODE=process in worker processes, the chunk's audio handed over through
+shared memory. Both through inference_pool.InferencePool, as the server does.
+
+The work is a stand-in for Steps 2-7 built from the parts that run here without
+torch: Silero VAD a window at a time (a Python loop around the model, as
+get_vad_regions is), the scores turned into regions a frame at a time, and the
+speaker encoder's NumPy filterbank over the voiced audio. GIL-heavy in the same
+places the real pipeline is, which is the difference this measures.
+
+Two measurements per mode:
+
+    latency     --recordings simulated sockets each hand over a chunk every
+                --period seconds while a probe sleeps 5ms at a time on the loop
+                and records how late it wakes — how long every other socket's
+                audio would have waited
+    throughput  --burst chunks handed over at once, chunks/sec to drain them
+
+Time is compressed, as in bench-loop-latency.py: a chunk every --period seconds
+rather than every ten.
+
+Run:
+    python scripts/bench-pipeline-modes.py
+    python scripts/bench-pipeline-modes.py --workers 2 --recordings 20 --period 0.5
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from inference_pool import InferencePool                                 # noqa: E402
+from ort_sessions import load_session, VadStepper                        # noqa: E402
+from speaker_encoder import fbank                                        # noqa: E402
+
+SAMPLE_RATE = 16000
+WINDOW      = 512
+THRESHOLD   = 0.2
+PROBE_SEC   = 0.005
+
+_session = None
+_lock    = threading.Lock()
+
+
+def init_models() -> None:
+    """The model, once per process — per worker, or shared by the threads."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = load_session(ROOT / "models" / "silero_vad.onnx")
+
+
+def stand_in_pipeline(samples: np.ndarray) -> dict:
+    init_models()
+    zeros = np.zeros((2, 1, 64), dtype=np.float32)
+    vad = VadStepper(_session, zeros, zeros, sample_rate=SAMPLE_RATE)
+    scores = [vad.step(samples[i:i + WINDOW].reshape(1, WINDOW))
+              for i in range(0, len(samples) - WINDOW + 1, WINDOW)]
+    regions, start = [], None
+    for i, score in enumerate(scores):
+        t = i * WINDOW / SAMPLE_RATE
+        if score >= THRESHOLD and start is None:
+            start = t
+        elif score < THRESHOLD and start is not None:
+            regions.append((start, t))
+            start = None
+    if start is not None:
+        regions.append((start, len(samples) / SAMPLE_RATE))
+    clips = [samples[int(s * SAMPLE_RATE):int(e * SAMPLE_RATE)] for s, e in regions]
+    clips = [c for c in clips if len(c) >= WINDOW] or [samples]
+    for clip in clips:
+        fbank(clip[None, :], np.ones(1, dtype=np.float32))
+    return {"regions": regions}
+
+
+def chunk(seed: int) -> np.ndarray:
+    """10s of tone bursts and pauses, enough for the VAD to find regions."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(10 * SAMPLE_RATE) / SAMPLE_RATE
+    voice = np.sin(2 * np.pi * 200 * t * (1 + 0.5 * np.sin(2 * np.pi * 3 * t)))
+    gate = np.zeros_like(t, dtype=bool)
+    pos = 0.0
+    while pos < 10:
+        talk = rng.uniform(1.0, 4.0)
+        gate[int(pos * SAMPLE_RATE):int((pos + talk) * SAMPLE_RATE)] = True
+        pos += talk + rng.uniform(0.2, 1.0)
+    return (0.5 * voice * gate).astype(np.float32)
+
+
+def submit(pool, mode, samples):
+    if mode == "process":
+        return pool.run_in_process(stand_in_pipeline, samples)
+    return pool.run_gated(stand_in_pipeline, samples)
+
+
+async def _probe(stop, lags):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(PROBE_SEC)
+        lags.append(time.perf_counter() - t0 - PROBE_SEC)
+
+
+async def _recording(pool, mode, samples, period, stop, done):
+    while not stop.is_set():
+        await submit(pool, mode, samples)
+        done[0] += 1
+        await asyncio.sleep(period)
+
+
+async def run_mode(mode, args, chunks):
+    pool = InferencePool(args.workers, warmup=init_models,
+                         processes=args.workers if mode == "process" else 0,
+                         process_init=init_models)
+    await pool.start()
+    try:
+        await asyncio.gather(*(submit(pool, mode, c) for c in chunks[:args.workers]))
+
+        stop, lags, done = asyncio.Event(), [], [0]
+        tasks = [asyncio.create_task(_recording(pool, mode, chunks[i % len(chunks)],
+                                                args.period, stop, done))
+                 for i in range(args.recordings)]
+        probe = asyncio.create_task(_probe(stop, lags))
+        await asyncio.sleep(args.seconds)
+        stop.set()
+        await asyncio.gather(probe, *tasks)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(submit(pool, mode, chunks[i % len(chunks)])
+                               for i in range(args.burst)))
+        rate = args.burst / (time.perf_counter() - t0)
+    finally:
+        pool.shutdown()
+
+    lags_ms = sorted(x * 1000 for x in lags)
+    p = lambda q: lags_ms[min(len(lags_ms) - 1, int(q * len(lags_ms)))]
+    print(f"{mode:7s}  loop lag p50={statistics.median(lags_ms):6.2f}ms  p99={p(0.99):7.2f}ms  "
+          f"max={lags_ms[-1]:7.2f}ms   {done[0]} chunks under load   "
+          f"burst {rate:6.2f} chunks/s")
+
+
+async def main(args):
+    chunks = [chunk(i) for i in range(8)]
+    print(f"workers={args.workers}  recordings={args.recordings}  period={args.period}s  "
+          f"seconds={args.seconds}  burst={args.burst}")
+    for mode in args.modes:
+        await run_mode(mode, args, chunks)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--modes", nargs="+", choices=["thread", "process"],
+                    default=["thread", "process"])
+    ap.add_argument("--workers", type=int, default=2, help="threads, or processes")
+    ap.add_argument("--recordings", type=int, default=10)
+    ap.add_argument("--period", type=float, default=0.5,
+                    help="seconds between a recording's chunks (10 in production)")
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--burst", type=int, default=20)
+    asyncio.run(main(ap.parse_args()))
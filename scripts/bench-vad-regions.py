@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""Time and memory of get_vad_regions, old and new, on a chunk and on an hour.
+
+The old version copied the LSTM state of every 512-sample window and found each
+region's end state with a linear scan; the new one keeps only the states at
+region ends, and turns scores into regions with NumPy (regions_from_scores).
+Both are run on a 10s chunk — the live case — and on a long recording, which is
+what an enrollment or a VAD over an upload looks like. Reports the best time of
+--repeat runs, the time spent after the model (regions and states alone), and
+the peak memory tracemalloc saw, measured in a separate run. Also checks the two
+agree: same regions, and the same end states, bit for bit.
+
+The new code is main.py's own, read out of the file — importing main would load
+torch and the rest of the app for three functions.
+
+Run:
+    python scripts/bench-vad-regions.py
+    python scripts/bench-vad-regions.py --minutes 60 --wav lecture.wav
+"""
+import argparse
+import ast
+import math
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import onnxruntime as ort
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SAMPLE_RATE     = 16000
+VAD_WINDOW_SIZE = 512
+VAD_THRESHOLD   = 0.2
+VAD_PAD_SEC     = 0.2
+
+
+def _from_main(*names):
+    """main.py's definitions of `names`, with the VAD constants they read."""
+    tree = ast.parse((ROOT / "src" / "main.py").read_text())
+    body = [n for n in tree.body if isinstance(n, ast.FunctionDef) and n.name in names]
+    scope = dict(np=np, math=math, SAMPLE_RATE=SAMPLE_RATE, VAD_WINDOW_SIZE=VAD_WINDOW_SIZE,
+                 VAD_THRESHOLD=VAD_THRESHOLD, VAD_PAD_SEC=VAD_PAD_SEC)
+    exec(compile(ast.Module(body=body, type_ignores=[]), "main.py", "exec"), scope)
+    return scope
+
+
+def old_get_vad_regions(session, samples, init_h, init_c):
+    h  = init_h.copy()
+    c  = init_c.copy()
+    sr = np.array(SAMPLE_RATE, dtype=np.int64)
+
+    frame_times, frame_scores, frame_states = [], [], []
+    for i in range(0, len(samples) - VAD_WINDOW_SIZE + 1, VAD_WINDOW_SIZE):
+        w    = samples[i: i + VAD_WINDOW_SIZE].reshape(1, VAD_WINDOW_SIZE)
+        outs = session.run(None, {'input': w, 'sr': sr, 'h': h, 'c': c})
+        h, c = outs[1], outs[2]
+        frame_times.append(i / SAMPLE_RATE)
+        frame_scores.append(float(outs[0].squeeze()))
+        frame_states.append((h.copy(), c.copy()))
+    return _old_post(samples, frame_times, frame_scores, frame_states)
+
+
+def _old_post(samples, frame_times, frame_scores, frame_states):
+    raw_regions, in_speech, start = [], False, 0.0
+    for t, score in zip(frame_times, frame_scores):
+        if score >= VAD_THRESHOLD and not in_speech:
+            start, in_speech = t, True
+        elif score < VAD_THRESHOLD and in_speech:
+            raw_regions.append((start, t))
+            in_speech = False
+    if in_speech:
+        raw_regions.append((start, len(samples) / SAMPLE_RATE))
+    if not raw_regions:
+        return [], []
+
+    total  = len(samples) / SAMPLE_RATE
+    padded = [(max(0.0, s - VAD_PAD_SEC), min(total, e + VAD_PAD_SEC)) for s, e in raw_regions]
+    merged = [padded[0]]
+    for (s, e) in padded[1:]:
+        prev_s, prev_e = merged[-1]
+        if s <= prev_e:
+            merged[-1] = (prev_s, max(prev_e, e))
+        else:
+            merged.append((s, e))
+
+    def state_at(t):
+        idx = min(range(len(frame_times)), key=lambda i: abs(frame_times[i] - t))
+        return frame_states[idx]
+    return merged, [state_at(e) for (_, e) in merged]
+
+
+def synthetic(seconds, seed=0):
+    """Tone bursts with pauses of varying length — enough for Silero to find
+    regions, which is what the state bookkeeping scales with."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    voice = np.sin(2 * np.pi * 200 * t * (1 + 0.5 * np.sin(2 * np.pi * 3 * t)))
+    gate = np.zeros_like(t, dtype=bool)
+    pos = 0.0
+    while pos < seconds:
+        talk = rng.uniform(1.0, 6.0)
+        gate[int(pos * SAMPLE_RATE): int((pos + talk) * SAMPLE_RATE)] = True
+        pos += talk + rng.uniform(0.2, 2.0)
+    return (0.5 * voice * gate).astype(np.float32)
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def peak(fn):
+    tracemalloc.start()
+    fn()
+    _, p = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return p
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=60, help="length of the long input")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--wav", help="16kHz mono recording to use instead of synthetic audio")
+    args = parser.parse_args()
+
+    session = ort.InferenceSession(str(ROOT / "models" / "silero_vad.onnx"))
+    new = _from_main("get_vad_regions", "_nearest_frame", "regions_from_scores")
+    new["_vad_session"] = session
+    zeros = np.zeros((2, 1, 64), dtype=np.float32)
+
+    if args.wav:
+        import soundfile as sf
+        source, rate = sf.read(args.wav, dtype="float32")
+        if rate != SAMPLE_RATE or source.ndim != 1:
+            raise SystemExit("--wav must be 16kHz mono")
+        long_input = np.resize(source, int(args.minutes * 60 * SAMPLE_RATE))
+    else:
+        long_input = synthetic(args.minutes * 60)
+
+    for label, samples in (("10s chunk", long_input[:10 * SAMPLE_RATE]),
+                           (f"{args.minutes:g} min", long_input)):
+        repeat = args.repeat if len(samples) <= 60 * SAMPLE_RATE else 1
+        run_old = lambda: old_get_vad_regions(session, samples, zeros, zeros)
+        run_new = lambda: new["get_vad_regions"](samples, zeros, zeros)
+
+        regions_old, states_old = run_old()
+        regions_new, states_new = run_new()
+        same = regions_old == regions_new and all(
+            np.array_equal(a[0], b[0]) and np.array_equal(a[1], b[1])
+            for a, b in zip(states_old, states_new))
+
+        # After the model: the part this change is about, without the ONNX time
+        # that both versions share.
+        frames = len(samples) // VAD_WINDOW_SIZE
+        scores = np.random.default_rng(1).random(frames).astype(np.float32) ** 3
+        times  = [i * VAD_WINDOW_SIZE / SAMPLE_RATE for i in range(frames)]
+        fake_states = [(zeros, zeros)] * frames
+        post_old = best_of(lambda: _old_post(samples, times, scores.tolist(), fake_states), repeat)
+        post_new = best_of(lambda: new["regions_from_scores"](scores, len(samples) / SAMPLE_RATE),
+                           repeat)
+
+        t_old, t_new = best_of(run_old, repeat), best_of(run_new, repeat)
+        m_old, m_new = peak(run_old), peak(run_new)
+        print(f"{label}: {len(regions_new)} regions, identical: {same}")
+        print(f"  old  {t_old*1000:9.1f} ms  (regions+states {post_old*1000:8.2f} ms)  "
+              f"peak {m_old/1024:9.0f} KiB")
+        print(f"  new  {t_new*1000:9.1f} ms  (regions        {post_new*1000:8.2f} ms)  "
+              f"peak {m_new/1024:9.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
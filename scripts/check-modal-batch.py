@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""Check Modal's /batch route against / on the same clips.
+
+Each clip is transcribed on its own through / and, together with the others,
+through /batch — by WhisperBatcher, as the server sends them. The words of each
+clip are compared: /batch decodes with faster-whisper's batched pipeline and /
+with stable-ts, so the timestamps differ, but the text should not. A clip whose
+/batch text is empty, or matches / less closely than --min-ratio, fails the
+check — which is what slot boundaries in the wrong units look like.
+
+Run this against a deployment before turning batching on (WHISPER_BATCH_MS).
+
+Run:
+    MODAL_WHISPER_URL=https://... python scripts/check-modal-batch.py a.wav b.wav
+"""
+import argparse
+import asyncio
+import difflib
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import soundfile as sf
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from audio import PCM_CONTENT_TYPE, encode_pcm                          # noqa: E402
+from whisper_batcher import WhisperBatcher                                # noqa: E402
+
+SAMPLE_RATE = 16000
+
+
+def _text(words):
+    return " ".join(w["word"].strip().lower().strip(".,?!") for w in words).split()
+
+
+async def main(args):
+    bodies = []
+    for path in args.clips:
+        clip, rate = sf.read(path, dtype="float32")
+        if rate != SAMPLE_RATE or clip.ndim != 1:
+            raise SystemExit(f"{path}: must be 16kHz mono")
+        if len(clip) > 30 * SAMPLE_RATE:
+            raise SystemExit(f"{path}: at most 30s — one /batch slot")
+        bodies.append((encode_pcm(clip, SAMPLE_RATE), PCM_CONTENT_TYPE))
+
+    failed = False
+    async with httpx.AsyncClient(timeout=httpx.Timeout(120.0)) as client:
+        singles = []
+        for body, content_type in bodies:
+            r = await client.post(args.url, content=body, headers={"Content-Type": content_type})
+            r.raise_for_status()
+            singles.append(r.json())
+
+        # A window long enough that every clip lands in one /batch request.
+        batcher = WhisperBatcher(client, args.url, max_items=len(bodies), window_ms=2000)
+        batcher.start()
+        try:
+            batched = await asyncio.gather(*(batcher.transcribe(b, t) for b, t in bodies))
+        finally:
+            await batcher.stop()
+
+    for path, one, many in zip(args.clips, singles, batched):
+        a, b = _text(one), _text(many)
+        ratio = difflib.SequenceMatcher(None, a, b).ratio() if a or b else 1.0
+        ok = bool(b or not a) and ratio >= args.min_ratio
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {path}: {len(a)} words alone, {len(b)} batched, "
+              f"similarity {ratio:.3f}")
+        if not ok:
+            print(f"     /      {' '.join(a)}\n     /batch {' '.join(b)}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("clips", nargs="+", help="16kHz mono WAV/FLAC, up to 30s each; two or more")
+    ap.add_argument("--url", default=os.getenv("MODAL_WHISPER_URL", ""))
+    ap.add_argument("--min-ratio", type=float, default=0.9)
+    args = ap.parse_args()
+    if not args.url:
+        raise SystemExit("set MODAL_WHISPER_URL or pass --url")
+    if len(args.clips) < 2:
+        raise SystemExit("give at least two clips, so /batch has more than one slot")
+    asyncio.run(main(args))
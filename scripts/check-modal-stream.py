@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""Check Modal's /stream route against / on the same clips.
+
+/ decodes with stable-ts, /stream with faster-whisper's own transcribe (so it
+can yield a segment at a time), and a streamed chunk's final words are
+/stream's. stitch_professor_words keeps a word by where its midpoint falls, so
+what matters is how far the midpoints move: each clip goes through both routes,
+the words are matched by text, and the shift of each matched word's midpoint is
+reported. A clip whose text matches / less closely than --min-ratio, or whose
+largest midpoint shift is over --max-shift seconds, fails.
+
+Run this against a deployment before turning streaming on (WHISPER_STREAM=1).
+
+Run:
+    MODAL_WHISPER_URL=https://... python scripts/check-modal-stream.py a.wav b.wav
+"""
+import argparse
+import asyncio
+import difflib
+import json
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from audio import PCM_CONTENT_TYPE, encode_pcm                          # noqa: E402
+
+SAMPLE_RATE = 16000
+
+
+def _key(word):
+    return word["word"].strip().lower().strip(".,?!")
+
+
+async def _streamed(client, url, body, content_type):
+    async with client.stream("POST", url.rstrip("/") + "/stream", content=body,
+                             headers={"Content-Type": content_type}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line and (message := json.loads(line)).get("done"):
+                return message["words"]
+    raise SystemExit("stream ended before its final line")
+
+
+async def main(args):
+    failed = False
+    async with httpx.AsyncClient(timeout=httpx.Timeout(120.0)) as client:
+        for path in args.clips:
+            clip, rate = sf.read(path, dtype="float32")
+            if rate != SAMPLE_RATE or clip.ndim != 1:
+                raise SystemExit(f"{path}: must be 16kHz mono")
+            body = encode_pcm(clip, SAMPLE_RATE)
+            r = await client.post(args.url, content=body, headers={"Content-Type": PCM_CONTENT_TYPE})
+            r.raise_for_status()
+            one, streamed = r.json(), await _streamed(client, args.url, body, PCM_CONTENT_TYPE)
+
+            a, b    = [_key(w) for w in one], [_key(w) for w in streamed]
+            matcher = difflib.SequenceMatcher(None, a, b)
+            ratio   = matcher.ratio() if a or b else 1.0
+            shifts  = [abs((one[i + k]["start"] + one[i + k]["end"]) / 2
+                           - (streamed[j + k]["start"] + streamed[j + k]["end"]) / 2)
+                       for i, j, n in matcher.get_matching_blocks() for k in range(n)]
+            worst   = max(shifts, default=0.0)
+            ok = ratio >= args.min_ratio and worst <= args.max_shift
+            failed |= not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {path}: {len(a)} words via /, {len(b)} via /stream, "
+                  f"similarity {ratio:.3f}; midpoint shift median "
+                  f"{np.median(shifts) if shifts else 0.0:.3f}s, largest {worst:.3f}s")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("clips", nargs="+", help="16kHz mono WAV/FLAC — live-chunk length, ~10s")
+    ap.add_argument("--url", default=os.getenv("MODAL_WHISPER_URL", ""))
+    ap.add_argument("--min-ratio", type=float, default=0.9)
+    ap.add_argument("--max-shift", type=float, default=0.25,
+                    help="seconds; half of stitch_professor_words' 0.5s end buffer")
+    args = ap.parse_args()
+    if not args.url:
+        raise SystemExit("set MODAL_WHISPER_URL or pass --url")
+    asyncio.run(main(args))
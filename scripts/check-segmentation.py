@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+"""Check the vectorised speaker-change detection and the batched segmentation call.
+
+1. speaker_turns against the frame-by-frame loop it replaced, on random
+   segmentation outputs — speech, silence and speaker changes in runs of every
+   length. Must be identical, segment for segment.
+2. With models/segmentation.onnx present: a chunk's regions through the model
+   one at a time (SEG_BATCH=0) and in padded batches (SEG_BATCH=1, grouped by
+   --max-padding), timed, with the largest difference in any row's logits and
+   how far the batch moved any boundary. Padding reaches every frame of a short
+   row — through the instance normalisation's statistics and the backward
+   LSTM — so this is what says whether SEG_BATCH can be turned on. Exits
+   non-zero if the segments differ in number or any boundary moved more than
+   --max-shift-ms.
+
+main.py's own functions are read out of the file, as bench-vad-regions.py does,
+so this runs without torch.
+
+Run:
+    python scripts/check-segmentation.py
+    python scripts/check-segmentation.py --wav lecture.wav --repeat 20
+"""
+import argparse
+import ast
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+SAMPLE_RATE     = 16000
+SEG_THRESHOLD   = 0.3
+MIN_REGION_SEC  = 1.5
+MIN_SEGMENT_SEC = 0.5
+SEG_PATH        = ROOT / "models" / "segmentation.onnx"
+
+
+class _QuietLogger:
+    def debug(self, *a, **k):
+        pass
+
+
+def _from_main(session=None, batch=True, max_padding=0.1):
+    from speaker_encoder import length_groups
+    names = ("split_by_speaker_change", "speaker_turns", "get_segments")
+    tree = ast.parse((ROOT / "src" / "main.py").read_text())
+    body = [n for n in tree.body if isinstance(n, ast.FunctionDef) and n.name in names]
+    scope = dict(np=np, math=math, logger=_QuietLogger(), _seg_session=session,
+                 SAMPLE_RATE=SAMPLE_RATE, SEG_THRESHOLD=SEG_THRESHOLD, SEG_BATCH=batch,
+                 SEG_MAX_PADDING=max_padding, length_groups=length_groups,
+                 MIN_REGION_SEC=MIN_REGION_SEC, MIN_SEGMENT_SEC=MIN_SEGMENT_SEC)
+    exec(compile(ast.Module(body=body, type_ignores=[]), "main.py", "exec"), scope)
+    return scope
+
+
+def old_turns(seg_logits, duration, region_start):
+    """The loop from split_by_speaker_change before it was vectorised."""
+    seg = 1.0 / (1.0 + np.exp(-seg_logits))
+    num_frames    = seg.shape[0]
+    frame_dur     = duration / num_frames
+    sub_segments  = []
+    in_speech     = False
+    seg_start     = 0.0
+    prev_dominant = -1
+    for i, frame in enumerate(seg):
+        t         = i * frame_dur
+        is_speech = float(frame.max()) > SEG_THRESHOLD
+        dominant  = int(np.argmax(frame))
+        if is_speech and not in_speech:
+            seg_start, in_speech, prev_dominant = t, True, dominant
+        elif is_speech and in_speech:
+            if dominant != prev_dominant:
+                sub_segments.append((region_start + seg_start, region_start + t))
+                seg_start, prev_dominant = t, dominant
+        elif not is_speech and in_speech:
+            sub_segments.append((region_start + seg_start, region_start + t))
+            in_speech = False
+    if in_speech:
+        sub_segments.append((region_start + seg_start, region_start + duration))
+    return sub_segments if sub_segments else [(region_start, region_start + duration)]
+
+
+def random_logits(rng, frames, speakers=3):
+    """Runs of silence and of one dominant speaker, with noise."""
+    logits = rng.normal(-4, 1, (frames, speakers)).astype(np.float32)
+    i = 0
+    while i < frames:
+        run = int(rng.integers(1, 40))
+        who = int(rng.integers(-1, speakers))
+        if who >= 0:
+            logits[i:i + run, who] = rng.normal(2, 1.5, min(run, frames - i))
+        i += run
+    return logits
+
+
+def check_turns(main, trials):
+    rng = np.random.default_rng(0)
+    t_old = t_new = 0.0
+    for _ in range(trials):
+        frames   = int(rng.integers(1, 800))
+        logits   = random_logits(rng, frames)
+        duration = frames * 0.0169 + float(rng.random()) * 0.01
+        start    = float(rng.random()) * 10
+        t0 = time.perf_counter()
+        expected = old_turns(logits, duration, start)
+        t1 = time.perf_counter()
+        got = main["speaker_turns"](logits, duration / frames, duration, start)
+        t2 = time.perf_counter()
+        t_old += t1 - t0
+        t_new += t2 - t1
+        if got != expected:
+            raise SystemExit(f"MISMATCH at {frames} frames:\n  loop   {expected}\n  arrays {got}")
+    print(f"speaker_turns: identical on {trials} random regions; "
+          f"loop {t_old / trials * 1000:.3f} ms, arrays {t_new / trials * 1000:.3f} ms per region")
+
+
+def logit_drift(session, chunk, regions, max_padding):
+    """Largest |logit| difference, over every frame of every row, between a
+    region's logits alone and in its padded group."""
+    from speaker_encoder import length_groups
+    clips = [chunk[int(s * SAMPLE_RATE):int(e * SAMPLE_RATE)] for s, e in regions]
+    worst = 0.0
+    for group in length_groups([len(c) for c in clips], max_padding):
+        longest = max(len(clips[i]) for i in group)
+        batch   = np.zeros((len(group), 1, longest), dtype=np.float32)
+        for row, i in enumerate(group):
+            batch[row, 0, :len(clips[i])] = clips[i]
+        together = session.run(None, {"input_values": batch})[0]
+        for row, i in enumerate(group):
+            alone = session.run(None, {"input_values": clips[i][None, None, :]})[0][0]
+            frames = min(len(alone), together.shape[1])
+            worst = max(worst, float(np.abs(alone[:frames] - together[row, :frames]).max()))
+    return worst
+
+
+def check_batch(chunk, regions, repeat, max_padding, max_shift_ms):
+    from ort_sessions import load_session
+    session = load_session(SEG_PATH)
+    single  = _from_main(session, batch=False)
+    batched = _from_main(session, batch=True, max_padding=max_padding)
+
+    def best(fn):
+        b = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            out = fn()
+            b = min(b, time.perf_counter() - t0)
+        return b, out
+
+    t_single, segs_single = best(lambda: single["get_segments"](chunk, regions))
+    t_batch,  segs_batch  = best(lambda: batched["get_segments"](chunk, regions))
+    print(f"get_segments over {len(regions)} regions: one at a time {t_single * 1000:.1f} ms, "
+          f"batched (max padding {max_padding}) {t_batch * 1000:.1f} ms")
+    print(f"  largest logit difference, any frame: {logit_drift(session, chunk, regions, max_padding):.4f}")
+    if len(segs_single) != len(segs_batch):
+        print(f"  one at a time: {segs_single}\n  batched:       {segs_batch}")
+        raise SystemExit(f"segment count differs: {len(segs_single)} vs {len(segs_batch)}")
+    drift = max((max(abs(a[0] - b[0]), abs(a[1] - b[1]))
+                 for a, b in zip(segs_single, segs_batch)), default=0.0)
+    print(f"  same {len(segs_batch)} segments; largest boundary shift {drift * 1000:.1f} ms")
+    if drift * 1000 > max_shift_ms:
+        raise SystemExit(f"a boundary moved {drift * 1000:.1f} ms — more than {max_shift_ms} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trials", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--wav", help="16kHz mono speech for the batch check (first 12s used)")
+    parser.add_argument("--max-padding", type=float, default=0.1, help="as SEG_MAX_PADDING")
+    parser.add_argument("--max-shift-ms", type=float, default=20.0,
+                        help="largest boundary shift allowed (a frame is ~17ms)")
+    args = parser.parse_args()
+
+    check_turns(_from_main(), args.trials)
+
+    if not SEG_PATH.exists():
+        print(f"({SEG_PATH.name} not found — batch check skipped)")
+        return
+    if args.wav:
+        import soundfile as sf
+        chunk, rate = sf.read(args.wav, dtype="float32")
+        if rate != SAMPLE_RATE or chunk.ndim != 1:
+            raise SystemExit("--wav must be 16kHz mono")
+        chunk = chunk[:12 * SAMPLE_RATE]
+    else:
+        chunk = (0.1 * np.random.default_rng(1).standard_normal(12 * SAMPLE_RATE)).astype(np.float32)
+    # A chunk's worth of regions of assorted lengths, as VAD hands them over.
+    regions = [(0.2, 2.1), (2.6, 6.9), (7.3, 9.0), (9.4, 11.8)]
+    check_batch(chunk, regions, args.repeat, args.max_padding, args.max_shift_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+"""Check the ONNX speaker encoder against SpeechBrain, before the server runs it.
+
+SPEAKER_ENCODER=onnx (or onnx-int8) swaps EncoderClassifier.encode_batch for
+two things written here: speaker_encoder.fbank, SpeechBrain's filterbank and
+mean normalisation in NumPy, and the network exported by export-ecapa-onnx.py.
+Neither is right until it has been compared with what it replaces:
+
+1. The front end: fbank against the model's own compute_features and
+   mean_var_norm, on a padded batch of clips — the largest difference over
+   each clip's own frames, in dB. Over --max-fbank-db fails.
+2. Each export in --models-dir: clips cut from the recordings, embedded by
+   EncoderClassifier one at a time (the server's torch path) and by
+   OnnxSpeakerEncoder, alone and in one padded batch. Reported: the lowest
+   cosine between the two (batched against torch batched the same way — what
+   padding does is bench-ecapa-batch.py's to measure, not an export's), the
+   largest change in similarity to a reference speaker (the first
+   recording's first 10s), how many decisions at
+   SIMILARITY_THRESHOLD changed side, and the time per batch. A cosine under
+   --min-cosine (--min-cosine-int8 for the INT8 export) or any changed decision
+   fails.
+
+The result is written next to each export — models/ecapa_tdnn.check.json —
+with the export's digest. main.py runs an export only with a passing record for
+that exact file; anything else falls back to torch. Give recordings of more
+than one speaker (--wav a.wav b.wav ...), so some decisions go each way. No
+record is written for synthetic audio or --random-init.
+
+--random-init compares against the same network with untrained weights (as
+export-ecapa-onnx.py --random-init writes it), for trying the check where the
+model cannot be downloaded.
+
+Run:
+    python scripts/check-speaker-encoder.py --wav professor.wav student.wav
+    python scripts/check-speaker-encoder.py --random-init --models-dir /tmp/ecapa --wav a.wav b.wav
+"""
+import argparse
+import datetime
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from ort_sessions import load_session                                     # noqa: E402
+from speaker_encoder import (TorchSpeakerEncoder, OnnxSpeakerEncoder,     # noqa: E402
+                             check_path, fbank, file_digest)
+
+SAMPLE_RATE          = 16000
+SIMILARITY_THRESHOLD = 0.20
+EXPORTS              = (("onnx", "ecapa_tdnn.onnx"), ("onnx-int8", "ecapa_tdnn.int8.onnx"))
+
+
+def random_ecapa():
+    """spkrec-ecapa-voxceleb's encode_batch — Fbank, per-sentence mean
+    normalisation, ECAPA-TDNN — with untrained weights."""
+    import torch
+    from speechbrain.lobes.features import Fbank
+    from speechbrain.lobes.models.ECAPA_TDNN import ECAPA_TDNN
+    from speechbrain.processing.features import InputNormalization
+
+    class RandomEcapa(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.compute_features = Fbank(n_mels=80)
+            self.mean_var_norm    = InputNormalization(norm_type="sentence", std_norm=False)
+            self.embedding_model  = ECAPA_TDNN(
+                input_size=80, channels=[1024, 1024, 1024, 1024, 3072],
+                kernel_sizes=[5, 3, 3, 3, 1], dilations=[1, 2, 3, 4, 1],
+                attention_channels=128, lin_neurons=192)
+
+        def encode_batch(self, wavs, wav_lens):
+            feats = self.mean_var_norm(self.compute_features(wavs), wav_lens)
+            return self.embedding_model(feats, wav_lens)
+
+    torch.manual_seed(0)
+    return RandomEcapa()
+
+
+def synthetic(seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    voice = np.sin(2 * np.pi * (110 + 40 * seed) * t * (1 + 0.3 * np.sin(2 * np.pi * 4 * t)))
+    return (0.3 * voice + 0.02 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+def clips_from(source, n, rng):
+    out = []
+    for _ in range(n):
+        length = int(rng.uniform(0.5, 8.0) * SAMPLE_RATE)
+        start  = int(rng.integers(0, len(source) - length))
+        out.append(source[start:start + length])
+    return out
+
+
+def padded(clips):
+    longest = max(len(c) for c in clips)
+    batch   = np.zeros((len(clips), longest), dtype=np.float32)
+    for row, clip in enumerate(clips):
+        batch[row, :len(clip)] = clip
+    return batch, np.array([len(c) / longest for c in clips], dtype=np.float32)
+
+
+def check_front_end(modules, clips):
+    """Largest |dB| difference between fbank and SpeechBrain's front end."""
+    import torch
+    batch, lens = padded(clips)
+    with torch.no_grad():
+        feats = modules.compute_features(torch.from_numpy(batch))
+        want  = modules.mean_var_norm(feats, torch.from_numpy(lens)).numpy()
+    got   = fbank(batch, lens, SAMPLE_RATE)
+    worst = 0.0
+    for row, rel in enumerate(lens):
+        frames = int(np.ceil(rel * want.shape[1] - 1e-6))
+        worst  = max(worst, float(np.abs(want[row, :frames] - got[row, :frames]).max()))
+    return worst
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t0, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--wav", nargs="+", default=[],
+                        help="16kHz mono recordings, ideally of different speakers")
+    parser.add_argument("--clips", type=int, default=12, help="clips per recording")
+    parser.add_argument("--models-dir", default=str(ROOT / "models"))
+    parser.add_argument("--min-cosine", type=float, default=0.999)
+    parser.add_argument("--min-cosine-int8", type=float, default=0.98)
+    parser.add_argument("--max-fbank-db", type=float, default=0.05)
+    parser.add_argument("--random-init", action="store_true",
+                        help="untrained weights, without models/ecapa_tdnn")
+    args = parser.parse_args()
+
+    import torch
+    torch.set_num_threads(1)
+    torch.backends.nnpack.enabled = False
+    if args.random_init:
+        model   = random_ecapa().eval()
+        modules = model
+    else:
+        from speechbrain.inference.speaker import EncoderClassifier
+        model = EncoderClassifier.from_hparams(
+            source="speechbrain/spkrec-ecapa-voxceleb",
+            savedir=str(ROOT / "models" / "ecapa_tdnn"),
+            run_opts={"device": "cpu"},
+        )
+        model.eval()
+        modules = model.mods
+
+    if args.wav:
+        import soundfile as sf
+        sources = []
+        for path in args.wav:
+            audio, rate = sf.read(path, dtype="float32")
+            if rate != SAMPLE_RATE or audio.ndim != 1:
+                raise SystemExit(f"{path}: must be 16kHz mono")
+            sources.append(audio)
+    else:
+        print("(no --wav: synthetic audio — the numbers only show the check runs)")
+        sources = [synthetic(60, seed) for seed in range(2)]
+    rng       = np.random.default_rng(0)
+    clips     = [c for source in sources for c in clips_from(source, args.clips, rng)]
+    reference = sources[0][:10 * SAMPLE_RATE]
+    recordable = bool(args.wav) and not args.random_init
+
+    failed = False
+    fb = check_front_end(modules, clips)
+    ok = fb <= args.max_fbank_db
+    failed |= not ok
+    print(f"{'ok  ' if ok else 'FAIL'} front end: largest difference from SpeechBrain's "
+          f"{fb:.4f} dB over {len(clips)} clips")
+
+    torch_enc = TorchSpeakerEncoder(model, max_padding=0.0)
+    t_torch, want = timed(lambda: np.vstack([torch_enc.embed([c]) for c in clips]))
+    s_want = want @ torch_enc.embed([reference])[0]
+    want_batch = TorchSpeakerEncoder(model, max_padding=1.0).embed(clips)
+    print(f"     torch, one clip at a time: {t_torch * 1000:.0f} ms for {len(clips)} clips; "
+          f"{int(np.sum(s_want >= SIMILARITY_THRESHOLD))} of them at or above "
+          f"SIMILARITY_THRESHOLD")
+
+    for label, name in EXPORTS:
+        path = Path(args.models_dir) / name
+        if not path.exists():
+            print(f"     {label}: {path} not found")
+            continue
+        enc = OnnxSpeakerEncoder(load_session(path), sample_rate=SAMPLE_RATE, max_padding=1.0)
+        t_alone, alone = timed(lambda: np.vstack([enc.embed([c]) for c in clips]))
+        t_batch, batch = timed(lambda: enc.embed(clips))
+        ref   = enc.embed([reference])[0]
+        cos   = min(float(np.sum(want * alone, axis=1).min()),
+                    float(np.sum(want_batch * batch, axis=1).min()))
+        moved = max(float(np.abs(s_want - alone @ ref).max()),
+                    float(np.abs(s_want - batch @ ref).max()))
+        flips = max(int(np.sum((s_want >= SIMILARITY_THRESHOLD) != (got @ ref >= SIMILARITY_THRESHOLD)))
+                    for got in (alone, batch))
+        floor = args.min_cosine_int8 if label == "onnx-int8" else args.min_cosine
+        ok    = fb <= args.max_fbank_db and cos >= floor and flips == 0
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {label}: lowest cosine to torch {cos:.5f} "
+              f"(needs {floor}), largest similarity change {moved:.5f}, "
+              f"{flips} of {len(clips)} decisions changed; "
+              f"{t_alone * 1000:.0f} ms one at a time, {t_batch * 1000:.0f} ms batched")
+        if recordable:
+            record = dict(passed=ok, sha256=file_digest(path),
+                          checked=datetime.date.today().isoformat(),
+                          min_cosine=cos, max_similarity_change=moved, flips=flips,
+                          fbank_db=fb, clips=len(clips),
+                          recordings=[Path(p).name for p in args.wav])
+            check_path(path).write_text(json.dumps(record, indent=2) + "\n")
+            print(f"     wrote {check_path(path)}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
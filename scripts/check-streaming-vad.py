@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""Check the connection's StreamingVAD against the per-chunk VAD it replaced.
+
+Before StreamingVAD, a chunk's regions came from get_vad_regions over the chunk
+as pcm_to_float returns it — peak-normalised, so a quiet recording was scored
+as if it were a loud one. StreamingVAD scores the audio as it arrives, before
+any chunk (and so any chunk peak) exists. This feeds a recording through it a
+packet at a time, as the socket does, cuts a chunk every --chunk-sec, and
+compares each chunk's regions_from_scores with the old path's regions for the
+same chunk: seconds of speech each found, and how much of the old path's speech
+the new one missed or added.
+
+Each --gains value scales the recording first — 0.05 is a lecturer 26dB
+quieter, or a microphone at the back of the room — and then --noise-dbfs of
+white noise is added, the microphone's own floor, which does not get quieter
+with the lecturer. Exits non-zero if at any gain
+the streaming VAD misses more than --max-missed of the speech the old path
+found.
+
+main.py's own functions are read out of the file, as bench-vad-regions.py does.
+
+Run:
+    python scripts/check-streaming-vad.py lecture.wav
+    python scripts/check-streaming-vad.py quiet.wav loud.wav --gains 1 0.1 0.02
+"""
+import argparse
+import ast
+import math
+import sys
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from audio import AudioBuffer, pcm_to_float                               # noqa: E402
+from chunker import StreamingVAD                                          # noqa: E402
+from ort_sessions import load_session, VadStepper                         # noqa: E402
+
+SAMPLE_RATE     = 16000
+VAD_WINDOW_SIZE = 512
+VAD_THRESHOLD   = 0.2
+VAD_PAD_SEC     = 0.2
+PACKET          = 4096          # samples per socket packet, as the page sends them
+GRID            = 0.01          # seconds per cell when comparing regions
+
+
+def _from_main(session):
+    tree = ast.parse((ROOT / "src" / "main.py").read_text())
+    body = [n for n in tree.body if isinstance(n, ast.FunctionDef)
+            and n.name in ("get_vad_regions", "_nearest_frame", "regions_from_scores")]
+    scope = dict(np=np, math=math, VadStepper=VadStepper, _vad_session=session,
+                 ORT_IO_BINDING=False, SAMPLE_RATE=SAMPLE_RATE,
+                 VAD_WINDOW_SIZE=VAD_WINDOW_SIZE, VAD_THRESHOLD=VAD_THRESHOLD,
+                 VAD_PAD_SEC=VAD_PAD_SEC)
+    exec(compile(ast.Module(body=body, type_ignores=[]), "main.py", "exec"), scope)
+    return scope
+
+
+def mask(regions, total):
+    cells = np.zeros(int(math.ceil(total / GRID)), dtype=bool)
+    for s, e in regions:
+        cells[int(s / GRID):int(math.ceil(e / GRID))] = True
+    return cells
+
+
+def compare(main, session, pcm, chunk_samples):
+    """Speech seconds found by the old path and by the streaming one, and the
+    seconds of the old path's speech missed and added by the streaming one."""
+    buffer = AudioBuffer(chunk_samples * 2 + PACKET)
+    vad    = StreamingVAD(session, sample_rate=SAMPLE_RATE, window=VAD_WINDOW_SIZE)
+    zeros  = np.zeros((2, 1, 64), dtype=np.float32)
+    old_s = new_s = missed = added = 0.0
+    for i in range(0, len(pcm) - PACKET + 1, PACKET):
+        buffer.write(pcm[i:i + PACKET].tobytes())
+        vad.feed(buffer)
+        if buffer.buffered < chunk_samples:
+            continue
+        scores = vad.take(chunk_samples)
+        chunk  = pcm_to_float(buffer.take(chunk_samples))
+        total  = chunk_samples / SAMPLE_RATE
+        old, _ = main["get_vad_regions"](chunk, zeros, zeros)
+        a, b   = mask(old, total), mask(main["regions_from_scores"](scores, total), total)
+        old_s  += a.sum() * GRID
+        new_s  += b.sum() * GRID
+        missed += (a & ~b).sum() * GRID
+        added  += (b & ~a).sum() * GRID
+    return old_s, new_s, missed, added
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("wavs", nargs="+", help="16kHz mono recordings")
+    parser.add_argument("--gains", type=float, nargs="+", default=[1.0, 0.25, 0.05, 0.02])
+    parser.add_argument("--noise-dbfs", type=float, default=-60.0,
+                        help="noise floor added after the gain (-inf for none)")
+    parser.add_argument("--chunk-sec", type=float, default=10.0)
+    parser.add_argument("--max-missed", type=float, default=0.05,
+                        help="fraction of the old path's speech the new one may miss")
+    args = parser.parse_args()
+
+    session = load_session(ROOT / "models" / "silero_vad.onnx")
+    main_fns = _from_main(session)
+    chunk_samples = int(args.chunk_sec * SAMPLE_RATE) // VAD_WINDOW_SIZE * VAD_WINDOW_SIZE
+
+    failed = False
+    for path in args.wavs:
+        audio, rate = sf.read(path, dtype="float32")
+        if rate != SAMPLE_RATE or audio.ndim != 1:
+            raise SystemExit(f"{path}: must be 16kHz mono")
+        for gain in args.gains:
+            noise = 10 ** (args.noise_dbfs / 20) * np.random.default_rng(0).standard_normal(len(audio))
+            pcm = np.clip((audio * gain + noise) * 32768, -32768, 32767).astype(np.int16)
+            old_s, new_s, missed, added = compare(main_fns, session, pcm, chunk_samples)
+            frac = missed / old_s if old_s else 0.0
+            ok = frac <= args.max_missed
+            failed |= not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {Path(path).name} gain {gain:<5} "
+                  f"speech: per-chunk {old_s:6.1f}s, streaming {new_s:6.1f}s   "
+                  f"missed {missed:5.1f}s ({frac:5.1%})   added {added:5.1f}s")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
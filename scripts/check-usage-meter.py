@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""The usage meter's two promises, checked against a real SQLite file.
+
+  1. No billed second is lost when a flush fails, when the task running it is
+     cancelled mid-write, or when the task itself dies.
+  2. Tabs of one account share one total, the moment either is billed.
+
+Each case bills a known number of seconds through the paths that can go wrong,
+then compares what the database ends up holding. Exits non-zero on the first
+mismatch.
+
+Run: python scripts/check-usage-meter.py
+"""
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from sqlalchemy import create_engine, event                              # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker                                  # noqa: E402
+
+from database import _sqlite_pragmas                                     # noqa: E402
+from models import Base, User                                            # noqa: E402
+from usage_meter import UsageMeter                                       # noqa: E402
+
+
+class Flaky:
+    """A session factory that fails the next `fail` writes, and can be slowed so
+    a cancellation lands while the UPDATE is in progress."""
+
+    def __init__(self, real, fail: int = 0, delay: float = 0.0):
+        self.real, self.fail, self.delay = real, fail, delay
+
+    def __call__(self):
+        if self.fail > 0:
+            self.fail -= 1
+            raise RuntimeError("disk on fire")
+        return _Slow(self.real(), self.delay)
+
+
+class _Slow:
+    def __init__(self, session, delay):
+        self.session, self.delay = session, delay
+
+    async def __aenter__(self):
+        await asyncio.sleep(self.delay)
+        return await self.session.__aenter__()
+
+    async def __aexit__(self, *exc):
+        return await self.session.__aexit__(*exc)
+
+
+def stored(Sessions, uid) -> int:
+    with Sessions() as db:
+        return db.get(User, uid).live_seconds
+
+
+async def main() -> int:
+    failures = 0
+
+    def check(name, ok):
+        nonlocal failures
+        print(f"{'ok  ' if ok else 'FAIL'}  {name}")
+        failures += not ok
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "meter.db"
+        sync_engine = create_engine(f"sqlite:///{path}")
+        event.listen(sync_engine, "connect", _sqlite_pragmas)
+        Base.metadata.create_all(sync_engine)
+        Sessions = sessionmaker(bind=sync_engine, expire_on_commit=False)
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+        factory = Flaky(async_sessionmaker(bind=async_engine, expire_on_commit=False))
+
+        with Sessions() as db:
+            a, b = User(clerk_user_id="a"), User(clerk_user_id="b")
+            db.add_all([a, b]); db.commit()
+            a, b = a.id, b.id
+
+        meter = UsageMeter(factory, flush_interval=0.05)
+        meter.seed(a, 0); meter.seed(b, 0)
+        meter.start()
+
+        # -- failed writes: owed seconds survive and land on a later flush ------
+        factory.fail = 3
+        for _ in range(6):
+            meter.add(a, 10)
+        await asyncio.sleep(0.5)
+        check("failed flushes are retried until written", stored(Sessions, a) == 60)
+
+        # -- a flush cancelled while its UPDATE is running ----------------------
+        factory.delay = 0.2
+        meter.add(a, 10)
+        flush = asyncio.create_task(meter.flush())
+        await asyncio.sleep(0.05)
+        flush.cancel()
+        await asyncio.gather(flush, return_exceptions=True)
+        factory.delay = 0.0
+        await asyncio.sleep(0.4)
+        check("a cancelled flush neither loses nor repeats seconds",
+              stored(Sessions, a) == 70)
+
+        # -- the flush task itself dies -----------------------------------------
+        meter._task.cancel()
+        await asyncio.gather(meter._task, return_exceptions=True)
+
+        async def boom():
+            raise RuntimeError("unexpected")
+        meter._task = asyncio.create_task(boom())
+        await asyncio.sleep(0)
+        meter.add(a, 10)                        # notices, and restarts it
+        await asyncio.sleep(0.3)
+        check("a dead flush task is restarted and catches up",
+              stored(Sessions, a) == 80)
+
+        # -- two tabs, one account ----------------------------------------------
+        tab1 = meter.add(b, 10)
+        tab2 = meter.add(b, 10)
+        check("the second tab sees the first tab's seconds at once",
+              tab1 == 10 and tab2 == 20 and meter.total(b) == 20)
+        await meter.stop()
+        check("stop() writes what is still owed", stored(Sessions, b) == 20)
+        check("the total in memory matches the database",
+              meter.total(a) == stored(Sessions, a) and meter.total(b) == stored(Sessions, b))
+
+        await async_engine.dispose()
+        sync_engine.dispose()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+"""Export ECAPA-TDNN to ONNX, and INT8.
+
+Writes, from the SpeechBrain model in models/ecapa_tdnn:
+
+    models/ecapa_tdnn.onnx        the embedding network, float32
+    models/ecapa_tdnn.int8.onnx   the same with dynamically quantised weights
+                                  (--no-int8 to skip)
+
+The filterbank front end is not exported — torch.stft does not survive export
+cleanly, and it is a few lines of NumPy (speaker_encoder.fbank). The export
+takes the features and the clips' relative lengths, as the network does.
+
+Then run scripts/check-speaker-encoder.py on recordings: the server will not
+run an export (SPEAKER_ENCODER=onnx, onnx-int8) that has not passed it.
+
+--random-init exports the same network with untrained weights, for trying the
+export and the check where the model cannot be downloaded. Write those with
+--out-dir somewhere other than models/.
+
+Needs torch, speechbrain and onnx; the server in SPEAKER_ENCODER=onnx mode
+needs none of them.
+
+Run:
+    python scripts/export-ecapa-onnx.py
+    python scripts/export-ecapa-onnx.py --random-init --out-dir /tmp/ecapa
+"""
+import argparse
+import inspect
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+
+def random_ecapa():
+    """spkrec-ecapa-voxceleb's encode_batch — Fbank, per-sentence mean
+    normalisation, ECAPA-TDNN — with untrained weights."""
+    import torch
+    from speechbrain.lobes.features import Fbank
+    from speechbrain.lobes.models.ECAPA_TDNN import ECAPA_TDNN
+    from speechbrain.processing.features import InputNormalization
+
+    class RandomEcapa(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.compute_features = Fbank(n_mels=80)
+            self.mean_var_norm    = InputNormalization(norm_type="sentence", std_norm=False)
+            self.embedding_model  = ECAPA_TDNN(
+                input_size=80, channels=[1024, 1024, 1024, 1024, 3072],
+                kernel_sizes=[5, 3, 3, 3, 1], dilations=[1, 2, 3, 4, 1],
+                attention_channels=128, lin_neurons=192)
+
+        def encode_batch(self, wavs, wav_lens):
+            feats = self.mean_var_norm(self.compute_features(wavs), wav_lens)
+            return self.embedding_model(feats, wav_lens)
+
+    torch.manual_seed(0)
+    return RandomEcapa()
+
+
+def _traceable_length_to_mask(length, max_len=None, dtype=None, device=None):
+    """speechbrain.dataio.dataio.length_to_mask without `expand(len(length),
+    ...)`, which the tracer records as a constant: the export would only take
+    batches the size of the example it was traced with. Broadcasting makes the
+    same mask for any batch."""
+    import torch
+    if max_len is None:
+        max_len = length.max().long().item()
+    mask = torch.arange(max_len, device=length.device, dtype=length.dtype)[None, :] < length.unsqueeze(1)
+    return mask.to(dtype=dtype or length.dtype, device=device or length.device)
+
+
+def export(embedding_model, path):
+    import torch
+    import speechbrain.lobes.models.ECAPA_TDNN as ecapa_module
+
+    class Embedder(torch.nn.Module):
+        def __init__(self, net):
+            super().__init__()
+            self.net = net
+
+        def forward(self, feats, lengths):
+            return self.net(feats, lengths).squeeze(1)
+
+    feats   = torch.randn(2, 300, 80)
+    lengths = torch.tensor([1.0, 0.6])
+    # The TorchScript tracer, which this was written against. From torch 2.9 the
+    # default is the torch.export-based exporter; older versions lack the flag.
+    legacy = ({"dynamo": False}
+              if "dynamo" in inspect.signature(torch.onnx.export).parameters else {})
+    original = ecapa_module.length_to_mask
+    ecapa_module.length_to_mask = _traceable_length_to_mask
+    try:
+        torch.onnx.export(
+            Embedder(embedding_model).eval(), (feats, lengths), str(path),
+            input_names=["feats", "lengths"], output_names=["embedding"],
+            dynamic_axes={"feats": {0: "batch", 1: "frames"}, "lengths": {0: "batch"},
+                          "embedding": {0: "batch"}},
+            opset_version=17, **legacy,
+        )
+    finally:
+        ecapa_module.length_to_mask = original
+    print(f"wrote {path} ({path.stat().st_size / 1e6:.1f} MB)")
+
+
+def quantise(src, dst):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    # Unsigned weights: ECAPA is convolutions, and ONNX Runtime's CPU
+    # ConvInteger takes uint8 weights only.
+    quantize_dynamic(str(src), str(dst), weight_type=QuantType.QUInt8)
+    print(f"wrote {dst} ({dst.stat().st_size / 1e6:.1f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--no-int8", action="store_true")
+    parser.add_argument("--random-init", action="store_true",
+                        help="untrained weights, without models/ecapa_tdnn")
+    parser.add_argument("--out-dir", default=str(ROOT / "models"))
+    args = parser.parse_args()
+
+    out_dir = Path(args.out_dir)
+    if args.random_init and out_dir.resolve() == (ROOT / "models").resolve():
+        raise SystemExit("--random-init writes an untrained model: give --out-dir")
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    import torch
+    torch.set_num_threads(1)
+    if args.random_init:
+        model = random_ecapa().eval()
+        embedding_model = model.embedding_model
+    else:
+        from speechbrain.inference.speaker import EncoderClassifier
+        model = EncoderClassifier.from_hparams(
+            source="speechbrain/spkrec-ecapa-voxceleb",
+            savedir=str(ROOT / "models" / "ecapa_tdnn"),
+            run_opts={"device": "cpu"},
+        )
+        model.eval()
+        embedding_model = model.mods.embedding_model
+
+    fp32 = out_dir / "ecapa_tdnn.onnx"
+    export(embedding_model, fp32)
+    if not args.no_int8:
+        quantise(fp32, out_dir / "ecapa_tdnn.int8.onnx")
+    print("now: python scripts/check-speaker-encoder.py --wav <recordings>")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+ClassRec — live audio buffers
+=============================
+
+The browser sends 16kHz mono int16 PCM in packets of 4096 samples. This module
+is where those packets wait until they make a chunk, and how a chunk becomes the
+float32 array the models read.
+
+The socket used to keep a bytearray: `extend` per packet, then `bytes(buffer)`
+to cut a chunk — a copy of 320KB or more — and `del buffer[:CHUNK_BYTES]`, which
+moves the remainder back to the start. pcm_to_float then built five more arrays
+of the chunk's size on the way to one. Per chunk, per recording, on the event
+loop.
+
+AudioBuffer is allocated once per connection and never grows. A packet is
+copied in — it has to land somewhere — and a chunk comes out as a view of the
+buffer, no copy at all. pcm_to_float makes the one array the pipeline keeps, and can write
+it into memory the caller already owns.
+
+encode_pcm / decode_pcm are the form a chunk travels to Modal in.
+"""
+
+import struct
+
+import numpy as np
+
+
+def pcm_to_float(pcm, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Convert raw PCM int16 → float32 numpy array.
+    Browser sends 16-bit PCM. Models expect float32 in [-1, 1].
+
+    `pcm` is bytes or an int16 array — a view of an AudioBuffer is the usual one.
+    The result is peak-normalised, as it always has been, and computed in place:
+    one float32 array, `out` if it is given, and no temporaries the size of the
+    chunk. Same numbers as the old astype → divide → abs → divide version, since
+    scaling by 1/32768 is exact in float32.
+    """
+    samples = pcm if isinstance(pcm, np.ndarray) else np.frombuffer(pcm, dtype=np.int16)
+    if out is None:
+        out = np.empty(len(samples), dtype=np.float32)
+    np.multiply(samples, np.float32(1 / 32768), out=out, dtype=np.float32)
+    if len(out):
+        peak = max(float(out.max()), -float(out.min()))
+        if peak > 0:
+            out /= np.float32(peak)
+    return out
+
+
+class AudioBuffer:
+    """
+    A fixed-size buffer of int16 samples, from which chunks are read as views.
+
+    Packets are appended at the end; `take` hands out the oldest samples as a
+    slice. When a packet no longer fits after the end, what is still unread —
+    less than a packet, on the socket, since a chunk is taken the moment there
+    is one — moves back to the start first. That is the only copy besides the
+    packet's own, and it is the size of the remainder, not of the buffer.
+
+    A view from `take` stays valid until the next `write`. The socket converts
+    it to float before reading its next packet, so nothing ever holds one.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buf     = np.empty(capacity, dtype=np.int16)
+        self._start   = 0           # first unread sample
+        self._end     = 0           # one past the last written
+
+    @property
+    def buffered(self) -> int:
+        """Samples written and not yet taken."""
+        return self._end - self._start
+
+    def write(self, packet) -> bool:
+        """Append a packet of int16 PCM. Returns False, writing nothing, if it
+        would overrun audio not yet taken — the caller's cue that the client is
+        sending faster than it is being consumed."""
+        data = np.frombuffer(packet, dtype=np.int16)
+        n = len(data)
+        if self.buffered + n > self.capacity:
+            return False
+        if self._end + n > self.capacity:
+            kept = self.buffered
+            self._buf[:kept] = self._buf[self._start:self._end]
+            self._start, self._end = 0, kept
+        self._buf[self._end:self._end + n] = data
+        self._end += n
+        return True
+
+    def take(self, n: int) -> np.ndarray:
+        """The next `n` samples, as a view into the buffer. No copy."""
+        if n > self.buffered:
+            raise ValueError(f"only {self.buffered} samples buffered, asked for {n}")
+        view = self._buf[self._start:self._start + n]
+        self._start += n
+        if self._start == self._end:
+            self._start = self._end = 0
+        return view
+
+    def peek(self, n: int, offset: int = 0) -> np.ndarray:
+        """`n` buffered samples starting `offset` past the read position, without
+        taking them."""
+        if offset + n > self.buffered:
+            raise ValueError(f"only {self.buffered} samples buffered")
+        start = self._start + offset
+        return self._buf[start:start + n]
+
+
+# ======= WIRE FORMAT (server → Modal) =======
+# Raw samples with a 12-byte header, so the endpoint can hand Whisper an array
+# without a temp file, a container to parse or an ffmpeg process to spawn:
+#
+#   magic "CRPC" | version u16 | dtype u16 | sample rate u32 | samples...
+#
+# Little-endian throughout. modal_whisper.py reads it with its own copy of these
+# constants — it is deployed on its own and cannot import this file — so a change
+# here is a change there.
+PCM_CONTENT_TYPE = "audio/x-classrec-pcm"
+PCM_MAGIC        = b"CRPC"
+PCM_VERSION      = 1
+PCM_DTYPES       = {1: np.int16, 2: np.float16}
+_PCM_HEADER      = struct.Struct("<4sHHI")
+
+
+def encode_pcm(samples: np.ndarray, sample_rate: int, dtype=np.int16) -> bytes:
+    """float32 samples in [-1, 1] → header + int16 (or float16) samples.
+
+    int16 is what the microphone produced, so nothing is lost that was there.
+    float16 is the same size and keeps quiet passages finer. Either is a
+    frombuffer on the other side."""
+    code = next(c for c, t in PCM_DTYPES.items() if t is dtype)
+    if dtype is np.int16:
+        body = np.clip(samples * 32767.0, -32768, 32767).astype(np.int16)
+    else:
+        body = samples.astype(np.float16)
+    return _PCM_HEADER.pack(PCM_MAGIC, PCM_VERSION, code, sample_rate) + body.tobytes()
+
+
+def decode_pcm(data: bytes) -> tuple[np.ndarray, int]:
+    """The inverse of encode_pcm: (float32 samples, sample rate)."""
+    magic, version, code, rate = _PCM_HEADER.unpack_from(data)
+    if magic != PCM_MAGIC or version != PCM_VERSION or code not in PCM_DTYPES:
+        raise ValueError("not a ClassRec PCM body")
+    raw = np.frombuffer(data, dtype=PCM_DTYPES[code], offset=_PCM_HEADER.size)
+    if code == 1:
+        return raw * np.float32(1 / 32768), rate
+    return raw.astype(np.float32), rate
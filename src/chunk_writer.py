@@ -0,0 +1,135 @@
+"""
+ClassRec — the chunk writer (group commit for transcript chunks)
+================================================================
+
+Every transcribed chunk used to be its own transaction: open a session, insert
+one row, commit. A commit is an fsync, and SQLite has one writer — so a hundred
+recordings meant ten write transactions a second queueing on the same lock, each
+paying for a disk flush to store a few hundred bytes.
+
+Chunks are now handed to one writer for the whole process, which stores whatever
+has arrived from every socket in a single transaction. A batch goes when it
+reaches `max_batch` rows or when its oldest row has waited `max_delay_ms`,
+whichever comes first.
+
+`max_delay_ms` is the durability bound, and the trade is explicit: a crash loses
+at most that much of what was transcribed, across all recordings. The browser
+has already been sent those words, and it is the recording's end — not this
+writer — that the lecture is assembled at, which flushes first.
+
+Reported through metrics:
+    chunk_writer.max_delay_ms       the configured bound (gauge)
+    chunk_writer.pending            rows waiting right now (gauge)
+    chunk_writer.unflushed_ms       how old the oldest row was when written (timing)
+    chunk_writer.batch_rows         rows per transaction (timing)
+    chunk_writer.flushes / rows / failed_rows   (counters)
+"""
+
+import asyncio
+import time
+
+import metrics
+import repository as repo
+from logger import logger
+
+
+class ChunkWriter:
+    """Queue of Chunk rows from every socket, written in batches by one task."""
+
+    def __init__(self, session_factory, *, max_batch: int = 64, max_delay_ms: int = 500):
+        self._session_factory = session_factory
+        self.max_batch        = max_batch
+        self.max_delay_ms     = max_delay_ms
+        self._pending: list[tuple[float, dict]] = []     # (queued_at, row)
+        self._wake            = asyncio.Event()
+        self._flush_lock      = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        metrics.set_gauge("chunk_writer.max_delay_ms", max_delay_ms)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Write everything still queued, then stop. Called at shutdown, so a
+        restart loses nothing that reached the writer."""
+        if self._task is not None:
+            # Cancelled only while it holds no batch: a batch is sliced off
+            # _pending before it is written, so cancelling the task mid-write
+            # would drop it — CancelledError skips _write's row-by-row fallback,
+            # and the flush below would find nothing left to write.
+            async with self._flush_lock:
+                self._task.cancel()
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
+            self._task = None
+        await self.flush()
+
+    def submit(self, *, session_id: int, idx: int, text: str,
+               words: list | None = None) -> None:
+        """Queue one chunk. Returns at once — nothing here waits on the disk."""
+        self._pending.append((time.monotonic(),
+                              {"session_id": session_id, "idx": idx,
+                               "text": text, "words": words}))
+        metrics.set_gauge("chunk_writer.pending", len(self._pending))
+        if len(self._pending) >= self.max_batch:
+            self._wake.set()
+
+    async def flush(self) -> None:
+        """Write everything queued so far. The recording's end awaits this before
+        collapsing, so the lecture is assembled from every chunk it produced."""
+        async with self._flush_lock:
+            while self._pending:
+                batch, self._pending = (self._pending[:self.max_batch],
+                                        self._pending[self.max_batch:])
+                metrics.set_gauge("chunk_writer.pending", len(self._pending))
+                await self._write(batch)
+
+    async def _run(self) -> None:
+        while True:
+            timeout = None
+            if self._pending:
+                age = time.monotonic() - self._pending[0][0]
+                timeout = max(0.0, self.max_delay_ms / 1000 - age)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                # The loop must outlive any one failure, or every chunk after it
+                # would queue forever.
+                logger.error(f"[chunk_writer] flush failed: {e}")
+
+    async def _write(self, batch: list[tuple[float, dict]]) -> None:
+        rows = [row for _, row in batch]
+        metrics.observe("chunk_writer.unflushed_ms",
+                        (time.monotonic() - batch[0][0]) * 1000)
+        try:
+            async with self._session_factory() as db:
+                await repo.add_chunks_async(db, rows)
+        except Exception as e:
+            # One bad row fails the whole transaction — typically a chunk that
+            # finished after its recording was collapsed, whose session no longer
+            # exists. Written one at a time instead, so only that row is lost and
+            # the other recordings' chunks in the batch are not.
+            logger.warning(f"[chunk_writer] batch of {len(rows)} failed ({e}); "
+                           f"writing rows singly")
+            for row in rows:
+                try:
+                    async with self._session_factory() as db:
+                        await repo.add_chunks_async(db, [row])
+                except Exception as e:
+                    metrics.incr("chunk_writer.failed_rows")
+                    logger.error(f"[chunk_writer] could not store chunk {row['idx']} "
+                                 f"of session {row['session_id']}: {e}")
+                else:
+                    metrics.incr("chunk_writer.rows")
+            metrics.incr("chunk_writer.flushes")
+            return
+        metrics.incr("chunk_writer.flushes")
+        metrics.incr("chunk_writer.rows", len(rows))
+        metrics.observe("chunk_writer.batch_rows", len(rows))
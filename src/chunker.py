@@ -0,0 +1,229 @@
+"""
+ClassRec — the adaptive chunker (where a recording is cut into chunks)
+======================================================================
+
+Chunks used to be cut every CHUNK_DURATION seconds, wherever that fell. Ten
+seconds of a lecture rarely ends between words, so the last word of one chunk
+and the first of the next were each half a word — Whisper guessed at both, and
+deduplicate_overlap was there to clean up what it guessed twice.
+
+The chunker listens instead. StreamingVAD scores each 512-sample window as its
+packet arrives, carrying the LSTM state from window to window for the whole
+connection, so by the time there is enough audio for a chunk it is already known
+where the pauses in it are. A chunk is cut:
+
+  - at the first pause of at least `pause_sec` once it is `min_sec` long — in
+    the middle of the pause, so both chunks keep a little of the silence;
+  - failing that, at `max_sec`, at the quietest window between the two: a
+    lecturer who does not stop for twelve seconds is still cut between
+    syllables more often than not.
+
+So a question asked and answered in seven seconds reaches the page after seven
+seconds, not ten, and Whisper is never handed half a word to guess at.
+
+Cuts fall on window boundaries, and are counted in samples: where a chunk starts
+in the lecture, and what it is billed for, is exact however long it turned out.
+
+The same scores are the chunk's VAD. They used to be computed twice per chunk,
+both after it was cut — once by the silence gate before the Modal call, and
+again in Step 2 after Modal answered, on the critical path both times. Now the
+chunk carries its scores from the moment it is cut, and both read them.
+
+The VAD runs through the executor, one call per packet: the few windows a packet
+holds are a fraction of a millisecond of ONNX, but there is one call per packet
+per socket, and none of it needs the loop.
+
+How long a chunk should be is not fixed either. DurationController picks it per
+connection from what that recording's chunks have been costing: a warm container
+answering in 1.7s can take a chunk every six seconds, and the transcript is
+closer behind for it; a cold start, or a queue building behind a busy one, is
+better served by fewer, longer chunks. The chunker's window is scaled to match.
+
+Reported through metrics:
+    chunker.chunk_sec                       length of each chunk cut (timing)
+    chunker.cut_at_pause / cut_at_max       how each was cut (counters)
+    chunk_control.seconds                   the duration chosen, at each change (timing)
+    chunk_control.longer / shorter          changes, each way (counters)
+"""
+
+import math
+from collections import deque
+
+import numpy as np
+
+import metrics
+from audio import AudioBuffer
+from ort_sessions import VadStepper
+
+
+class StreamingVAD:
+    """
+    Silero VAD over one connection's audio, a window at a time as it arrives.
+
+    One LSTM state for the whole connection, carried from window to window as
+    the model was trained to run — never restarted cold at a chunk's first
+    sample. The scores for audio still in the buffer are kept here; `take`
+    hands a chunk's worth over as the chunk is cut, and the regions are worked
+    out from them without running the model again (regions_from_scores in
+    main.py).
+
+    The socket buffers nothing a window would not fit: chunks are cut on window
+    boundaries, so each window's score belongs to exactly one chunk.
+
+    The audio is scored at the level the model saw before: per-chunk VAD read
+    pcm_to_float's output, the chunk divided by its own peak, so a quiet
+    recording was scored as loud as any other — and Silero's scores depend on
+    it: a lecturer 30dB down, over a microphone's fixed noise floor, scores
+    below VAD_THRESHOLD for most of their speech. There is no chunk, and no
+    chunk peak, while the audio arrives, so each packet's windows are divided
+    by the peak of the last `norm_sec` of audio up to and including the
+    packet — a chunk's worth, as the peak was. scripts/check-streaming-vad.py
+    compares the regions with the per-chunk path's, quiet recordings included.
+    """
+
+    def __init__(self, vad_session, *, sample_rate: int = 16000, window: int = 512,
+                 io_binding: bool = False, norm_sec: float = 10.0):
+        zeros            = np.zeros((2, 1, 64), dtype=np.float32)
+        self._vad        = VadStepper(vad_session, zeros, zeros, sample_rate=sample_rate,
+                                      io_binding=io_binding)
+        self.sample_rate = sample_rate
+        self.window      = window
+        # One speech probability per window of audio still in the buffer, from
+        # its read position: index i is samples [i*window, (i+1)*window).
+        self.scores: list[float] = []
+        # The peak of each of the last norm_sec of windows, scaled to [-1, 1].
+        self._peaks: deque[float] = deque(maxlen=max(1, round(norm_sec * sample_rate / window)))
+
+    def feed(self, buffer: AudioBuffer) -> None:
+        """Score the whole windows that have arrived since the last call. Runs
+        in the executor, once per packet."""
+        scored = len(self.scores) * self.window
+        fresh  = (buffer.buffered - scored) // self.window
+        if fresh <= 0:
+            return
+        pcm = buffer.peek(fresh * self.window, scored)
+        audio = pcm.astype(np.float32) * np.float32(1 / 32768)
+        self._peaks.extend(np.abs(audio).reshape(fresh, self.window).max(axis=1).tolist())
+        peak = max(self._peaks)
+        if peak > 0:
+            audio /= np.float32(peak)
+        for i in range(fresh):
+            w = audio[i * self.window:(i + 1) * self.window].reshape(1, self.window)
+            self.scores.append(self._vad.step(w))
+
+    def take(self, n: int) -> np.ndarray:
+        """The scores of the next `n` samples — a whole number of windows, the
+        chunk being cut — which are forgotten here."""
+        if n % self.window:
+            raise ValueError(f"{n} samples is not a whole number of {self.window}-sample windows")
+        k = n // self.window
+        if k > len(self.scores):
+            raise ValueError(f"only {len(self.scores)} windows scored, asked for {k}")
+        taken = np.array(self.scores[:k], dtype=np.float32)
+        del self.scores[:k]
+        return taken
+
+
+class AdaptiveChunker:
+    """One recording's chunk boundaries, from the scores of its StreamingVAD."""
+
+    def __init__(self, vad: StreamingVAD, *, threshold: float = 0.2,
+                 min_sec: float = 6.0, max_sec: float = 12.0, pause_sec: float = 0.3):
+        self.vad       = vad
+        self.threshold = threshold
+        self.min_sec   = min_sec
+        self.max_sec   = max_sec
+        self.pause_sec = pause_sec
+
+    def cut(self) -> int | None:
+        """
+        Where to cut: the number of samples to take for the next chunk, or None
+        to wait for more. Call after the VAD has been fed the latest packet.
+        """
+        w = self._cut_point()
+        if w is None:
+            return None
+        metrics.observe("chunker.chunk_sec", w * self.vad.window / self.vad.sample_rate)
+        return w * self.vad.window
+
+    def _cut_point(self) -> int | None:
+        """The window index to cut before, or None."""
+        scores  = self.vad.scores
+        per_sec = self.vad.sample_rate / self.vad.window
+        min_w   = max(1, math.ceil(self.min_sec * per_sec))
+        max_w   = max(min_w, int(self.max_sec * per_sec))
+        pause_w = max(1, round(self.pause_sec * per_sec))
+        if len(scores) < min_w:
+            return None
+
+        run = 0
+        for i, score in enumerate(scores[:max_w]):
+            run = run + 1 if score < self.threshold else 0
+            if run >= pause_w:
+                # The middle of the last pause_w quiet windows. While the pause
+                # goes on this slides with it, so a pause that began before
+                # min_sec is cut in as soon as it is past it.
+                middle = i - pause_w + 1 + pause_w // 2
+                if middle >= min_w:
+                    metrics.incr("chunker.cut_at_pause")
+                    return middle
+
+        if len(scores) >= max_w:
+            metrics.incr("chunker.cut_at_max")
+            quiet = scores[min_w:max_w]
+            return min_w + int(np.argmin(quiet)) if quiet else max_w
+        return None
+
+
+class DurationController:
+    """
+    One recording's chunk duration, from the round trips of its chunks and how
+    many of them are in flight.
+
+    `observe` is given each transcription round trip; `update`, called as a
+    chunk is cut, is given the pipeline's depth and may move the duration:
+
+      longer   when two or more chunks are already in flight, or the smoothed
+               round trip is more than `busy` of a chunk — the backend is not
+               keeping up, and each extra request only queues
+      shorter  when nothing is in flight and the round trip is under `idle` of
+               a chunk — the backend has room, so spend it on latency
+
+    by `step` each time, within min_sec..max_sec. Between the two thresholds it
+    holds still, so a duration that suits does not oscillate.
+    """
+
+    def __init__(self, seconds: float, *, min_sec: float = 6.0, max_sec: float = 20.0,
+                 alpha: float = 0.3, busy: float = 0.5, idle: float = 0.25,
+                 step: float = 1.25):
+        self.seconds = min(max_sec, max(min_sec, seconds))
+        self.min_sec = min_sec
+        self.max_sec = max_sec
+        self.alpha   = alpha
+        self.busy    = busy
+        self.idle    = idle
+        self.step    = step
+        self.rtt: float | None = None            # EWMA of round trips, seconds
+
+    def observe(self, rtt: float) -> None:
+        self.rtt = rtt if self.rtt is None else self.alpha * rtt + (1 - self.alpha) * self.rtt
+
+    def update(self, depth: int) -> bool:
+        """Adjust for `depth` chunks in flight. True if the duration changed."""
+        if self.rtt is None:
+            return False                          # nothing measured yet
+        load = self.rtt / self.seconds
+        if depth >= 2 or load > self.busy:
+            target = self.seconds * self.step
+        elif depth == 0 and load < self.idle:
+            target = self.seconds / self.step
+        else:
+            return False
+        # Half-second steps: the page shows it, and 7.8125s says nothing 8 does not.
+        target = round(min(self.max_sec, max(self.min_sec, target)) * 2) / 2
+        if target == self.seconds:
+            return False
+        metrics.incr("chunk_control.longer" if target > self.seconds else "chunk_control.shorter")
+        metrics.observe("chunk_control.seconds", target)
+        self.seconds = target
+        return True
@@ -21,6 +21,7 @@ from jwt import PyJWKClient
 from jwt.exceptions import PyJWKClientError
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession as AsyncDBSession
 from sqlalchemy.orm import Session as DBSession
 
 from database import get_db
@@ -152,6 +153,12 @@ def get_or_create_user(db: DBSession, clerk_user_id: str) -> User:
     return user
 
 
+async def get_or_create_user_async(db: AsyncDBSession, clerk_user_id: str) -> User:
+    """get_or_create_user for code on the event loop — the recording socket. Same
+    race handling, the queries awaited instead of blocking the loop."""
+    return await db.run_sync(get_or_create_user, clerk_user_id)
+
+
 def current_user_optional(request: Request, db: DBSession = Depends(get_db)) -> User | None:
     """The user, or None if this request is anonymous.
 
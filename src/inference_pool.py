@@ -0,0 +1,207 @@
+"""
+ClassRec — the inference pool (where the local models run)
+==========================================================
+
+The models used to run in asyncio's default executor: `run_in_executor(None,
+...)`, a pool of min(32, cores + 4) threads shared with anything else that asks
+for one. Its size had nothing to do with the two-slot semaphore in front of the
+pipeline, or with the cores — so growing the droplet meant finding every number
+that assumed two.
+
+InferencePool is the one place that says how much local inference runs at once:
+
+  threads   `workers` of them, named inference_0, inference_1, ... so a stack
+            dump or py-spy says which thread is a model's. Sized from
+            INFERENCE_WORKERS in main.py — the cores — and nothing else.
+  gate      an asyncio.Semaphore of the same size, for the pipeline: a chunk
+            holds a slot from the moment it is handed over until its result is
+            back, so the ~159MB a run allocates is never held by more chunks than
+            there are threads to run them.
+  short     `short_workers` more threads (inference-short_0, ...) for the work
+            that is a fraction of a millisecond and cannot wait: every packet's
+            streaming VAD, and a chunk's silence gate. With the gate full, every
+            one of `workers` threads is a second or two into a chunk — short work
+            queued behind them would wait that long, on every socket, and the
+            chunker would fall that far behind its audio. On threads of their
+            own they wait for nothing but each other.
+  warm-up   each thread runs `warmup` once, before it takes any work. Startup
+            fills every thread this way, so the first chunk on each pays for
+            nothing the model does only the first time it runs on a thread.
+
+Growing the droplet is then one setting: INFERENCE_WORKERS.
+
+Threads only run in parallel where the models let go of the GIL, and not all of
+the pipeline is the models: the per-window VAD loop, turning scores into
+regions, stitching words — Python, holding the GIL, and competing with the event
+loop for it. With `processes` set, the pool also keeps that many long-lived
+worker processes, started with `process_init` (which loads the models, once per
+process), and `run_in_process` runs work there. The chunk's audio goes through
+multiprocessing.shared_memory — one copy into a block the worker maps, instead
+of pickling 640KB through a pipe and unpickling it on the other side. Everything
+else a call takes and returns is pickled, so it should be small. Each process
+holds its own copy of the models: memory, traded for a GIL of its own. Work in
+the processes has a gate of its own, sized by `processes` — sized by the
+threads, PIPELINE_PROCESSES above INFERENCE_WORKERS would leave the extra
+processes with nothing to run.
+scripts/bench-pipeline-modes.py measures what it buys.
+
+Reported through metrics:
+    inference.queue_wait     submitted → started on a thread, seconds (timing);
+                             for the pipeline, including the wait for the gate
+    inference.run            started → finished, seconds (timing)
+    inference.short_queue_wait, inference.short_run
+                             the same, for short work
+    inference.workers        threads in the pool (gauge)
+    inference.short_workers  threads for short work (gauge)
+    inference.processes      worker processes, 0 without them (gauge)
+
+Metrics a function reports from inside a worker process stay in that process;
+queue wait and run time are measured here, for both.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import metrics
+from logger import logger
+
+
+def _in_process(fn, shm_name: str, shape: tuple, dtype: str, args: tuple):
+    """
+    Runs in a worker process: `fn(samples, *args)`, `samples` a view of the
+    shared block — no copy on this side either. Returns the result with when it
+    started and how long it ran, for the parent's metrics.
+    """
+    started = time.monotonic()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        samples = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        result  = fn(samples, *args)
+        del samples
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            # Something fn kept still points into the block. It is unmapped
+            # when that goes; the parent unlinks the name either way.
+            pass
+    return result, started, time.monotonic() - started
+
+
+def _pid() -> int:
+    return os.getpid()
+
+
+class InferencePool:
+    def __init__(self, workers: int, *, short_workers: int = 1, warmup=None,
+                 name: str = "inference", processes: int = 0, process_init=None):
+        self.workers       = max(1, workers)
+        self.short_workers = max(1, short_workers)
+        self.processes     = max(0, processes)
+        self.gate          = asyncio.Semaphore(self.workers)
+        self.process_gate  = asyncio.Semaphore(max(1, self.processes))
+        self._warmup       = warmup
+        self._pool         = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=name,
+                                                initializer=self._init_thread)
+        self._short        = ThreadPoolExecutor(max_workers=self.short_workers,
+                                                thread_name_prefix=f"{name}-short",
+                                                initializer=self._init_thread)
+        self._procs: ProcessPoolExecutor | None = None
+        if self.processes:
+            # Spawned, not forked: a fork of a process with ORT and torch thread
+            # pools can inherit a lock some thread held, and deadlock on it.
+            self._procs = ProcessPoolExecutor(max_workers=self.processes,
+                                              mp_context=multiprocessing.get_context("spawn"),
+                                              initializer=process_init)
+        metrics.set_gauge("inference.workers", self.workers)
+        metrics.set_gauge("inference.short_workers", self.short_workers)
+        metrics.set_gauge("inference.processes", self.processes)
+
+    def _init_thread(self) -> None:
+        if self._warmup is None:
+            return
+        t0 = time.perf_counter()
+        try:
+            self._warmup()
+        except Exception as e:
+            # A warm-up that fails costs the first chunk its speed, not the thread.
+            logger.warning(f"[inference] warm-up failed on {threading.current_thread().name}: {e}")
+            return
+        logger.debug(f"[inference] {threading.current_thread().name} warm in "
+                     f"{time.perf_counter() - t0:.2f}s")
+
+    async def start(self) -> None:
+        """
+        Start every thread now, so each runs its warm-up at startup rather than
+        in front of the first chunk it is given. The pool starts a thread per
+        submit only while none is idle, so each task holds its thread until all
+        of them have one.
+        """
+        loop = asyncio.get_running_loop()
+        for pool, n in ((self._pool, self.workers), (self._short, self.short_workers)):
+            barrier = threading.Barrier(n)
+            await asyncio.gather(*(loop.run_in_executor(pool, barrier.wait) for _ in range(n)))
+        if self._procs is not None:
+            # A process is spawned per submit while none is idle, and none is
+            # until its initializer has loaded the models — so these start
+            # every one, and return once all of them are ready.
+            pids = await asyncio.gather(*(loop.run_in_executor(self._procs, _pid)
+                                          for _ in range(self.processes)))
+            logger.info(f"[inference] {len(set(pids))} worker processes ready")
+
+    async def run(self, fn, *args):
+        """`fn(*args)` on a short-work thread: for calls of a millisecond or
+        so, which must not queue behind the pipeline."""
+        return await self._submit(self._short, "inference.short_", time.monotonic(), fn, args)
+
+    async def run_gated(self, fn, *args):
+        """`fn(*args)` on an inference thread, holding a gate slot throughout."""
+        asked = time.monotonic()
+        async with self.gate:
+            return await self._submit(self._pool, "inference.", asked, fn, args)
+
+    def _submit(self, pool, prefix: str, asked: float, fn, args):
+        def timed():
+            started = time.monotonic()
+            metrics.observe(prefix + "queue_wait", started - asked)
+            try:
+                return fn(*args)
+            finally:
+                metrics.observe(prefix + "run", time.monotonic() - started)
+        return asyncio.get_running_loop().run_in_executor(pool, timed)
+
+    async def run_in_process(self, fn, samples: np.ndarray, *args):
+        """
+        `fn(samples, *args)` in a worker process, holding a process-gate slot
+        throughout; `samples` travels through shared memory. `fn` must be
+        importable by name — a module-level function — as must its arguments
+        and result be picklable.
+        """
+        asked = time.monotonic()
+        async with self.process_gate:
+            samples = np.ascontiguousarray(samples)
+            shm = shared_memory.SharedMemory(create=True, size=max(1, samples.nbytes))
+            try:
+                np.ndarray(samples.shape, samples.dtype, buffer=shm.buf)[...] = samples
+                result, started, ran = await asyncio.get_running_loop().run_in_executor(
+                    self._procs, _in_process, fn, shm.name, samples.shape, samples.dtype.str, args)
+            finally:
+                shm.close()
+                shm.unlink()
+        metrics.observe("inference.queue_wait", started - asked)
+        metrics.observe("inference.run", ran)
+        return result
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._short.shutdown(wait=False, cancel_futures=True)
+        if self._procs is not None:
+            self._procs.shutdown(wait=False, cancel_futures=True)
+
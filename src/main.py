@@ -6,46 +6,44 @@ import os
 from dotenv import load_dotenv
 import asyncio
 from functools import partial
-import soundfile as sf
 from typing import Tuple
+from dataclasses import dataclass
 from validators import validate_audio_file
 from pathlib import Path
 import json
-import io
-import httpx
+import math
+from bisect import bisect_right
 from logger import logger
 import datetime
 from sqlalchemy import update, select, func, desc  # update: the atomic usage increment
 from sqlalchemy.orm import Session       # the DB session TYPE (for the type hint)
-from database import get_db, SessionLocal  # get_db for routes; SessionLocal for the WS handler
+from database import get_db, AsyncSessionLocal, async_engine  # get_db for routes; async for the WS handler
 import repository as repo                  # our data operations (create/list/...)
+import metrics                             # in-process counters, read by /metrics
+from chunk_writer import ChunkWriter       # group commit for transcript chunks
+from usage_meter import UsageMeter         # write-behind live_seconds
+from transcription import (TranscriptionBackend, ModalBackend, LocalBackend,
+                           ResilientBackend)  # Step 1: Modal, or Whisper on this CPU
+from audio import AudioBuffer, pcm_to_float # the socket's PCM buffer, and int16 → float32
+from ort_sessions import load_session, VadStepper  # how the ONNX models are opened and run
+from chunker import StreamingVAD, AdaptiveChunker, DurationController  # where, and how often, audio is cut
+from speaker_encoder import (TorchSpeakerEncoder, OnnxSpeakerEncoder,  # ECAPA, a batch of
+                             EmbeddingBatcher, length_groups,         # segments per forward pass
+                             read_check)
+from inference_pool import InferencePool   # the threads the models run on
 from clerk_auth import (current_user, current_user_optional,
-                        clerk_user_id_from_token, get_or_create_user, AuthError)
+                        clerk_user_id_from_token, get_or_create_user_async, AuthError)
 from models import User, Signal            # for the usage write on the socket, and /admin
 # models.Session is a lecture; sqlalchemy.orm.Session above is the DB session.
 # Two different things with one name, so the table gets the name it is read by.
 from models import Session as Lecture
 from pydantic import BaseModel, Field, field_validator
 import sentry_sdk
-import onnxruntime as ort
 import numpy as np
 import psutil
 import tracemalloc
-import torch
 import warnings
 warnings.filterwarnings("ignore")
-torch.backends.nnpack.enabled = False
-
-# One thread per inference, so chunks are what run in parallel rather than the
-# insides of a single inference. Torch otherwise takes a thread per core for one
-# forward pass, which combined with the semaphore below would put four threads on
-# two cores — each slower, no more throughput, and the event loop starved of the
-# slices it needs to keep draining audio.
-#
-# Parallelism has to come from one place or the other. Across chunks is the
-# better choice for a server: independent work needs no coordination, and nobody
-# is waiting on a single chunk when they arrive ten seconds apart.
-torch.set_num_threads(1)
 
 sentry_sdk.init(
     dsn="https://f62227a4abc04cfda1165ef380cdc745@o4511040460488704.ingest.us.sentry.io/4511040467566592",
@@ -73,7 +71,9 @@ WAITLIST_MESSAGE = (
 app = FastAPI()
 
 # How many chunks may run the models at once. One per core: this is what can
-# actually compute, and the machine is a 2 vCPU / 4 GB droplet.
+# actually compute, and the machine is a 2 vCPU / 4 GB droplet. It sizes the
+# inference pool — its threads, and the gate in front of the pipeline — so a
+# resize is this one setting. See inference_pool.py.
 #
 # It is not a memory limit any more. Measured, a run peaks at ~159MB, so two is
 # ~320MB of 4GB — comfortable. Cores are the binding constraint, which is why the
@@ -83,7 +83,56 @@ app = FastAPI()
 # loaded once with .eval(), called under torch.no_grad(), so a forward pass
 # mutates nothing. Two threads share the weights and keep their own activations.
 # Measured on this model: 0.19s sequential, 0.12s concurrent, identical results.
-_pipeline_semaphore = asyncio.Semaphore(2)
+#
+# The default counts the CPUs this process may run on, not the host's:
+# os.cpu_count() ignores taskset and docker --cpuset-cpus, and would size the
+# pool (and its ~159MB a run) for cores the process cannot use. A CPU quota
+# (docker --cpus) is not an affinity and does not show here — set the variable.
+# Where affinity cannot be read (macOS), 2, the droplet's count.
+def _usable_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0)) or 2
+    except AttributeError:
+        return 2
+
+
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", str(_usable_cpus())))
+
+# Threads of their own for the sub-millisecond work — each packet's streaming
+# VAD, the silence gate — so it never waits behind a pipeline that has every one
+# of the INFERENCE_WORKERS threads busy for seconds. One keeps up with hundreds
+# of sockets' packets; see inference_pool.py.
+INFERENCE_SHORT_WORKERS = int(os.getenv("INFERENCE_SHORT_WORKERS", "1"))
+
+# One thread per inference, so chunks are what run in parallel rather than the
+# insides of a single inference. Torch otherwise takes a thread per core for one
+# forward pass, which combined with the workers above would put four threads on
+# two cores — each slower, no more throughput, and the event loop starved of the
+# slices it needs to keep draining audio.
+#
+# Parallelism has to come from one place or the other. Across chunks is the
+# better choice for a server: independent work needs no coordination, and nobody
+# is waiting on a single chunk when they arrive ten seconds apart.
+#
+# The ONNX models (VAD, segmentation) get the same number — see ort_sessions.py.
+# They used to get ONNX Runtime's default, a spinning pool of a thread per core.
+#
+# Set on torch where it is imported — at startup, and only if the speaker
+# encoder runs on it (SPEAKER_ENCODER below).
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "1"))
+
+# Where Steps 2-7 run: "thread", on the inference pool's threads, or "process",
+# in PIPELINE_PROCESSES long-lived worker processes that each load the models
+# once — a GIL apiece, so the Python between the model calls stops competing
+# with the event loop, for a copy of the models per process. The socket's own
+# VAD and enrollment stay on the threads. In process mode PIPELINE_PROCESSES,
+# not INFERENCE_WORKERS, is how many chunks run Steps 2-7 at once. See
+# inference_pool.py, and scripts/bench-pipeline-modes.py for what it buys on a
+# given machine. Memory is (PIPELINE_PROCESSES + 1) copies of the models, less
+# segmentation in the server process; not yet run end to end with the real
+# models — see SCALING.md.
+PIPELINE_MODE      = os.getenv("PIPELINE_MODE", "thread")
+PIPELINE_PROCESSES = int(os.getenv("PIPELINE_PROCESSES", str(INFERENCE_WORKERS)))
 
 # ======= MEMORY TRACKING =======
 _process = psutil.Process(os.getpid())
@@ -91,6 +140,14 @@ _mem_baseline_mb: float = 0.0
 _mem_after_models_mb: float = 0.0
 
 BASE_DIR = Path(__file__).parent.parent
+
+# How the ONNX models are opened — see ort_sessions.py. The optimisation level
+# (off|basic|extended|all), where optimised graphs are cached between restarts
+# ("" for nowhere), and whether VAD runs through IOBinding — off, as it measured
+# slower for a model this small (scripts/bench-ort-sessions.py).
+ORT_OPTIMIZATION  = os.getenv("ORT_OPTIMIZATION", "all")
+ORT_CACHE_DIR     = os.getenv("ORT_CACHE_DIR", str(BASE_DIR / "models" / ".ort-cache")) or None
+ORT_IO_BINDING    = os.getenv("ORT_IO_BINDING", "0") == "1"
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 templates.env.globals["clerk_key"] = CLERK_PUBLISHABLE_KEY
 # Cache-busting: changes whenever the server (re)starts, so browsers re-fetch
@@ -107,20 +164,156 @@ BYTES_PER_SAMPLE  = 2
 BYTES_PER_SECOND  = SAMPLE_RATE * BYTES_PER_SAMPLE  # 32,000
 CHUNK_DURATION    = 10
 CHUNK_BYTES       = BYTES_PER_SECOND * CHUNK_DURATION   # 10s advance per chunk
+CHUNK_SAMPLES     = SAMPLE_RATE * CHUNK_DURATION
+
+# Where chunks are cut — see chunker.py.
+#   adaptive  at a pause, once a chunk is CHUNK_MIN_SEC long; at the quietest
+#             moment before CHUNK_MAX_SEC if nobody pauses
+#   fixed     every CHUNK_DURATION seconds, wherever that falls, as before —
+#             also what a server without the VAD model does
+CHUNKER           = os.getenv("CHUNKER", "adaptive")
+CHUNK_MIN_SEC     = float(os.getenv("CHUNK_MIN_SEC", "6"))
+CHUNK_MAX_SEC     = float(os.getenv("CHUNK_MAX_SEC", "12"))
+CHUNK_PAUSE_SEC   = float(os.getenv("CHUNK_PAUSE_SEC", "0.3"))
+
+# How long a chunk is, per connection — see DurationController in chunker.py.
+# CHUNK_DURATION is where each recording starts; from there its chunks get
+# shorter while its round trips are quick and nothing queues, and longer while
+# they are slow or do, between these bounds. The adaptive chunker's window
+# scales with it: 6-12s around 10, 12-24s around 20. 0 keeps CHUNK_DURATION.
+CHUNK_CONTROL         = os.getenv("CHUNK_CONTROL", "1") == "1"
+CHUNK_CONTROL_MIN_SEC = float(os.getenv("CHUNK_CONTROL_MIN_SEC", "6"))
+CHUNK_CONTROL_MAX_SEC = float(os.getenv("CHUNK_CONTROL_MAX_SEC", "20"))
+
+# How much audio a socket may hold uncut before the client is told it is sending
+# too fast. Twice the longest chunk that can be cut — 48s, 1.5MB, at the
+# defaults — allocated once per connection. A chunk is cut the moment there is
+# one, so in practice it never holds more than one chunk and a packet.
+_LONGEST_CHUNK_SEC = max(CHUNK_DURATION, CHUNK_MAX_SEC) * (
+    max(1.0, CHUNK_CONTROL_MAX_SEC / CHUNK_DURATION) if CHUNK_CONTROL else 1.0)
+BUFFER_SAMPLES    = int(SAMPLE_RATE * _LONGEST_CHUNK_SEC) * 2
 
 MODAL_WHISPER_URL = os.getenv("MODAL_WHISPER_URL", "")  # set after: modal deploy modal_whisper.py
 
+# Chunks from different sockets that arrive within BATCH_MS of each other go to
+# Modal as one request, up to BATCH_MAX of them — see whisper_batcher.py. 0 sends
+# every chunk on its own, as before; so must a deployment without a /batch route.
+# Off until scripts/check-modal-batch.py has passed against the deployment: it
+# posts the same clips through /batch and through / and compares the words.
+# 50 is the window the batcher was sized for.
+WHISPER_BATCH_MS  = int(os.getenv("WHISPER_BATCH_MS", "0"))
+WHISPER_BATCH_MAX = int(os.getenv("WHISPER_BATCH_MAX", "8"))
+
+# Live chunks stream from Modal's /stream route, and the page is sent each
+# segment's words as interim text while the rest of the chunk is still being
+# decoded. The final, speaker-filtered words replace them. Off by default: /stream
+# decodes with faster-whisper's own transcribe, not stable-ts, so a streamed
+# chunk's final words carry faster-whisper's timestamps — and
+# stitch_professor_words and the speaker filter keep words by those timestamps.
+# Turn it on once scripts/check-modal-stream.py has measured how far the words
+# move against / on the deployment. A streamed chunk is also a request of its
+# own, outside the batcher, so with WHISPER_BATCH_MS set too nothing is batched.
+WHISPER_STREAM    = os.getenv("WHISPER_STREAM", "0") == "1"
+
+# What a chunk travels to Modal as:
+#   flac   lossless, a third to a half fewer bytes than raw 16-bit speech; ~3ms
+#          of CPU each side, spent in the executor here and in memory there
+#   opus   lossy, a tenth of the bytes — only for a slow uplink: libsndfile takes
+#          ~0.5s of CPU to encode 10s, and Whisper hears a codec's version of
+#          the room (scripts/bench-modal-codec.py)
+#   pcm16  raw int16 samples behind a 12-byte header — no encoding at all, the
+#          most bytes (see audio.py)
+#   f16    the same, float16 samples
+#   wav    a WAV file, for an endpoint deployed before any of the above existed
+MODAL_AUDIO_CODEC = os.getenv("MODAL_AUDIO_CODEC", "flac")
+
+# Which Whisper answers Step 1 — see transcription.py.
+#   TRANSCRIPTION_BACKEND   modal | local. The deployment's default; modal when
+#                           MODAL_WHISPER_URL is set, local otherwise
+#   TRANSCRIPTION_FALLBACK  modal | local | none — tried when the backend fails
+#   TRANSCRIPTION_PLANS     per-plan overrides, "free=local,pro=modal"; a plan not
+#                           listed gets the default
+TRANSCRIPTION_BACKEND  = os.getenv("TRANSCRIPTION_BACKEND",
+                                   "modal" if MODAL_WHISPER_URL else "local")
+TRANSCRIPTION_FALLBACK = os.getenv("TRANSCRIPTION_FALLBACK", "none")
+TRANSCRIPTION_PLANS    = dict(
+    pair.split("=", 1) for pair in os.getenv("TRANSCRIPTION_PLANS", "").split(",") if "=" in pair)
+# The local backend: a small English model, int8 on the CPU. base.en keeps up
+# with live audio on two cores; small.en is noticeably better and needs four.
+LOCAL_WHISPER_MODEL   = os.getenv("LOCAL_WHISPER_MODEL", "base.en")
+LOCAL_WHISPER_THREADS = int(os.getenv("LOCAL_WHISPER_THREADS", "2"))
+LOCAL_WHISPER_WORKERS = int(os.getenv("LOCAL_WHISPER_WORKERS", "1"))
+
+# Each backend is wrapped in a ResilientBackend — see transcription.py.
+# DEADLINE is a chunk's whole budget for Step 1, retries and hedges included:
+# enough for one cold start (~43s) and a retry behind it. Past that the page has
+# had three more chunks and the words would arrive too late to follow along with.
+# ATTEMPT bounds one request inside it, so a hung connection cannot spend it all.
+TRANSCRIBE_DEADLINE_SEC = float(os.getenv("TRANSCRIBE_DEADLINE_SEC", "60"))
+TRANSCRIBE_ATTEMPT_SEC  = float(os.getenv("TRANSCRIBE_ATTEMPT_SEC", "45"))
+# A second copy goes out when the first has taken longer than this quantile of
+# recent answers. Retries and hedges together: at most RETRY_RATIO of traffic.
+TRANSCRIBE_HEDGE_Q      = float(os.getenv("TRANSCRIBE_HEDGE_Q", "0.95"))
+TRANSCRIBE_RETRY_RATIO  = float(os.getenv("TRANSCRIBE_RETRY_RATIO", "0.1"))
+# After this many failed requests in a row the backend is not asked for
+# COOLDOWN seconds; chunks go to the fallback, or fail at once without one.
+BREAKER_FAILURES        = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_SEC    = float(os.getenv("BREAKER_COOLDOWN_SEC", "30"))
+
+# Transcript chunks are written in batches — see chunk_writer.py. FLUSH_MS is the
+# durability bound: the most transcript, in milliseconds of waiting, a crash can
+# lose. FLUSH_ROWS writes a batch early when that many chunks are queued.
+CHUNK_FLUSH_MS    = int(os.getenv("CHUNK_FLUSH_MS", "500"))
+CHUNK_FLUSH_ROWS  = int(os.getenv("CHUNK_FLUSH_ROWS", "64"))
+
 # VAD
 VAD_WINDOW_SIZE   = 512
 VAD_THRESHOLD     = 0.2
 VAD_PAD_SEC       = 0.2
 
+# Silence gate — VAD on the server before a chunk goes to Modal. See speech_regions.
+#   off     send every chunk whole, as before
+#   skip    chunks with no speech are not sent at all; the rest go whole
+#   trim    no-speech chunks skipped, and leading/trailing silence cut from the rest
+#   voiced  no-speech chunks skipped, and ONLY the speech regions sent, spliced
+#           together — the silence between sentences goes too. See pack_voiced.
+SILENCE_GATE      = os.getenv("SILENCE_GATE", "trim")
+# Kept either side of the speech found. Wider than VAD_PAD_SEC because the gate
+# runs from a cold LSTM state, which scores the first 0.3-0.5s of speech low.
+GATE_PAD_SEC      = 0.5
+# Voiced mode: the silence put back between two spliced regions. Without any,
+# Whisper hears the last word of one sentence run into the first of the next.
+VOICED_GAP_SEC    = 0.3
+
 # Segmentation
 SEG_THRESHOLD     = 0.3
 MIN_REGION_SEC    = 1.5
+# Segment a chunk's regions in padded batches of similar length — see
+# get_segments. Padding can change a short row's output anywhere in it, not
+# just at its end, so this stays off (the model once per region, as before)
+# until scripts/check-segmentation.py has compared both paths on the real model
+# and recordings. A batch is split rather than be more than SEG_MAX_PADDING
+# padding; 0 batches only regions of the same length.
+SEG_BATCH         = os.getenv("SEG_BATCH", "0") == "1"
+SEG_MAX_PADDING   = float(os.getenv("SEG_MAX_PADDING", "0.1"))
 
 # Embedding
 MIN_SEGMENT_SEC   = 0.5
+# A chunk's segments are embedded in padded batches — see speaker_encoder.py. A
+# batch is split rather than be more than ECAPA_MAX_PADDING padding (1 never
+# splits). 0 batches only segments of the same length, which embed exactly as
+# they do alone: padding moves the others' embeddings, and by how much on the
+# trained model — and what it buys on the droplet — scripts/bench-ecapa-batch.py
+# has not yet been run to say. ECAPA_BATCH_WAIT_MS > 0 also lets concurrent
+# chunks share a forward pass, each waiting up to that long for the other.
+ECAPA_MAX_PADDING   = float(os.getenv("ECAPA_MAX_PADDING", "0"))
+ECAPA_BATCH_WAIT_MS = int(os.getenv("ECAPA_BATCH_WAIT_MS", "0"))
+# What runs ECAPA-TDNN: "torch" (SpeechBrain, as it always has), "onnx" (the
+# export from scripts/export-ecapa-onnx.py, through ONNX Runtime — torch and
+# SpeechBrain are then never imported), or "onnx-int8" (the same, with INT8
+# weights). An ONNX mode whose file is missing, or has not passed
+# scripts/check-speaker-encoder.py against SpeechBrain, falls back to torch, loudly.
+SPEAKER_ENCODER     = os.getenv("SPEAKER_ENCODER", "torch")
 
 # Similarity
 SIMILARITY_THRESHOLD = 0.20
@@ -137,11 +330,15 @@ FREE_LIVE_SECONDS  = 20 * 60      # a signed-in account, free plan
 FREE_UPLOAD_SECONDS = 30 * 60
 
 # How many recordings one account may have open at once. Not a quota — the quota
-# is shared and already correct across tabs. This bounds the SLACK in it: a socket
-# learns the shared total when a chunk of its own is billed, so it can be up to
-# CHUNK_DURATION seconds behind, and the worst-case overshoot is CHUNK_DURATION x
-# this number — under a minute at five. It also leaves room for a phone, a laptop,
-# and a reconnect racing a socket that has not finished closing.
+# is shared and already correct across tabs. This bounds the SLACK in it: a chunk
+# is billed when Modal answers, so each open socket can have up to CHUNK_DURATION
+# seconds in flight past the ceiling, and the worst-case overshoot is
+# CHUNK_DURATION x this number — under a minute at five. It also leaves room for a
+# phone, a laptop, and a reconnect racing a socket that has not finished closing.
+
+# Live usage is billed in memory and written behind — see usage_meter.py. This is
+# how often the owed seconds are written, and so the most a crash can forget.
+USAGE_FLUSH_SEC = float(os.getenv("USAGE_FLUSH_SEC", "5"))
 MAX_SOCKETS_PER_USER = 5
 
 # Recording requires an account. An anonymous allowance cannot be a real limit:
@@ -177,57 +374,23 @@ class ContextMessage(BaseModel):
     token: str = ""
 
 
-# ======= AUDIO HELPERS =======
-def pcm_to_float(pcm_bytes: bytes) -> np.ndarray:
-    """
-    Convert raw PCM int16 bytes → float32 numpy array.
-    Browser sends 16-bit PCM. Models expect float32 in [-1, 1].
-    """
-    samples = np.frombuffer(pcm_bytes, dtype=np.int16).astype(np.float32) / 32768.0
-    if np.abs(samples).max() > 0:
-        samples = samples / np.abs(samples).max()
-    return samples
-
-
-# ======= STEP 1: WHISPER VIA MODAL (faster-whisper large-v3 + stable-ts on T4 GPU) =======
-# Transcription runs remotely on Modal — no GPU or Whisper model on this server.
-#
-# An async client, so the ~1.7s wait costs no thread. With a blocking client the
-# call had to be pushed to the executor purely to keep it off the event loop,
-# which meant one pool thread asleep per request in flight, and a dropped
-# connection left that thread stuck until Modal answered or the timeout fired.
-# An await can simply be cancelled.
-_modal_async: "httpx.AsyncClient | None" = None
-
-
-async def transcribe_with_timestamps(samples: np.ndarray) -> list[dict]:
-    """
-    Send audio to the Modal Whisper endpoint and return word-level timestamps.
-    Returns list of {"word": str, "start": float, "end": float}.
+# ======= STEP 1: WHISPER (transcription.py) =======
+# Modal's faster-whisper large-v3 on a T4 by default, or a small model on this
+# CPU — one instance of each backend in use, started with the app. A request is
+# served by the backend for its account's plan, wrapped in the fallback if one is
+# configured.
+_backends: dict[str, TranscriptionBackend] = {}       # name / "default" → what serves it
+_started_backends: list[TranscriptionBackend] = []    # each once, for shutdown
 
-    Why send the full chunk before any speaker filtering?
-    Whisper needs full audio context to be accurate. We transcribe everything,
-    then main.py filters by speaker timestamps using the local ECAPA-TDNN pipeline.
+# One each for the process, started with the app. See chunk_writer.py and
+# usage_meter.py.
+_chunk_writer: ChunkWriter | None = None
+_usage_meter:  UsageMeter | None = None
 
-    Cold start: first request after idle spins up a T4 container. Measured at
-    42.9s for a 10s chunk — container boot and image pull, not just model load.
-    Warm requests: ~1-2s round-trip for the same chunk.
-    """
-    buf = io.BytesIO()
-    sf.write(buf, samples, SAMPLE_RATE, format="WAV")     # ~1ms, fine on the loop
-    wav_bytes = buf.getvalue()
-
-    logger.debug(f"[whisper] calling Modal ({len(samples)/SAMPLE_RATE:.1f}s audio)")
-    response = await _modal_async.post(
-        MODAL_WHISPER_URL,
-        content=wav_bytes,
-        headers={"Content-Type": "audio/wav"},
-    )
-    response.raise_for_status()
-    words = response.json()
 
-    logger.debug(f"[whisper] {len(words)} words transcribed")
-    return words
+def transcription_backend(plan: str | None = None) -> TranscriptionBackend:
+    """The backend for an account on `plan` — None for a socket not yet signed in."""
+    return _backends.get(TRANSCRIPTION_PLANS.get(plan or "", ""), _backends["default"])
 
 
 # ======= TEXT ANALYSIS =======
@@ -262,10 +425,14 @@ def _run_pipeline_sync(
     similarity_threshold: float,
     session_state: dict,
     chunk_offset: float,
+    vad_scores: np.ndarray | None = None,
 ) -> dict | None:
     """
     The model half of the pipeline: Steps 2-7, VAD through dedup.
 
+    `vad_scores`, when the connection's StreamingVAD scored the chunk as it
+    arrived, make Step 2 a pass over those scores instead of the model.
+
     Whisper (Step 1) used to run in here too. It is a call to Modal, which means
     two of the two and a half seconds this took were spent waiting on a remote
     GPU — while holding the semaphore that exists to cap MEMORY. Every other
@@ -275,8 +442,8 @@ def _run_pipeline_sync(
     limit guards only the part that actually allocates: VAD, segmentation and
     ECAPA.
 
-    Runs in a thread pool via run_in_executor so the async event loop stays free
-    to handle other users while models are running.
+    Runs on the inference pool (inference_pool.py) so the async event loop
+    stays free to handle other users while models are running.
     Returns a JSON-ready dict to send, or None if nothing to send.
     """
     raw_transcript = ' '.join(w['word'] for w in words).strip()
@@ -307,10 +474,17 @@ def _run_pipeline_sync(
         word_list = [{"w": w["word"], "s": round(w["start"] + chunk_offset, 3), "e": round(w["end"] + chunk_offset, 3)} for w in final_words]
         return {"type": "transcription", "text": transcript, "tags": detected_tags, "words": word_list}
 
-    # Step 2: VAD — find speech regions, filter silence
-    vad_h = session_state.get('vad_h', np.zeros((2, 1, 64), dtype=np.float32))
-    vad_c = session_state.get('vad_c', np.zeros((2, 1, 64), dtype=np.float32))
-    vad_regions, region_end_states = get_vad_regions(samples, vad_h, vad_c)
+    # Step 2: VAD — find speech regions, filter silence. Already done, if the
+    # chunk came with its scores: the stream carried one LSTM state through the
+    # whole recording, which is what the state saved below approximates, so
+    # there is no state to save either.
+    if vad_scores is not None:
+        vad_regions = regions_from_scores(vad_scores, len(samples) / SAMPLE_RATE)
+        region_end_states = []
+    else:
+        vad_h = session_state.get('vad_h', np.zeros((2, 1, 64), dtype=np.float32))
+        vad_c = session_state.get('vad_c', np.zeros((2, 1, 64), dtype=np.float32))
+        vad_regions, region_end_states = get_vad_regions(samples, vad_h, vad_c)
     logger.debug(f"[vad] {len(vad_regions)} regions: {[(round(s,1), round(e,1)) for s,e in vad_regions]}")
     if not vad_regions:
         logger.debug("[chunk] no speech regions detected by VAD")
@@ -374,8 +548,119 @@ def _run_pipeline_sync(
     return {"type": "transcription", "text": transcript, "tags": detected_tags, "words": word_list}
 
 
-async def transcribe_chunk(
-    pcm_bytes: bytes,
+async def fetch_chunk_words(
+    samples: np.ndarray,
+    duration: float,
+    websocket: WebSocket,
+    user_id: int | None = None,
+    usage_state: dict | None = None,
+    backend: TranscriptionBackend | None = None,
+    chunk_idx: int = 0,
+    on_rtt=None,
+    vad_scores: np.ndarray | None = None,
+) -> list[dict]:
+    """
+    Step 1 of a chunk, and its bill: Whisper, on Modal or whichever backend the
+    account's plan is served by.
+
+    With WHISPER_STREAM, the words so far are sent to the page as they arrive, as
+    {"type": "partial", "chunk": chunk_idx, "text": ...}. Interim only: they are
+    not speaker-filtered, deduplicated or stored, and finish_chunk's answer for
+    the same chunk replaces them.
+
+    `on_rtt`, if given, is told how long the backend took to answer — the
+    connection's DurationController. A chunk the gate kept back tells it nothing.
+
+    Runs concurrently with the other chunks of the same recording — it touches
+    nothing they share except the meter, which only adds. Everything after this
+    runs in chunk order; see ChunkPipeline.
+    """
+    # Silence gate — is there anything here worth a GPU? Usually answered by the
+    # scores the chunk was cut with, at no cost. Without them VAD is a few ms of
+    # CPU, so it goes to the inference pool's short-work threads, not through
+    # its gate, which is for the ~159MB models. If it fails the chunk is sent
+    # whole, as it would have been without the gate.
+    sent, table = samples, None
+    if SILENCE_GATE != "off" and _vad_session is not None:
+        try:
+            if vad_scores is not None:
+                regions = speech_regions(samples, vad_scores)
+            else:
+                regions = await _inference_pool.run(speech_regions, samples)
+        except Exception as e:
+            logger.warning(f"[gate] VAD failed, sending the chunk whole: {e}")
+            regions = [(0.0, len(samples) / SAMPLE_RATE)]
+        if not regions:
+            logger.debug(f"[gate] no speech in {duration:.1f}s, not sent")
+            metrics.incr("silence_gate.skipped_chunks")
+            metrics.incr("silence_gate.skipped_gpu_seconds", duration)
+            return []
+        if SILENCE_GATE == "trim":
+            regions = [(regions[0][0], regions[-1][1])]
+        if SILENCE_GATE in ("trim", "voiced"):
+            packed, packed_table = pack_voiced(samples, regions)
+            if len(packed) < len(samples):
+                sent, table = packed, packed_table
+                metrics.incr(f"silence_gate.{SILENCE_GATE}_chunks")
+                metrics.incr("silence_gate.skipped_gpu_seconds",
+                             (len(samples) - len(sent)) / SAMPLE_RATE)
+
+    # Step 1 — Whisper, on Modal. Network waiting, a few MB, no models: it is
+    # deliberately OUTSIDE the inference gate so chunks can wait on the GPU
+    # concurrently instead of single file. This was the whole bottleneck.
+    #
+    # Why send the full chunk before any speaker filtering?
+    # Whisper needs full audio context to be accurate. We transcribe everything,
+    # then Steps 2-7 filter by speaker timestamps using the local ECAPA-TDNN pipeline.
+    async def on_partial(so_far: list[dict]) -> None:
+        text = filter_hallucinations(" ".join(w["word"] for w in so_far))
+        try:
+            await websocket.send_json({"type": "partial", "chunk": chunk_idx, "text": text})
+        except Exception:
+            pass          # the page is gone; the chunk still finishes
+
+    t0 = _time.monotonic()
+    words = await (backend or transcription_backend()).transcribe(
+        sent, on_partial if WHISPER_STREAM else None)
+    if on_rtt is not None:
+        on_rtt(_time.monotonic() - t0)
+    logger.debug(f"[whisper] {len(words)} words transcribed")
+    # Back onto the chunk's own timeline — Steps 2-7, stitch included, read the
+    # whole chunk.
+    if table is not None:
+        remap_words(words, table)
+
+    # Billed here, and only here: Modal answered, so the thing the account
+    # pays for was delivered. A call that times out or errors raises above
+    # this line and costs nothing, which is the whole point — audio arriving
+    # is not a transcript, and the meter used to run on the audio.
+    #
+    # An empty answer still counts. Silence the gate let through, or speech the
+    # speaker filter removes, is Modal having run and replied; what it was sent
+    # is the measure, not what survived the pipeline afterwards.
+    #
+    # The meter answers from memory, with every tab of the account counted;
+    # the database catches up within USAGE_FLUSH_SEC.
+    #
+    # Billed for the audio actually sent — the chunk as cut, or several of them
+    # when the pipeline coalesced a backlog into one call, or less when the gate
+    # trimmed silence off it. A chunk the gate skipped never got here.
+    billed = duration * len(sent) / len(samples)
+    if usage_state is not None and user_id is not None:
+        usage_state["this_ws"] += billed
+        usage_state["total"] = _usage_meter.add(user_id, billed)
+        try:
+            await websocket.send_json({
+                "type": "usage", "live_seconds": usage_state["total"]})
+        except Exception:
+            pass          # the page is gone; the account is still correct
+    return words
+
+
+async def finish_chunk(
+    words: list[dict] | None,
+    error: Exception | None,
+    samples: np.ndarray,
     websocket: WebSocket,
     lecture_prompt: str,
     selected_tags: list,
@@ -386,55 +671,58 @@ async def transcribe_chunk(
     chunk_offset: float,
     session_id: int | None = None,
     chunk_idx: int = 0,
-    user_id: int | None = None,
-    usage_state: dict | None = None,
+    vad_scores: np.ndarray | None = None,
 ):
     """
-    Full per-chunk pipeline:
+    Steps 2-8 of a chunk, run strictly in chunk order:
 
-      Steps 1-7 — CPU-bound model inference, runs in a thread pool so the
+      Steps 2-7 — CPU-bound model inference, runs in a thread pool so the
                   event loop stays free to handle other WebSocket connections.
       Step 8    — Send result to browser on the main async loop.
 
+    In order because this is the half that reads and writes session_state: the
+    VAD state carried from the previous chunk, and the previous transcript that
+    dedup trims against. Run as Modal answers, chunk 5 could be deduplicated
+    against chunk 3 and start from chunk 3's VAD state.
+
+    `error` is what Step 1 raised, if it did — reported here so the page hears
+    about chunk 4's failure after chunk 3's words, not before.
+
     When voice lock is off (professor_embedding is None), skip steps 2-7 and send raw Whisper output.
+
+    The result carries "chunk": chunk_idx, and replaces that chunk's partials on
+    the page. A chunk that ends with no result clears them instead.
     """
+    delivered = False
     try:
-        loop = asyncio.get_event_loop()
-
-        # Step 1 — Whisper, on Modal. Network waiting, a few MB, no models: it is
-        # deliberately OUTSIDE the semaphore so chunks can wait on the GPU
-        # concurrently instead of single file. This was the whole bottleneck.
-        samples = pcm_to_float(pcm_bytes)
-        words = await transcribe_with_timestamps(samples)      # awaited, no thread
-
-        # Billed here, and only here: Modal answered, so the thing the account
-        # pays for was delivered. A call that times out or errors raises above
-        # this line and costs nothing, which is the whole point — audio arriving
-        # is not a transcript, and the meter used to run on the audio.
-        #
-        # An empty answer still counts. Silence, or speech the speaker filter
-        # removes, is Modal having run and replied; what it said is the measure,
-        # not what survived the pipeline afterwards.
-        if usage_state is not None and user_id is not None:
-            fresh = _add_live_seconds(user_id, CHUNK_DURATION)
-            usage_state["this_ws"] += CHUNK_DURATION
-            usage_state["total"] = (float(fresh) if fresh is not None
-                                    else usage_state["total"] + CHUNK_DURATION)
-            try:
-                await websocket.send_json({
-                    "type": "usage", "live_seconds": usage_state["total"]})
-            except Exception:
-                pass          # the page is gone; the account is still correct
-
+        if error is not None:
+            raise error
         if not words:
             logger.debug("[chunk] no words from Whisper")
             return
 
         # Steps 2-7 — the models, and the only part that allocates (~159MB). The
         # gate belongs here.
-        async with _pipeline_semaphore:
-            result = await loop.run_in_executor(
-                None,
+        if PIPELINE_MODE == "process":
+            # The worker has a copy of session_state, not this one: what it
+            # changed comes back with the result. Chunks of a recording get
+            # here one at a time, so nothing else changes it meanwhile.
+            result, state = await _inference_pool.run_in_process(
+                _pipeline_in_process,
+                samples,
+                words,
+                lecture_prompt,
+                selected_tags,
+                custom_name,
+                professor_embedding,
+                similarity_threshold,
+                session_state,
+                chunk_offset,
+                vad_scores,
+            )
+            session_state.update(state)
+        else:
+            result = await _inference_pool.run_gated(
                 partial(
                     _run_pipeline_sync,
                     samples,
@@ -446,34 +734,36 @@ async def transcribe_chunk(
                     similarity_threshold,
                     session_state,
                     chunk_offset,
+                    vad_scores,
                 )
             )
 
-            # Step 8: Send to browser — must happen on the async loop, not in the thread
-            if result is not None:
-                # Written down before it is sent, because the reason this row
-                # exists is the browser not being there to receive it. A send that
-                # fails must not be what decides whether the lecture was kept.
-                if session_id is not None:
-                    try:
-                        with SessionLocal() as db:
-                            repo.add_chunk(
-                                db, session_id=session_id, idx=chunk_idx,
-                                text=result.get("text", ""),
-                                words=result.get("words"),
-                            )
-                    except Exception as e:
-                        # Losing a chunk must not take the recording down with it,
-                        # the same rule the usage write follows.
-                        logger.error(f"[ws] could not store chunk {chunk_idx} "
-                                     f"of session {session_id}: {e}")
-                try:
-                    await websocket.send_json(result)
-                except Exception:
-                    pass  # client disconnected while chunk was processing
+        # Step 8: Send to browser — must happen on the async loop, not in the thread.
+        # Outside the gate: the write and the send are waits, not compute, and the
+        # gate guards cores.
+        if result is not None:
+            # Written down before it is sent, because the reason this row
+            # exists is the browser not being there to receive it. A send that
+            # fails must not be what decides whether the lecture was kept.
+            #
+            # Queued rather than committed here: the writer stores every socket's
+            # chunks in one transaction, within CHUNK_FLUSH_MS. A failed write is
+            # logged there and loses that chunk only, the same rule as before.
+            if session_id is not None:
+                _chunk_writer.submit(
+                    session_id=session_id, idx=chunk_idx,
+                    text=result.get("text", ""),
+                    words=result.get("words"),
+                )
+            result["chunk"] = chunk_idx
+            try:
+                await websocket.send_json(result)
+                delivered = True
+            except Exception:
+                pass  # client disconnected while chunk was processing
 
     except Exception as e:
-        logger.exception(f"transcribe_chunk error: {e}")
+        logger.exception(f"[chunk] {chunk_idx} failed: {e}")
         try:
             await websocket.send_json({
                 "type": "error",
@@ -481,6 +771,205 @@ async def transcribe_chunk(
             })
         except Exception:
             pass  # client already disconnected
+    finally:
+        # Words were shown that the speaker filter removed, or the chunk failed:
+        # either way the interim text must not stay on the page.
+        if WHISPER_STREAM and not delivered:
+            try:
+                await websocket.send_json({"type": "partial", "chunk": chunk_idx, "text": ""})
+            except Exception:
+                pass
+
+
+# ======= PER-CONNECTION CHUNK PIPELINE =======
+# How many chunks of one recording may be between "cut" and "sent" at once. Three
+# covers a warm Modal answering late, and a cold start (~43s) holding four or five
+# chunks is exactly what this stops: the fourth is dealt with by the policy below
+# instead of stacking another copy of the audio behind a container still booting.
+PIPELINE_WINDOW = int(os.getenv("PIPELINE_WINDOW", "3"))
+
+# What happens to a chunk that arrives while the window is full:
+#   queue     wait for a place — nothing lost, the lag grows by a chunk each time
+#   coalesce  hold it, and fold the chunks after it into the same audio, so a
+#             backlog drains as ONE Modal call instead of several — nothing lost,
+#             fewer calls, and Whisper gets more context rather than less
+#   shed      drop it — the lag stops growing, the words in it are gone
+# Coalescing stops at COALESCE_MAX_SEC, Whisper's own window; past that the held
+# audio waits for a place as `queue` would.
+BACKPRESSURE_POLICY = os.getenv("BACKPRESSURE_POLICY", "coalesce")
+COALESCE_MAX_SEC    = 30
+
+
+@dataclass
+class ChunkJob:
+    """One cut of a recording's audio, on its way through the pipeline."""
+    idx:      int              # its row in the chunks table
+    offset:   float            # seconds into the lecture where it starts
+    samples:  np.ndarray
+    duration: float            # seconds of audio — what it is billed for
+    # One VAD score per window of `samples`, from the connection's StreamingVAD;
+    # None if the chunk was cut without one.
+    vad_scores: np.ndarray | None = None
+
+
+class ChunkPipeline:
+    """
+    One recording's chunks: Modal calls overlap, everything after runs in order.
+
+    Each chunk is a task in two halves, made by `build(job)`. `fetch` (Step 1)
+    starts at once and runs alongside the chunks before it; `finish` (Steps 2-8)
+    waits until the chunk before it has finished. So a slow answer for chunk 3
+    holds back chunk 4's delivery, never its Modal call, and session_state only
+    ever sees chunks in the order they were spoken.
+
+    Bounded: at most `window` chunks in the pipeline. One that arrives to a full
+    window goes to BACKPRESSURE_POLICY, and the page is sent a `backpressure`
+    message when that starts and again when it clears, so it can say so.
+
+    Tracked: every task is held here, so the socket's end can cancel what is
+    still running instead of leaving it to finish for a page that has gone —
+    each one an awaited Modal call that can simply stop.
+    """
+
+    def __init__(self, build, *, window: int = PIPELINE_WINDOW,
+                 policy: str = BACKPRESSURE_POLICY, notify=None):
+        self._build   = build              # ChunkJob -> (fetch, finish)
+        self._window  = window
+        self.policy   = policy
+        self._notify  = notify             # async callable(dict) -> the page
+        self._tail: asyncio.Future | None = None    # the last chunk's "finished"
+        self._tasks: set[asyncio.Task] = set()
+        self._freed   = asyncio.Event()
+        self._held: ChunkJob | None = None          # coalesce: waiting for a place
+        self._pressed = False
+        self._closed  = False
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    @property
+    def depth(self) -> int:
+        """Chunks cut and not yet finished: in flight, and held back."""
+        return self.in_flight + (self._held is not None)
+
+    async def offer(self, job: ChunkJob) -> None:
+        """Hand the pipeline a chunk. Returns once it has been started, held,
+        dropped — or, for `queue`, once a place opened up."""
+        if self._held is not None:
+            # Something is already waiting, so this goes behind it whatever the
+            # window says — merged into it while that stays under Whisper's limit.
+            if self._held.duration + job.duration <= COALESCE_MAX_SEC:
+                self._held = ChunkJob(
+                    idx=self._held.idx, offset=self._held.offset,
+                    samples=np.concatenate([self._held.samples, job.samples]),
+                    duration=self._held.duration + job.duration,
+                    # Both cut on window boundaries, so the scores line up end
+                    # to end as the samples do.
+                    vad_scores=(np.concatenate([self._held.vad_scores, job.vad_scores])
+                                if self._held.vad_scores is not None
+                                and job.vad_scores is not None else None),
+                )
+                metrics.incr("backpressure.coalesced")
+                return
+            await self._wait_for_place()
+            # A finishing chunk may have started the held one while this waited.
+            if self._held is not None:
+                held, self._held = self._held, None
+                self._start(held)
+            if self.in_flight < self._window:
+                self._start(job)
+            else:
+                self._held = job
+            return
+
+        if self.in_flight < self._window:
+            self._start(job)
+            return
+
+        await self._press()
+        if self.policy == "shed":
+            metrics.incr("backpressure.shed")
+            metrics.incr("backpressure.shed_seconds", job.duration)
+            logger.info(f"[pipeline] shed chunk {job.idx} ({job.duration:.1f}s)")
+        elif self.policy == "coalesce":
+            metrics.incr("backpressure.held")
+            self._held = job
+        else:
+            metrics.incr("backpressure.queued")
+            await self._wait_for_place()
+            self._start(job)
+
+    async def _wait_for_place(self) -> None:
+        while self.in_flight >= self._window:
+            self._freed.clear()
+            await self._freed.wait()
+
+    def _start(self, job: ChunkJob) -> None:
+        fetch, finish = self._build(job)
+        prev = self._tail
+        done = asyncio.get_running_loop().create_future()
+        self._tail = done
+        task = asyncio.create_task(self._run(fetch, finish, prev, done))
+        self._tasks.add(task)
+
+    async def _run(self, fetch, finish, prev, done) -> None:
+        try:
+            words, error = None, None
+            try:
+                words = await fetch()
+            except Exception as e:
+                error = e
+            if prev is not None:
+                # Shielded: a cancelled successor must not cancel the future its
+                # predecessor is about to resolve.
+                await asyncio.shield(prev)
+            await finish(words, error)
+        finally:
+            # Resolved however this ended, so the next chunk is never left waiting
+            # on one that failed or was cancelled.
+            if not done.done():
+                done.set_result(None)
+            self._tasks.discard(asyncio.current_task())
+            self._freed.set()
+            if not self._closed:
+                if self._held is not None and self.in_flight < self._window:
+                    held, self._held = self._held, None
+                    self._start(held)
+                if self._held is None and self.in_flight < self._window:
+                    await self._release()
+
+    async def _press(self) -> None:
+        if self._pressed:
+            return
+        self._pressed = True
+        metrics.incr("backpressure.episodes")
+        await self._tell(True)
+
+    async def _release(self) -> None:
+        if not self._pressed:
+            return
+        self._pressed = False
+        await self._tell(False)
+
+    async def _tell(self, active: bool) -> None:
+        if self._notify is None:
+            return
+        try:
+            await self._notify({"type": "backpressure", "active": active,
+                                "policy": self.policy, "in_flight": self.in_flight})
+        except Exception:
+            pass          # the page is gone; nothing to tell
+
+    async def cancel(self) -> None:
+        """Stop every chunk still running, and wait until they have. A held chunk
+        was never sent anywhere, so it is simply dropped."""
+        self._closed = True
+        self._held = None
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
 
 
 # ======= ROUTES =======
@@ -498,12 +987,22 @@ async def lectures_page(request: Request):
 
 @app.get("/live", response_class=HTMLResponse)
 async def live_page(request: Request):
+    # Someone about to record: the earliest a container can be started. The
+    # page is anonymous here, so it is the default backend that is warmed.
+    transcription_backend().warm()
     return templates.TemplateResponse("live.html", {"request": request})
 
 @app.get("/favicon.ico", include_in_schema=False)
 async def favicon():
     return FileResponse("static/favicon.ico")
 
+@app.get("/metrics")
+def metrics_route():
+    """The server's own counters — chunk writes, and whatever else reports in.
+    Numbers only, nothing per user, so it is as open as /health."""
+    return metrics.snapshot()
+
+
 @app.get("/health")
 def health():
     """Health check with live memory breakdown."""
@@ -992,14 +1491,7 @@ async def transcribe_audio(
             detail="You have used your free upload minutes.")
 
     try:
-        response = await _modal_async.post(
-            MODAL_WHISPER_URL,
-            content=contents,
-            headers={"Content-Type": mime},
-            timeout=120,
-        )
-        response.raise_for_status()
-        words = response.json()
+        words = await transcription_backend(user.plan).transcribe_file(contents, mime)
     except Exception as e:
         # Nothing is charged: Modal did not answer, so nothing was delivered.
         raise HTTPException(status_code=500, detail=f"Transcription Failed: {str(e)}")
@@ -1008,7 +1500,7 @@ async def transcribe_audio(
     # marks the end of — an answer with no words at all is silence, and bills
     # nothing because there is no span to bill for.
     seconds = float(words[-1]["end"]) if words else 0.0
-    fresh = _add_upload_seconds(user.id, seconds)
+    fresh = await _add_upload_seconds(user.id, seconds)
     logger.info(f"[upload] user {user.id} billed {seconds:.0f}s, "
                 f"account now {fresh}/{FREE_UPLOAD_SECONDS}s")
 
@@ -1037,50 +1529,156 @@ def get_vad_regions(
     init_h / init_c: LSTM state carried from the previous chunk's last
     professor region — avoids cold-start (zeros) which causes low scores
     for the first 0.3-0.5s and drops leading words after a speaker change.
-    """
-    h  = init_h.copy()
-    c  = init_c.copy()
-    sr = np.array(SAMPLE_RATE, dtype=np.int64)
 
-    frame_times, frame_scores, frame_states = [], [], []
-    for i in range(0, len(samples) - VAD_WINDOW_SIZE + 1, VAD_WINDOW_SIZE):
+    A region's end state is the LSTM state at the window nearest its end. Only
+    those are kept — every window's used to be copied, ~312 pairs for a 10s
+    chunk and 115MB for an hour of enrollment, to read back one per region. A
+    region ends VAD_PAD_SEC past a fall below the threshold, or at the end of
+    the audio, so the windows wanted are known the moment each fall is seen,
+    before the window itself is run. scripts/bench-vad-regions.py measures it.
+    """
+    vad = VadStepper(_vad_session, init_h, init_c, sample_rate=SAMPLE_RATE,
+                     io_binding=ORT_IO_BINDING)
+
+    n_frames = max(0, (len(samples) - VAD_WINDOW_SIZE) // VAD_WINDOW_SIZE + 1)
+    total    = len(samples) / SAMPLE_RATE
+    scores   = np.empty(n_frames, dtype=np.float32)
+    wanted   = {n_frames - 1}                  # a region running to the end
+    kept: dict[int, tuple] = {}
+    in_speech = False
+    for k in range(n_frames):
+        i    = k * VAD_WINDOW_SIZE
         w    = samples[i: i + VAD_WINDOW_SIZE].reshape(1, VAD_WINDOW_SIZE)
-        outs = _vad_session.run(None, {'input': w, 'sr': sr, 'h': h, 'c': c})
-        h, c = outs[1], outs[2]
-        frame_times.append(i / SAMPLE_RATE)
-        frame_scores.append(float(outs[0].squeeze()))
-        frame_states.append((h.copy(), c.copy()))
-
-    raw_regions, in_speech, start = [], False, 0.0
-    for t, score in zip(frame_times, frame_scores):
-        if score >= VAD_THRESHOLD and not in_speech:
-            start, in_speech = t, True
-        elif score < VAD_THRESHOLD and in_speech:
-            raw_regions.append((start, t))
-            in_speech = False
-    if in_speech:
-        raw_regions.append((start, len(samples) / SAMPLE_RATE))
-
-    if not raw_regions:
+        scores[k] = vad.step(w)
+        speech = scores[k] >= VAD_THRESHOLD
+        if in_speech and not speech:
+            wanted.add(_nearest_frame(min(total, i / SAMPLE_RATE + VAD_PAD_SEC), n_frames))
+        in_speech = speech
+        if k in wanted:
+            kept[k] = vad.state()
+
+    merged = regions_from_scores(scores, total)
+    if not merged:
         return [], []
+    region_end_states = [kept[_nearest_frame(e, n_frames)] for (_, e) in merged]
+    return merged, region_end_states
 
-    total  = len(samples) / SAMPLE_RATE
-    padded = [(max(0.0, s - VAD_PAD_SEC), min(total, e + VAD_PAD_SEC)) for s, e in raw_regions]
 
-    merged = [padded[0]]
-    for (s, e) in padded[1:]:
-        prev_s, prev_e = merged[-1]
-        if s <= prev_e:
-            merged[-1] = (prev_s, max(prev_e, e))
+def _nearest_frame(t: float, n_frames: int) -> int:
+    """The VAD window starting nearest `t` seconds — the earlier on a tie."""
+    return min(n_frames - 1, max(0, math.ceil(t * SAMPLE_RATE / VAD_WINDOW_SIZE - 0.5)))
+
+
+def regions_from_scores(scores, total: float) -> list[tuple[float, float]]:
+    """
+    Speech regions, in seconds, from one VAD score per VAD_WINDOW_SIZE window:
+    runs at or above VAD_THRESHOLD, padded by VAD_PAD_SEC, overlaps merged.
+    `total` is the audio's length, which the last region may run to.
+
+    The scores are get_vad_regions' own, or the ones the connection's
+    StreamingVAD computed as the chunk arrived (chunker.py).
+
+    Array operations throughout: a region starts where the thresholded scores
+    step up and ends where they step down, and padded regions are merged where
+    one starts before the last ended. Same numbers as the frame-by-frame loop it
+    replaced, in a fraction of the time for an hour of enrollment audio.
+    """
+    speech = np.asarray(scores) >= VAD_THRESHOLD
+    if not speech.any():
+        return []
+    edges  = np.diff(speech.astype(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    ends   = np.flatnonzero(edges == -1)       # the first window after each run
+
+    start_t = starts * VAD_WINDOW_SIZE / SAMPLE_RATE
+    end_t   = np.where(ends == len(speech), total, ends * VAD_WINDOW_SIZE / SAMPLE_RATE)
+    padded_s = np.maximum(0.0, start_t - VAD_PAD_SEC)
+    padded_e = np.minimum(total, end_t + VAD_PAD_SEC)
+
+    # Padded ends only ever grow, so a region joins the one before it exactly
+    # when it starts at or before that one's end.
+    first = np.concatenate(([0], np.flatnonzero(padded_s[1:] > padded_e[:-1]) + 1))
+    last  = np.concatenate((first[1:] - 1, [len(padded_s) - 1]))
+    return list(zip(padded_s[first].tolist(), padded_e[last].tolist()))
+
+
+def speech_regions(samples: np.ndarray, scores=None) -> list[tuple[float, float]]:
+    """
+    The speech in a chunk, in seconds, padded by GATE_PAD_SEC — empty if it has none.
+
+    The silence gate: asked before a chunk is sent to Modal, so a break or a
+    room working quietly costs no T4 call and no minutes, and the silence around
+    speech is not uploaded or decoded. Whisper over silence is also where "Thank
+    you for watching" comes from; not sending it beats filtering it.
+
+    Zero LSTM state, not the state carried in session_state: this runs as the
+    chunk is cut, alongside the chunks before it, and the carried state belongs
+    to the ordered half of the pipeline. GATE_PAD_SEC covers what a cold start
+    scores low. A few ms of CPU for 10s of audio.
+
+    Given `scores` — the chunk's, from the connection's StreamingVAD — the model
+    is not run at all, and the regions are a pass over a few hundred floats.
+    """
+    total  = len(samples) / SAMPLE_RATE
+    if scores is not None:
+        regions = regions_from_scores(scores, total)
+    else:
+        zeros = np.zeros((2, 1, 64), dtype=np.float32)
+        regions, _ = get_vad_regions(samples, zeros, zeros)
+    extra  = GATE_PAD_SEC - VAD_PAD_SEC          # get_vad_regions padded already
+    merged: list[tuple[float, float]] = []
+    for s, e in regions:
+        s, e = max(0.0, s - extra), min(total, e + extra)
+        if merged and s <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], e))
         else:
             merged.append((s, e))
+    return merged
 
-    def state_at(t: float):
-        idx = min(range(len(frame_times)), key=lambda i: abs(frame_times[i] - t))
-        return frame_states[idx]
 
-    region_end_states = [state_at(e) for (_, e) in merged]
-    return merged, region_end_states
+def pack_voiced(
+    samples: np.ndarray,
+    regions: list[tuple[float, float]],
+) -> tuple[np.ndarray, list[tuple[float, float, float]]]:
+    """
+    The regions of a chunk, back to back with VOICED_GAP_SEC of silence between,
+    and the table that maps a time in the result back onto the chunk.
+
+    Table rows are (packed_start, original_start, length), in seconds, in order.
+    One region is a slice of `samples`, not a copy — that is trim mode.
+    """
+    bounds = [(int(s * SAMPLE_RATE), int(e * SAMPLE_RATE)) for s, e in regions]
+    if len(bounds) == 1:
+        a, b = bounds[0]
+        return samples[a:b], [(0.0, a / SAMPLE_RATE, (b - a) / SAMPLE_RATE)]
+    gap    = int(VOICED_GAP_SEC * SAMPLE_RATE)
+    packed = np.zeros(sum(b - a for a, b in bounds) + gap * (len(bounds) - 1),
+                      dtype=samples.dtype)
+    table, pos = [], 0
+    for a, b in bounds:
+        packed[pos:pos + b - a] = samples[a:b]
+        table.append((pos / SAMPLE_RATE, a / SAMPLE_RATE, (b - a) / SAMPLE_RATE))
+        pos += b - a + gap
+    return packed, table
+
+
+def remap_words(words: list[dict], table: list[tuple[float, float, float]]) -> None:
+    """
+    Move word timestamps from the packed audio back onto the chunk, in place.
+
+    A time inside a region moves by that region's offset. One in a gap — Whisper
+    sometimes lets a word end in the silence after it — is held to the end of
+    the region before, which is where that silence began.
+    """
+    starts = [row[0] for row in table]
+
+    def back(t: float) -> float:
+        packed_start, original_start, length = table[max(0, bisect_right(starts, t) - 1)]
+        return original_start + min(max(t - packed_start, 0.0), length)
+
+    for w in words:
+        w["start"] = back(w["start"])
+        w["end"]   = max(w["start"], back(w["end"]))
 
 
 # ======= SEGMENTATION =======
@@ -1099,63 +1697,106 @@ def split_by_speaker_change(region_samples: np.ndarray, region_start: float) ->
     Segmentation splits it so we can embed each piece separately and
     identify which piece belongs to the professor.
     """
-    duration   = len(region_samples) / SAMPLE_RATE
-    inp        = region_samples.reshape(1, 1, -1).astype(np.float32)
-    output     = _seg_session.run(None, {'input_values': inp})
-    seg        = output[0].squeeze(0)
-    seg        = 1.0 / (1.0 + np.exp(-seg))  # sigmoid: logits → probabilities
-
-    num_frames    = seg.shape[0]
-    frame_dur     = duration / num_frames
-    sub_segments  = []
-    in_speech     = False
-    seg_start     = 0.0
-    prev_dominant = -1
-
-    for i, frame in enumerate(seg):
-        t         = i * frame_dur
-        is_speech = float(frame.max()) > SEG_THRESHOLD
-        dominant  = int(np.argmax(frame))
-
-        if is_speech and not in_speech:
-            seg_start     = t
-            in_speech     = True
-            prev_dominant = dominant
-        elif is_speech and in_speech:
-            if dominant != prev_dominant:  # speaker changed
-                sub_segments.append((region_start + seg_start, region_start + t))
-                seg_start     = t
-                prev_dominant = dominant
-        elif not is_speech and in_speech:
-            sub_segments.append((region_start + seg_start, region_start + t))
-            in_speech = False
-
-    if in_speech:
-        sub_segments.append((region_start + seg_start, region_start + duration))
-
-    return sub_segments if sub_segments else [(region_start, region_start + duration)]
+    duration = len(region_samples) / SAMPLE_RATE
+    inp      = region_samples.reshape(1, 1, -1).astype(np.float32)
+    logits   = _seg_session.run(None, {'input_values': inp})[0][0]
+    return speaker_turns(logits, duration / logits.shape[0], duration, region_start)
+
+
+def speaker_turns(
+    logits: np.ndarray,
+    frame_dur: float,
+    duration: float,
+    region_start: float,
+) -> list[tuple[float, float]]:
+    """
+    Sub-segments of one region from its segmentation frames (frames x speakers,
+    logits). A frame is speech if its most likely speaker is above
+    SEG_THRESHOLD; a segment opens where speech starts or the dominant speaker
+    changes between two speech frames, and closes at the next change or where
+    speech stops — `duration` if it never does.
+
+    Whole-matrix operations: max, argmax and diff over every frame at once,
+    where a loop used to call frame.max() and np.argmax(frame) per frame. The
+    same segments, frame for frame (scripts/check-segmentation.py).
+    """
+    probs     = 1.0 / (1.0 + np.exp(-logits))       # sigmoid: logits → probabilities
+    speech    = probs.max(axis=1) > SEG_THRESHOLD
+    dominant  = probs.argmax(axis=1)
+    was       = np.concatenate(([False], speech[:-1]))
+    changed   = np.concatenate(([False], dominant[1:] != dominant[:-1]))
+    turn      = speech & was & changed
+
+    opens  = np.flatnonzero((speech & ~was) | turn)
+    closes = np.flatnonzero(turn | (~speech & was)) * frame_dur
+    if len(speech) and speech[-1]:
+        closes = np.append(closes, duration)
+    if not len(opens):
+        return [(region_start, region_start + duration)]
+    starts = opens * frame_dur
+    return [(region_start + s, region_start + e) for s, e in zip(starts.tolist(), closes.tolist())]
 
 
 def get_segments(samples: np.ndarray, vad_regions: list[tuple[float, float]]) -> list[tuple[float, float]]:
-    """Run segmentation on each VAD region, collect all sub-segments."""
-    final_segments = []
+    """
+    Run segmentation on each VAD region, collect all sub-segments.
+
+    With SEG_BATCH, the regions long enough to split go to the model a batch
+    at a time: grouped by length (no batch more than SEG_MAX_PADDING padding),
+    zero-padded to the group's longest, one row each, and each row's frames
+    read only as far as its own audio. A forward pass per group instead of per
+    region. Reading a row only to its own end does not make it the output the
+    region would get alone: SincNet's instance normalisation takes its
+    statistics over the whole padded row, and the backward LSTM runs from the
+    end of the padding, so its state at every frame of a short row has seen
+    the zeros. Any frame can change, not only the last few — hence batches of
+    similar length, and scripts/check-segmentation.py to measure the
+    difference against the one-region-at-a-time path before turning it on.
+    """
+    final_segments: list = []
+    pending: list[tuple[int, float, np.ndarray]] = []     # (slot, start, region audio)
     for (start, end) in vad_regions:
         duration = end - start
         if duration < MIN_SEGMENT_SEC:
             continue
         if duration >= MIN_REGION_SEC:
             region_samples = samples[int(start * SAMPLE_RATE): int(end * SAMPLE_RATE)]
+            if SEG_BATCH:
+                pending.append((len(final_segments), start, region_samples))
+                final_segments.append(None)         # filled in below, in order
+                continue
             sub = split_by_speaker_change(region_samples, region_start=start)
             logger.debug(f"[seg] region {start:.1f}s-{end:.1f}s → {len(sub)} sub-segments")
-            final_segments.extend(sub)
+            final_segments.append(sub)
         else:
-            final_segments.append((start, end))
+            final_segments.append([(start, end)])
+
+    for group in length_groups([len(r) for _, _, r in pending], SEG_MAX_PADDING):
+        rows    = [pending[i] for i in group]
+        longest = max(len(r) for _, _, r in rows)
+        batch   = np.zeros((len(rows), 1, longest), dtype=np.float32)
+        for row, (_, _, region) in enumerate(rows):
+            batch[row, 0, :len(region)] = region
+        logits    = _seg_session.run(None, {'input_values': batch})[0]
+        frame_dur = longest / SAMPLE_RATE / logits.shape[1]
+        for row, (slot, start, region) in enumerate(rows):
+            duration = len(region) / SAMPLE_RATE
+            frames   = min(logits.shape[1], math.ceil(duration / frame_dur))
+            final_segments[slot] = speaker_turns(logits[row, :frames], frame_dur, duration, start)
+        logger.debug(f"[seg] {len(rows)} regions in one batch of {longest / SAMPLE_RATE:.1f}s")
+
+    final_segments = [seg for sub in final_segments for seg in sub]
     logger.debug(f"[segments] {len(final_segments)}: {[(f'{s:.1f}', f'{e:.1f}') for s,e in final_segments]}")
     return final_segments
 
 
 # ======= ECAPA-TDNN EMBEDDING =======
-_ecapa_model = None
+ECAPA_ONNX_PATHS = {
+    "onnx":      BASE_DIR / "models" / "ecapa_tdnn.onnx",
+    "onnx-int8": BASE_DIR / "models" / "ecapa_tdnn.int8.onnx",
+}
+_ecapa_model     = None     # the SpeechBrain model, in torch mode only
+_speaker_encoder = None     # EmbeddingBatcher over a SpeakerEncoder, set at startup
 
 def get_embedding(samples: np.ndarray) -> np.ndarray | None:
     """
@@ -1164,10 +1805,7 @@ def get_embedding(samples: np.ndarray) -> np.ndarray | None:
     """
     if len(samples) < int(SAMPLE_RATE * MIN_SEGMENT_SEC):
         return None
-    tensor = torch.tensor(samples).unsqueeze(0)
-    with torch.no_grad():
-        emb = _ecapa_model.encode_batch(tensor).squeeze().numpy()
-    return emb / np.linalg.norm(emb)
+    return _speaker_encoder.embed([samples])[0]
 
 
 def compute_professor_embedding(pcm_bytes: bytes) -> tuple[np.ndarray, float] | tuple[None, None]:
@@ -1204,19 +1842,29 @@ def get_professor_segments(
     similarity_threshold: float,
 ) -> tuple[list[tuple[float, float]], list[float]]:
     """
-    For each segment, embed it and compare against the single professor embedding.
+    Embed every segment and compare each against the single professor embedding.
     Returns (professor_segments, sim_scores) — sim_scores parallel to professor_segments.
+
+    All of the chunk's segments go to the encoder in one call, and are scored
+    with one matrix product — not a forward pass and a dot product per segment.
     """
-    professor_segments = []
-    sim_scores         = []
+    min_len = int(SAMPLE_RATE * MIN_SEGMENT_SEC)
+    kept, clips = [], []
     for (start, end) in segments:
         if (end - start) < MIN_SEGMENT_SEC:
             continue
-        chunk = samples[int(start * SAMPLE_RATE): int(end * SAMPLE_RATE)]
-        emb   = get_embedding(chunk)
-        if emb is None:
+        clip = samples[int(start * SAMPLE_RATE): int(end * SAMPLE_RATE)]
+        if len(clip) < min_len:
             continue
-        sim     = float(np.dot(emb, professor_embedding))
+        kept.append((start, end))
+        clips.append(clip)
+
+    professor_segments = []
+    sim_scores         = []
+    if not clips:
+        return professor_segments, sim_scores
+    sims = _speaker_encoder.embed(clips) @ professor_embedding
+    for (start, end), sim in zip(kept, sims.tolist()):
         is_prof = sim >= similarity_threshold
         logger.debug(f"[emb] {start:.1f}s-{end:.1f}s sim={sim:.3f} → {'PROFESSOR' if is_prof else 'other'}")
         if is_prof:
@@ -1226,6 +1874,47 @@ def get_professor_segments(
     return professor_segments, sim_scores
 
 
+# ======= INFERENCE POOL =======
+_inference_pool: InferencePool | None = None    # set at startup, once the models are loaded
+
+def _warm_inference_thread() -> None:
+    """
+    One small pass through each local model, on the thread that will run them —
+    InferencePool calls it as each of its threads starts. Two seconds of quiet
+    noise: long enough for segmentation to run, and for every layer of each
+    model to have been through once.
+    """
+    samples = (0.01 * np.random.default_rng(0).standard_normal(2 * SAMPLE_RATE)).astype(np.float32)
+    if _vad_session is not None:
+        zeros = np.zeros((2, 1, 64), dtype=np.float32)
+        get_vad_regions(samples, zeros, zeros)
+    if _seg_session is not None:
+        get_segments(samples, [(0.0, 2.0)])
+    if _speaker_encoder is not None:
+        # The encoder itself: through the batcher, the threads would wait on
+        # each other to share a batch nobody needs.
+        _speaker_encoder.encoder.embed([samples])
+
+
+def _init_pipeline_process() -> None:
+    """A pipeline worker process starting (PIPELINE_MODE=process): the models,
+    once, then one warm-up pass. No cross-chunk ECAPA batching — a process runs
+    one chunk at a time, so there is nobody to wait for."""
+    _load_models(ecapa_wait_ms=0)
+    _warm_inference_thread()
+
+
+def _pipeline_in_process(samples: np.ndarray, words, lecture_prompt, selected_tags, custom_name,
+                         professor_embedding, similarity_threshold, session_state,
+                         chunk_offset, vad_scores) -> tuple[dict | None, dict]:
+    """_run_pipeline_sync in a worker process: `samples` is a view of shared
+    memory, and the session_state it updated goes back with the result."""
+    result = _run_pipeline_sync(samples, words, lecture_prompt, selected_tags, custom_name,
+                                professor_embedding, similarity_threshold, session_state,
+                                chunk_offset, vad_scores)
+    return result, session_state
+
+
 # ======= WORD STITCH =======
 def stitch_professor_words(
     words: list[dict],
@@ -1360,49 +2049,27 @@ def _release_socket(user_id: int | None) -> None:
         _open_sockets.pop(user_id, None)
 
 
-def _add_live_seconds(user_id: int | None, delta: float) -> int | None:
-    """Add this connection's new seconds to the account and return the fresh total.
+async def _add_upload_seconds(user_id: int | None, delta: float) -> int | None:
+    """Add an upload's seconds to the account and return the fresh total.
 
     Adds rather than assigns, and does it in one UPDATE so the database performs
-    the arithmetic. A device recording on a phone and a laptop at once would
-    otherwise each read the same starting number, count separately, and write
-    their own total — the last one winning and the rest of the usage vanishing.
-    Reading the total back is also how each connection learns about the others:
-    the ceiling is shared, so it has to be re-checked rather than assumed from
-    whatever was true at connect.
-    """
-    if user_id is None or delta <= 0:
-        return None
-    try:
-        with SessionLocal() as db:
-            db.execute(
-                update(User)
-                .where(User.id == user_id)
-                .values(live_seconds=User.live_seconds + int(delta))
-            )
-            db.commit()
-            u = db.get(User, user_id)
-            return int(u.live_seconds) if u else None
-    except Exception as e:
-        # Losing a usage write must not take the recording down with it.
-        logger.error(f"[ws] could not persist usage for user {user_id}: {e}")
-        return None
-
+    the arithmetic: two files transcribing at once must both land, and reading
+    the same starting number and writing separate totals would lose one.
 
-def _add_upload_seconds(user_id: int | None, delta: float) -> int | None:
-    """The upload counterpart of _add_live_seconds, and additive for the same
-    reason: two files transcribing at once must both land."""
+    Not write-behind like live usage: one upload is one bill, and the ceiling is
+    checked against the database before the next one starts.
+    """
     if user_id is None or delta <= 0:
         return None
     try:
-        with SessionLocal() as db:
-            db.execute(
+        async with AsyncSessionLocal() as db:
+            await db.execute(
                 update(User)
                 .where(User.id == user_id)
                 .values(upload_seconds=User.upload_seconds + int(delta))
             )
-            db.commit()
-            u = db.get(User, user_id)
+            await db.commit()
+            u = await db.get(User, user_id)
             return int(u.upload_seconds) if u else None
     except Exception as e:
         logger.error(f"[upload] could not persist usage for user {user_id}: {e}")
@@ -1418,7 +2085,18 @@ async def websocket_transcribe(websocket: WebSocket):
     """
     await websocket.accept()
 
-    audio_buffer      = bytearray()
+    audio_buffer      = AudioBuffer(BUFFER_SAMPLES)
+    # VAD as the audio arrives, one LSTM state for the whole recording — the
+    # chunker cuts by it, and every chunk carries its scores to the gate and to
+    # Step 2. None without the model: each chunk then runs its own VAD, as before.
+    stream_vad = (StreamingVAD(_vad_session, sample_rate=SAMPLE_RATE, window=VAD_WINDOW_SIZE,
+                               io_binding=ORT_IO_BINDING, norm_sec=CHUNK_DURATION)
+                  if _vad_session is not None else None)
+    # None cuts every chunk_samples, as before.
+    chunker = (AdaptiveChunker(stream_vad, threshold=VAD_THRESHOLD,
+                               min_sec=CHUNK_MIN_SEC, max_sec=CHUNK_MAX_SEC,
+                               pause_sec=CHUNK_PAUSE_SEC)
+               if CHUNKER == "adaptive" and stream_vad is not None else None)
     lecture_prompt    = ""
     selected_tags     = []
     custom_name       = ""
@@ -1428,16 +2106,25 @@ async def websocket_transcribe(websocket: WebSocket):
     # by the opening message; until then the connection is anonymous and its
     # smaller ceiling applies.
     ws_user_id: int | None = None
+    ws_plan:    str | None = None        # which transcription backend serves it
     # The row this recording is filling. Opened with the first context message,
     # collapsed into a finished lecture when the connection ends.
     ws_session_id: int | None = None
     seconds_allowed  = FREE_LIVE_SECONDS
     # What the account has been billed, shared with the chunk tasks that do the
-    # billing — mutable for the same reason session_state is: transcribe_chunk
+    # billing — mutable for the same reason session_state is: fetch_chunk_words
     # runs as its own task and has to be able to report back.
     usage_state = {"total": 0.0, "this_ws": 0.0}
     enrollment_buffer = bytearray()
     chunk_count       = 0
+    samples_cut       = 0        # where the next chunk starts, in samples
+    chunk_samples     = CHUNK_SAMPLES   # the fixed cut, when there is no chunker
+    # How long this recording's chunks should be, from what its own chunks have
+    # been costing. None leaves them at CHUNK_DURATION.
+    duration_control  = (DurationController(CHUNK_DURATION,
+                                            min_sec=CHUNK_CONTROL_MIN_SEC,
+                                            max_sec=CHUNK_CONTROL_MAX_SEC)
+                         if CHUNK_CONTROL else None)
 
     # Per-session speaker state
     professor_embedding: np.ndarray | None = None
@@ -1448,6 +2135,31 @@ async def websocket_transcribe(websocket: WebSocket):
         'vad_h': np.zeros((2, 1, 64), dtype=np.float32),
         'vad_c': np.zeros((2, 1, 64), dtype=np.float32),
     }
+    # This recording's chunks in flight — overlapping at Modal, in order after.
+    # Built when a chunk starts rather than when it is cut, so a chunk the
+    # pipeline held back runs under the settings in force when it goes.
+    def build_chunk(job: ChunkJob):
+        fetch = partial(fetch_chunk_words, job.samples, job.duration, websocket,
+                        ws_user_id, usage_state, transcription_backend(ws_plan),
+                        job.idx,
+                        duration_control.observe if duration_control else None,
+                        job.vad_scores)
+        finish = partial(finish_chunk,
+                         samples=job.samples, websocket=websocket,
+                         lecture_prompt=lecture_prompt,
+                         selected_tags=selected_tags,
+                         custom_name=custom_name,
+                         professor_embedding=(professor_embedding
+                                              if voice_lock_active else None),
+                         similarity_threshold=similarity_threshold,
+                         session_state=session_state,
+                         chunk_offset=job.offset,
+                         session_id=ws_session_id,
+                         chunk_idx=job.idx,
+                         vad_scores=job.vad_scores)
+        return fetch, finish
+
+    pipeline = ChunkPipeline(build_chunk, notify=websocket.send_json)
 
     try:
         while True:
@@ -1493,10 +2205,12 @@ async def websocket_transcribe(websocket: WebSocket):
                             await websocket.close()
                             break
 
-                        with SessionLocal() as db:
-                            u = get_or_create_user(db, clerk_id)
+                        async with AsyncSessionLocal() as db:
+                            u = await get_or_create_user_async(db, clerk_id)
                             ws_user_id    = u.id
-                            usage_state["total"] = float(u.live_seconds)
+                            ws_plan       = u.plan
+                            _usage_meter.seed(ws_user_id, u.live_seconds)
+                            usage_state["total"] = _usage_meter.total(ws_user_id)
                         logger.info(f"[ws] {clerk_id} -> user {ws_user_id}, "
                                     f"{usage_state['total']:.0f}/{seconds_allowed}s used")
 
@@ -1521,15 +2235,22 @@ async def websocket_transcribe(websocket: WebSocket):
                             ws_user_id = None      # nothing claimed, nothing to release
                             break
 
+                        # Accepted: the first chunk is ten seconds away. Whisper is
+                        # asked to get ready now — a cold container takes ~43s, and
+                        # this is a quarter of it paid before there is audio to send.
+                        # Deduplicated in the backend, so a room of lectures
+                        # starting together pings once.
+                        transcription_backend(ws_plan).warm()
+
                         # The lecture gets its row now, so the chunks arriving over
                         # the next hour have something to belong to. Opened only
                         # once every refusal above has passed, so a connection that
                         # is not allowed to record leaves nothing behind.
-                        with SessionLocal() as db:
-                            ws_session_id = repo.start_session(
+                        async with AsyncSessionLocal() as db:
+                            ws_session_id = (await repo.start_session_async(
                                 db, user_id=ws_user_id, voice_id=None,
                                 title=msg.title or "Untitled",
-                            ).id
+                            )).id
                         # The page is told which row it is filling, so Save can
                         # name that lecture rather than create another one.
                         await websocket.send_json({
@@ -1552,9 +2273,11 @@ async def websocket_transcribe(websocket: WebSocket):
 
                     elif msg.type == "enroll_end":
                         enrolling = False
+                        # VAD and ECAPA over the whole enrollment — seconds of
+                        # compute, so on the pool like a chunk, not on the loop.
                         try:
-                            professor_embedding, similarity_threshold = compute_professor_embedding(
-                                bytes(enrollment_buffer)
+                            professor_embedding, similarity_threshold = await _inference_pool.run_gated(
+                                compute_professor_embedding, bytes(enrollment_buffer)
                             )
                         except Exception as emb_err:
                             logger.error(f"Embedding error: {emb_err}")
@@ -1580,8 +2303,9 @@ async def websocket_transcribe(websocket: WebSocket):
                     elif msg.type == "use_saved_voice":
                         # Load a previously-saved Voice's embedding from the DB and
                         # lock onto it — same effect as enroll_end, no live audio needed.
-                        with SessionLocal() as db:
-                            voice = repo.get_voice(db, msg.voice_id) if msg.voice_id else None
+                        async with AsyncSessionLocal() as db:
+                            voice = (await repo.get_voice_async(db, msg.voice_id)
+                                     if msg.voice_id else None)
                             # Someone else's voice is not yours to lock onto — the
                             # id is just a number in a message, and guessing it
                             # would otherwise work.
@@ -1602,11 +2326,9 @@ async def websocket_transcribe(websocket: WebSocket):
                             # link is made here — it is what collapse_session
                             # counts as a use of this Voice.
                             if ws_session_id is not None:
-                                with SessionLocal() as db:
-                                    row = repo.get_session(db, ws_session_id)
-                                    if row is not None:
-                                        row.voice_id = msg.voice_id
-                                        db.commit()
+                                async with AsyncSessionLocal() as db:
+                                    await repo.set_session_voice_async(
+                                        db, ws_session_id, msg.voice_id)
                             await websocket.send_json({"type": "enroll_success"})
                             logger.info(f"Saved voice locked (id={msg.voice_id}, "
                                         f"threshold={similarity_threshold:.3f})")
@@ -1641,19 +2363,16 @@ async def websocket_transcribe(websocket: WebSocket):
                 if enrolling:
                     enrollment_buffer.extend(packet)
                     continue #continue COMPUTING Embeddign, and once enrolling is false, go to below section of code
-                # Safety guard to check the size of the chunk
-                if len(audio_buffer) > CHUNK_BYTES * 4:
-                    await websocket.send_json({"type": "error", "message": "Audio limit exceeded"})
-                    await websocket.close()
-                    break
-
                 # Nothing is metered here any more. Audio arriving is not a
                 # transcript delivered: a chunk that Modal never answers costs the
                 # account nothing, which it used to be charged for. The meter runs
-                # in transcribe_chunk, the moment Modal does answer.
+                # in fetch_chunk_words, the moment Modal does answer.
 
-                # The ceiling is judged on what has actually been billed, which
-                # usage_state carries back from those chunks.
+                # The ceiling is judged on what has actually been billed — by
+                # this socket's chunks and by any other tab of the same account,
+                # which the meter holds in one number.
+                if ws_user_id is not None:
+                    usage_state["total"] = _usage_meter.total(ws_user_id)
                 if usage_state["total"] >= seconds_allowed:
                     logger.info(f"[ws] user {ws_user_id} hit the limit at "
                                 f"{usage_state['total']:.0f}s")
@@ -1664,26 +2383,73 @@ async def websocket_transcribe(websocket: WebSocket):
                     await websocket.close()
                     break
 
-                audio_buffer.extend(packet)
-
-                if len(audio_buffer) >= CHUNK_BYTES:
-                    chunk_to_process = bytes(audio_buffer)
-                    del audio_buffer[:CHUNK_BYTES]
+                # Safety guard: a buffer that cannot take the packet holds
+                # BUFFER_SAMPLES (twice the longest chunk, 48s at the defaults)
+                # of audio nobody has cut into chunks — a client sending too fast.
+                if not audio_buffer.write(packet):
+                    await websocket.send_json({"type": "error", "message": "Audio limit exceeded"})
+                    await websocket.close()
+                    break
 
-                    chunk_offset = chunk_count * CHUNK_DURATION
+                # Each sample in exactly one chunk. The bytearray version handed
+                # on everything buffered — the chunk plus whatever part of the
+                # last packet ran past it — and then kept that part for the next
+                # chunk too, so those samples were transcribed twice.
+                if stream_vad is not None:
+                    try:
+                        await _inference_pool.run(stream_vad.feed, audio_buffer)
+                    except Exception as e:
+                        logger.warning(f"[vad] streaming VAD failed, each chunk runs its "
+                                       f"own from here: {e}")
+                        stream_vad = chunker = None
+
+                cut = None
+                if chunker is not None:
+                    cut = chunker.cut()
+                elif audio_buffer.buffered >= chunk_samples:
+                    cut = chunk_samples
+                    if stream_vad is not None:
+                        cut -= cut % VAD_WINDOW_SIZE     # whole windows, so the scores split too
+
+                if cut:
+                    vad_scores = stream_vad.take(cut) if stream_vad is not None else None
+                    # From samples, not chunk_count x a duration: chunks are not
+                    # all the same length any more, and a word's time on the page
+                    # is this plus its time in the chunk.
+                    chunk_offset = samples_cut / SAMPLE_RATE
+                    samples_cut += cut
                     chunk_count += 1
 
-                    asyncio.create_task(transcribe_chunk(
-                        chunk_to_process, websocket,
-                        lecture_prompt, selected_tags, custom_name,
-                        professor_embedding if voice_lock_active else None,
-                        similarity_threshold,
-                        session_state,
-                        chunk_offset,
-                        ws_session_id,
-                        chunk_count - 1,     # the index this chunk was given above
-                        ws_user_id,
-                        usage_state,
+                    # The next chunk's length, judged on the chunks before this
+                    # one: how long they took, and how many are still going.
+                    # The page is told at the first chunk, and at every change.
+                    if duration_control is not None:
+                        changed = duration_control.update(pipeline.depth)
+                        seconds = duration_control.seconds
+                        if changed:
+                            chunk_samples = int(seconds * SAMPLE_RATE)
+                            if chunker is not None:
+                                scale = seconds / CHUNK_DURATION
+                                chunker.min_sec = CHUNK_MIN_SEC * scale
+                                chunker.max_sec = CHUNK_MAX_SEC * scale
+                            logger.info(f"[ws] chunks of {seconds:g}s from here "
+                                        f"(round trip {duration_control.rtt:.1f}s, "
+                                        f"{pipeline.depth} in flight)")
+                        if changed or chunk_count == 1:
+                            try:
+                                await websocket.send_json({"type": "chunk_duration",
+                                                           "seconds": seconds})
+                            except Exception:
+                                pass
+
+                    await pipeline.offer(ChunkJob(
+                        idx=chunk_count - 1,         # the index given above
+                        offset=chunk_offset,
+                        # A view of the buffer, converted before the next packet
+                        # is read — the one copy the chunk costs.
+                        samples=pcm_to_float(audio_buffer.take(cut)),
+                        duration=cut / SAMPLE_RATE,  # billed for what it holds
+                        vad_scores=vad_scores,
                     ))
 
     except WebSocketDisconnect:
@@ -1691,11 +2457,20 @@ async def websocket_transcribe(websocket: WebSocket):
     except Exception as e:
         print(f"WebSocket error: {e}")
     finally:
-        # Nothing is owed at the end any more. Each chunk was billed the moment
-        # Modal answered for it, so a connection that dies without warning leaves
-        # no unwritten remainder to lose — the last chunk it was charged for is
-        # already in the account.
+        # Chunks still in flight are for a page that has gone. Cancelled, and
+        # waited for, before anything below reads the account or the lecture —
+        # a chunk finishing after the collapse would have nowhere to go.
+        await pipeline.cancel()
+
+        # Each chunk was billed the moment Modal answered for it. The meter may
+        # not have written it yet, so the recording's end is a flush point: a
+        # lecture that stops is in the account when the page next asks /me.
         if ws_user_id is not None:
+            try:
+                await _usage_meter.flush()
+            except Exception as e:
+                # Still owed, and the meter's own task retries it.
+                logger.error(f"[ws] usage flush at close failed: {e}")
             logger.info(f"[ws] user {ws_user_id} was billed {usage_state['this_ws']:.0f}s here, "
                         f"account now {usage_state['total']:.0f}/{seconds_allowed}s")
 
@@ -1704,8 +2479,11 @@ async def websocket_transcribe(websocket: WebSocket):
         # a recording that produced nothing takes its empty row with it.
         if ws_session_id is not None:
             try:
-                with SessionLocal() as db:
-                    repo.collapse_session(db, ws_session_id)
+                # The writer may still hold this recording's last chunks; the
+                # lecture is assembled from the table, so they go in first.
+                await _chunk_writer.flush()
+                async with AsyncSessionLocal() as db:
+                    await repo.collapse_session_async(db, ws_session_id)
             except Exception as e:
                 # The chunks survive a failure here, and the read path assembles
                 # from them, so the lecture is still readable.
@@ -1716,19 +2494,155 @@ async def websocket_transcribe(websocket: WebSocket):
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Release the Modal connections. Without this the pool is torn down by
-    garbage collection, which logs noisily and can leave sockets in TIME_WAIT."""
-    global _modal_async
-    if _modal_async is not None:
-        await _modal_async.aclose()
-        _modal_async = None
+    """Release the transcription backends — the Modal connections, the local
+    model's threads. The async engine's connections each hold a thread, closed
+    the same way."""
+    _backends.clear()
+    for backend in _started_backends:
+        await backend.aclose()
+    _started_backends.clear()
+    # Whatever the writer and the meter still hold is written before the engine goes.
+    if _chunk_writer is not None:
+        await _chunk_writer.stop()
+    if _usage_meter is not None:
+        await _usage_meter.stop()
+    if _inference_pool is not None:
+        _inference_pool.shutdown()
+    await async_engine.dispose()
 
 
 # ======= STARTUP =======
+async def _start_backends() -> None:
+    """
+    Start every transcription backend something refers to — the default, the
+    fallback, and any plan's — once each, and fill in _backends.
+
+    A backend that cannot start is left out with a warning rather than taking
+    the server down: a missing faster-whisper install should cost the local
+    fallback, not Modal. A plan pointing at one that failed gets the default.
+    """
+    def make(name: str) -> TranscriptionBackend:
+        if name == "modal":
+            return ModalBackend(MODAL_WHISPER_URL, codec=MODAL_AUDIO_CODEC,
+                                batch_ms=WHISPER_BATCH_MS, batch_max=WHISPER_BATCH_MAX,
+                                stream=WHISPER_STREAM)
+        if name == "local":
+            return LocalBackend(LOCAL_WHISPER_MODEL, cpu_threads=LOCAL_WHISPER_THREADS,
+                                workers=LOCAL_WHISPER_WORKERS,
+                                download_root=str(BASE_DIR / "models" / "whisper"))
+        raise ValueError(f"unknown transcription backend {name!r}")
+
+    wanted = {TRANSCRIPTION_BACKEND, *TRANSCRIPTION_PLANS.values()}
+    if TRANSCRIPTION_FALLBACK != "none":
+        wanted.add(TRANSCRIPTION_FALLBACK)
+    for name in sorted(wanted):
+        try:
+            backend = make(name)
+            await backend.start()
+            _started_backends.append(backend)
+            _backends[name] = backend
+        except Exception as e:
+            logger.warning(f"Transcription backend {name!r} unavailable: {e}")
+    if not _backends:
+        # Nothing would start. Modal without a URL starts regardless, and fails
+        # each chunk with an error the page shows — as it did before backends.
+        backend = make("modal")
+        await backend.start()
+        _started_backends.append(backend)
+        _backends["modal"] = backend
+
+    # Every backend made resilient, the fallback first so that the others fall
+    # back onto its resilient form. One wrapper each: a plan and the default that
+    # share a backend share its breaker too. A local backend is not hedged — a
+    # second copy on the same CPU only halves both.
+    def resilient(backend, fallback=None) -> ResilientBackend:
+        return ResilientBackend(
+            backend, fallback,
+            deadline=TRANSCRIBE_DEADLINE_SEC, attempt_timeout=TRANSCRIBE_ATTEMPT_SEC,
+            hedge=not isinstance(backend, LocalBackend), hedge_quantile=TRANSCRIBE_HEDGE_Q,
+            retry_ratio=TRANSCRIBE_RETRY_RATIO,
+            breaker_failures=BREAKER_FAILURES, breaker_cooldown=BREAKER_COOLDOWN_SEC)
+
+    fallback = None
+    if TRANSCRIPTION_FALLBACK in _backends:
+        fallback = _backends[TRANSCRIPTION_FALLBACK] = resilient(_backends[TRANSCRIPTION_FALLBACK])
+    for name, backend in list(_backends.items()):
+        if name != TRANSCRIPTION_FALLBACK:
+            _backends[name] = resilient(backend, fallback)
+    _backends["default"] = _backends.get(TRANSCRIPTION_BACKEND) or next(iter(_backends.values()))
+    logger.info(f"Transcription: {_backends['default'].name} by default"
+                + "".join(f", {plan}: {_backends[b].name}"
+                          for plan, b in TRANSCRIPTION_PLANS.items() if b in _backends))
+
+
+def _load_models(ecapa_wait_ms: int = ECAPA_BATCH_WAIT_MS, segmentation: bool = True) -> None:
+    """
+    VAD, segmentation and the speaker encoder, into this process's globals. At
+    startup, and in each pipeline worker process (PIPELINE_MODE=process), which
+    has a copy of its own.
+
+    In process mode the server process itself runs only the socket's VAD and
+    enrollment's embeddings, so it is started with segmentation=False: no
+    session, and so no warm-up pass on each of its threads either.
+    """
+    global _vad_session, _seg_session, _ecapa_model, _speaker_encoder
+
+    if VAD_MODEL_PATH.exists():
+        _vad_session = load_session(VAD_MODEL_PATH, intra_threads=INFERENCE_THREADS,
+                                    level=ORT_OPTIMIZATION, cache_dir=ORT_CACHE_DIR)
+        logger.info("VAD model loaded")
+    else:
+        logger.warning("VAD model not found")
+
+    if not segmentation:
+        logger.info("Segmentation model not loaded here — it runs in the worker processes")
+    elif SEG_MODEL_PATH.exists():
+        _seg_session = load_session(SEG_MODEL_PATH, intra_threads=INFERENCE_THREADS,
+                                    level=ORT_OPTIMIZATION, cache_dir=ORT_CACHE_DIR)
+        logger.info("Segmentation model loaded")
+    else:
+        logger.warning("Segmentation model not found")
+
+    encoder    = None
+    onnx_path  = ECAPA_ONNX_PATHS.get(SPEAKER_ENCODER)
+    check      = read_check(onnx_path) if onnx_path is not None and onnx_path.exists() else None
+    if check is not None:
+        session = load_session(onnx_path, intra_threads=INFERENCE_THREADS,
+                               level=ORT_OPTIMIZATION, cache_dir=ORT_CACHE_DIR)
+        encoder = OnnxSpeakerEncoder(session, sample_rate=SAMPLE_RATE,
+                                     max_padding=ECAPA_MAX_PADDING)
+        logger.info(f"ECAPA-TDNN embedding model loaded (ONNX, {onnx_path.name}, checked "
+                    f"{check['checked']}: lowest cosine {check['min_cosine']:.4f}) — torch not loaded")
+    elif onnx_path is not None and onnx_path.exists():
+        logger.warning(f"SPEAKER_ENCODER={SPEAKER_ENCODER} but {onnx_path.name} has no passing "
+                       f"check — run scripts/check-speaker-encoder.py. Using torch.")
+    elif onnx_path is not None:
+        logger.warning(f"SPEAKER_ENCODER={SPEAKER_ENCODER} but {onnx_path} is missing — "
+                       f"run scripts/export-ecapa-onnx.py. Using torch.")
+    elif SPEAKER_ENCODER != "torch":
+        logger.warning(f"unknown SPEAKER_ENCODER={SPEAKER_ENCODER!r} — using torch")
+
+    if encoder is None:
+        import torch
+        torch.backends.nnpack.enabled = False
+        torch.set_num_threads(INFERENCE_THREADS)
+        from speechbrain.inference.speaker import EncoderClassifier
+        _ecapa_model = EncoderClassifier.from_hparams(
+            source="speechbrain/spkrec-ecapa-voxceleb",
+            savedir=str(BASE_DIR / "models" / "ecapa_tdnn"),
+            run_opts={"device": "cpu"}
+        )
+        _ecapa_model.eval()
+        encoder = TorchSpeakerEncoder(_ecapa_model, max_padding=ECAPA_MAX_PADDING)
+        logger.info("ECAPA-TDNN embedding model loaded")
+    _speaker_encoder = EmbeddingBatcher(encoder, wait_ms=ecapa_wait_ms)
+
+
 @app.on_event("startup")
 async def startup_event():
     global _mem_baseline_mb, _mem_after_models_mb
-    global _vad_session, _seg_session, _ecapa_model, _modal_async
+    global _chunk_writer, _inference_pool
+    global _usage_meter
 
     tracemalloc.start()
     _mem_baseline_mb = _process.memory_info().rss / 1024 / 1024
@@ -1739,34 +2653,30 @@ async def startup_event():
     logger.info(f"Socket cap is {MAX_SOCKETS_PER_USER} per user, counted PER PROCESS. "
                 f"Running --workers N multiplies it by N — see SCALING.md, Level 2.")
 
-    if VAD_MODEL_PATH.exists():
-        _vad_session = ort.InferenceSession(str(VAD_MODEL_PATH))
-        logger.info("VAD model loaded")
-    else:
-        logger.warning("VAD model not found")
-
-    if SEG_MODEL_PATH.exists():
-        _seg_session = ort.InferenceSession(str(SEG_MODEL_PATH))
-        logger.info("Segmentation model loaded")
-    else:
-        logger.warning("Segmentation model not found")
-
-    from speechbrain.inference.speaker import EncoderClassifier
-    _ecapa_model = EncoderClassifier.from_hparams(
-        source="speechbrain/spkrec-ecapa-voxceleb",
-        savedir=str(BASE_DIR / "models" / "ecapa_tdnn"),
-        run_opts={"device": "cpu"}
-    )
-    _ecapa_model.eval()
-    logger.info("ECAPA-TDNN embedding model loaded")
-
-    # Whisper runs on Modal. One client for the process, reusing connections;
-    # the timeout is generous because a cold container takes a few seconds.
-    _modal_async = httpx.AsyncClient(timeout=httpx.Timeout(90.0))
-    if MODAL_WHISPER_URL:
-        logger.info(f"Modal Whisper endpoint configured: {MODAL_WHISPER_URL}")
-    else:
-        logger.warning("MODAL_WHISPER_URL not set — transcription will fail")
+    processes = PIPELINE_PROCESSES if PIPELINE_MODE == "process" else 0
+    _load_models(segmentation=not processes)
+
+    _inference_pool = InferencePool(INFERENCE_WORKERS, short_workers=INFERENCE_SHORT_WORKERS,
+                                    warmup=_warm_inference_thread,
+                                    processes=processes, process_init=_init_pipeline_process)
+    await _inference_pool.start()
+    # What bounds how many chunks run Steps 2-7 at once: the threads' gate, or
+    # in process mode the processes' — PIPELINE_PROCESSES, not INFERENCE_WORKERS.
+    logger.info(f"Inference pool: {INFERENCE_WORKERS} threads and {INFERENCE_SHORT_WORKERS} "
+                f"for short work, warmed up; Steps 2-7 run "
+                + (f"{processes} at once, in worker processes" if processes
+                   else f"{INFERENCE_WORKERS} at once, on the threads"))
+
+    await _start_backends()
+
+    _chunk_writer = ChunkWriter(AsyncSessionLocal, max_batch=CHUNK_FLUSH_ROWS,
+                                max_delay_ms=CHUNK_FLUSH_MS)
+    _chunk_writer.start()
+    logger.info(f"Chunk writer: batches of up to {CHUNK_FLUSH_ROWS}, "
+                f"at most {CHUNK_FLUSH_MS}ms unflushed")
+
+    _usage_meter = UsageMeter(AsyncSessionLocal, flush_interval=USAGE_FLUSH_SEC)
+    _usage_meter.start()
 
     _mem_after_models_mb = _process.memory_info().rss / 1024 / 1024
     logger.info(f"Memory after all models loaded: {_mem_after_models_mb:.1f} MB")
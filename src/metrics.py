@@ -0,0 +1,53 @@
+"""
+ClassRec — in-process metrics
+=============================
+
+Counters, gauges and timings the server keeps about itself, read back by
+GET /metrics. No exporter and no dependency: a dict behind a lock, because what
+is worth knowing at this size is a handful of numbers, and a JSON route is
+something curl can read on the droplet.
+
+    incr(name)            — something happened (a flush, a shed chunk)
+    set_gauge(name, v)    — what something is right now (rows pending)
+    observe(name, v)      — how long / how big, kept as count, total and max
+
+ONE PROCESS ONLY, like _open_sockets in main.py: with several workers each keeps
+its own numbers, and /metrics shows whichever worker answered.
+
+Locked because the inference threads report too, not only the event loop.
+"""
+
+import threading
+
+_lock = threading.Lock()
+_counters: dict[str, float] = {}
+_gauges: dict[str, float] = {}
+_timings: dict[str, dict[str, float]] = {}
+
+
+def incr(name: str, n: float = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def set_gauge(name: str, value: float) -> None:
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, value: float) -> None:
+    with _lock:
+        t = _timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+        t["count"] += 1
+        t["total"] += value
+        t["max"] = max(t["max"], value)
+
+
+def snapshot() -> dict:
+    """Everything, as plain numbers. Timings gain a mean so nobody divides by hand."""
+    with _lock:
+        timings = {
+            name: {**t, "mean": round(t["total"] / t["count"], 4) if t["count"] else 0.0}
+            for name, t in _timings.items()
+        }
+        return {"counters": dict(_counters), "gauges": dict(_gauges), "timings": timings}
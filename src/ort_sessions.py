@@ -0,0 +1,188 @@
+"""
+ClassRec — ONNX Runtime sessions (VAD, segmentation), configured in one place
+=============================================================================
+
+Every ONNX model used to be opened with a bare `ort.InferenceSession(path)`, so
+how it ran was whatever ONNX Runtime chose for the machine: an intra-op pool of a
+thread per core, spinning between calls, for a model called one 512-sample
+window at a time — alongside torch, held to one thread precisely so that chunks,
+not the insides of one inference, are what run in parallel. Two pools of two
+threads on a 2 vCPU droplet, each sized as if it had the machine to itself.
+
+load_session opens every model the same way:
+
+  threads      `intra_threads` per inference (main.py's INFERENCE_THREADS, the
+               same number torch gets), one inter-op thread, sequential
+               execution, and no spin-waiting — an idle pool thread spinning is
+               a core the event loop and the other chunk do not get
+  optimisation the full graph optimiser (constant folding, node fusion, layout);
+               `level` lowers it
+  cache        the optimised graph is written to `cache_dir` the first time and
+               loaded from there afterwards with the optimiser off, so a restart
+               does not pay for the same optimisation again. The file is named
+               for the model, the level, the ORT version, the architecture and
+               the CPU itself — a full-level graph can contain layouts and
+               kernels for this CPU's instruction set (AVX-512 or not, VNNI or
+               not), which two x86_64 droplets need not share, and a disk image
+               moved to another one must not load the first one's graph. The
+               CPU is a short hash of its model name and feature flags. The
+               file is rebuilt when the model is newer than it.
+
+VadStepper runs Silero VAD a window at a time, optionally through IOBinding: its
+LSTM state lives in two preallocated buffers that each call reads from one of
+and writes the other, instead of three fresh output arrays per window. Off by
+default, because it measured slower: a Silero window is ~150µs of ONNX, and
+rebinding five tensors from Python each call costs more than the allocations it
+saves. It is there for a bigger model or a GPU provider, where the copies are
+what it avoids. scripts/bench-ort-sessions.py measures each of these.
+"""
+
+import hashlib
+import platform
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import onnxruntime as ort
+
+from logger import logger
+
+LEVELS = {
+    "off":      ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic":    ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all":      ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+def session_options(intra_threads: int = 1, level: str = "all") -> ort.SessionOptions:
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads     = intra_threads
+    opts.inter_op_num_threads     = 1
+    opts.execution_mode           = ort.ExecutionMode.ORT_SEQUENTIAL
+    opts.graph_optimization_level = LEVELS[level]
+    opts.add_session_config_entry("session.intra_op.allow_spinning", "0")
+    return opts
+
+
+@lru_cache(maxsize=1)
+def _cpu_tag() -> str:
+    """
+    Eight hex digits that change with the CPU: its model name and feature
+    flags from /proc/cpuinfo (the first processor's — they are all the same
+    CPU), or platform.processor() where there is no /proc.
+    """
+    try:
+        with open("/proc/cpuinfo") as f:
+            fields = {}
+            for line in f:
+                if not line.strip():
+                    break                       # end of the first processor
+                key, _, value = line.partition(":")
+                fields.setdefault(key.strip(), value.strip())
+        cpu = f"{fields.get('model name', '')}|{fields.get('flags', fields.get('Features', ''))}"
+    except OSError:
+        cpu = platform.processor()
+    return hashlib.sha1(cpu.encode()).hexdigest()[:8]
+
+
+def _cached_path(model_path: Path, cache_dir: Path, level: str) -> Path:
+    tag = f"{level}.ort{ort.__version__}.{platform.machine()}-{_cpu_tag()}"
+    return cache_dir / f"{model_path.stem}.{tag}.onnx"
+
+
+def load_session(model_path, *, intra_threads: int = 1, level: str = "all",
+                 cache_dir=None) -> ort.InferenceSession:
+    """
+    An InferenceSession for `model_path`, configured as the module docstring
+    says. Without a `cache_dir`, or at level "off", the graph is optimised at
+    every load and nothing is written.
+    """
+    model_path = Path(model_path)
+    if cache_dir is None or level == "off":
+        return ort.InferenceSession(str(model_path), session_options(intra_threads, level),
+                                    providers=["CPUExecutionProvider"])
+
+    cache_dir = Path(cache_dir)
+    cached = _cached_path(model_path, cache_dir, level)
+    if cached.exists() and cached.stat().st_mtime >= model_path.stat().st_mtime:
+        try:
+            # Already optimised: running the optimiser over it again is the
+            # cost the cache is there to skip.
+            return ort.InferenceSession(str(cached), session_options(intra_threads, "off"),
+                                        providers=["CPUExecutionProvider"])
+        except Exception as e:
+            logger.warning(f"[ort] cached {cached.name} unreadable, rebuilding: {e}")
+
+    opts = session_options(intra_threads, level)
+    # ORT warns, on writing a full-level graph, that it is for this machine
+    # only — which is what the CPU tag in its file name is for.
+    opts.log_severity_level = 3
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        opts.optimized_model_filepath = str(cached)
+    except OSError as e:
+        # A read-only disk costs the cache, not the model.
+        logger.warning(f"[ort] no optimised-model cache at {cache_dir}: {e}")
+    return ort.InferenceSession(str(model_path), opts, providers=["CPUExecutionProvider"])
+
+
+class VadStepper:
+    """
+    Silero VAD, one window at a time, carrying its own LSTM state.
+
+    Not thread-safe — an IOBinding is per caller. One per connection's
+    StreamingVAD, or one per get_vad_regions call; the session they share is.
+    `io_binding=False` makes plain run() calls, the same numbers either way.
+    """
+
+    def __init__(self, session: ort.InferenceSession, h: np.ndarray, c: np.ndarray, *,
+                 sample_rate: int = 16000, io_binding: bool = False):
+        self._session = session
+        self._sr      = np.array(sample_rate, dtype=np.int64)
+        # Two state buffers: a call reads one pair and writes the other.
+        self._h = [np.array(h, dtype=np.float32, copy=True), np.empty_like(h, dtype=np.float32)]
+        self._c = [np.array(c, dtype=np.float32, copy=True), np.empty_like(c, dtype=np.float32)]
+        self._cur  = 0
+        self._prob = np.empty((1, 1), dtype=np.float32)
+        self._binding = None
+        if io_binding:
+            self._binding = session.io_binding()
+            self._binding.bind_cpu_input("sr", self._sr)
+            self._binding.bind_output("output", "cpu", 0, np.float32,
+                                      self._prob.shape, self._prob.ctypes.data)
+
+    @property
+    def h(self) -> np.ndarray:
+        return self._h[self._cur]
+
+    @property
+    def c(self) -> np.ndarray:
+        return self._c[self._cur]
+
+    def state(self) -> tuple[np.ndarray, np.ndarray]:
+        """A copy of the current (h, c), to keep past the next step."""
+        return self.h.copy(), self.c.copy()
+
+    def step(self, window: np.ndarray) -> float:
+        """Speech probability of one (1, window) float32 window."""
+        src, dst = self._cur, 1 - self._cur
+        if self._binding is None:
+            outs = self._session.run(None, {'input': window, 'sr': self._sr,
+                                            'h': self._h[src], 'c': self._c[src]})
+            self._h[dst][...] = outs[1]
+            self._c[dst][...] = outs[2]
+            self._cur = dst
+            return float(outs[0].squeeze())
+
+        b = self._binding
+        window = np.ascontiguousarray(window, dtype=np.float32)
+        b.bind_cpu_input("input", window)
+        b.bind_cpu_input("h", self._h[src])
+        b.bind_cpu_input("c", self._c[src])
+        b.bind_output("hn", "cpu", 0, np.float32, self._h[dst].shape, self._h[dst].ctypes.data)
+        b.bind_output("cn", "cpu", 0, np.float32, self._c[dst].shape, self._c[dst].ctypes.data)
+        self._session.run_with_iobinding(b)
+        self._cur = dst
+        return float(self._prob[0, 0])
+
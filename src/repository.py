@@ -9,12 +9,18 @@ instead of hand-written SQL.
 Naming note — there are TWO "Session"s:
     DBSession = SQLAlchemy's DB session (the per-request workspace) -> aliased
     Session   = OUR model (one lecture)
+
+The recording socket runs on the event loop, so the operations it uses also
+come as `*_async` versions taking an AsyncDBSession. Each runs the sync
+function above it through `run_sync`: one definition of what the operation
+does, and the driver calls underneath are awaited rather than blocking.
 """
 
 import json
 from pathlib import Path
 
 from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession as AsyncDBSession
 from sqlalchemy.orm import Session as DBSession
 
 from logger import logger
@@ -193,6 +199,17 @@ def start_session(db: DBSession, *, user_id: int, voice_id: int | None,
     return obj
 
 
+def set_session_voice(db: DBSession, session_id: int, voice_id: int | None) -> None:
+    """Link a recording to the Voice it is being filtered by. The row is opened
+    before a voice is chosen, so the link is made later — and it is what
+    collapse_session counts as a use of that Voice."""
+    obj = db.get(Session, session_id)
+    if obj is None:
+        return
+    obj.voice_id = voice_id
+    db.commit()
+
+
 def add_chunk(db: DBSession, *, session_id: int, idx: int, text: str,
               words: list | None = None) -> None:
     """Store one transcribed chunk. The write is the size of the chunk, and
@@ -204,6 +221,17 @@ def add_chunk(db: DBSession, *, session_id: int, idx: int, text: str,
     db.commit()
 
 
+def add_chunks(db: DBSession, rows: list[dict]) -> None:
+    """Store many chunks in one transaction — one commit, one fsync, however many
+    recordings they came from. Each row has add_chunk's keyword arguments."""
+    db.add_all([
+        Chunk(session_id=r["session_id"], idx=r["idx"], text=r["text"],
+              words_json=json.dumps(r["words"]) if r.get("words") is not None else None)
+        for r in rows
+    ])
+    db.commit()
+
+
 def assemble_chunks(db: DBSession, session_id: int) -> tuple[str, list]:
     """The buffer, in order, as a transcript and one word list.
 
@@ -257,6 +285,33 @@ def collapse_session(db: DBSession, session_id: int) -> Session | None:
     return obj
 
 
+# ---- the same operations, awaited — for the recording socket -----------------
+# run_sync hands the sync function a Session whose connection is the async one,
+# so the ORM logic above runs unchanged and only the I/O becomes an await.
+
+async def get_voice_async(db: AsyncDBSession, voice_id: int) -> Voice | None:
+    return await db.get(Voice, voice_id)
+
+
+async def start_session_async(db: AsyncDBSession, *, user_id: int,
+                              voice_id: int | None, title: str) -> Session:
+    return await db.run_sync(start_session, user_id=user_id,
+                             voice_id=voice_id, title=title)
+
+
+async def set_session_voice_async(db: AsyncDBSession, session_id: int,
+                                  voice_id: int | None) -> None:
+    await db.run_sync(set_session_voice, session_id, voice_id)
+
+
+async def add_chunks_async(db: AsyncDBSession, rows: list[dict]) -> None:
+    await db.run_sync(add_chunks, rows)
+
+
+async def collapse_session_async(db: AsyncDBSession, session_id: int) -> Session | None:
+    return await db.run_sync(collapse_session, session_id)
+
+
 def list_sessions(db: DBSession, user_id: str | None = None) -> list[Session]:
     stmt = select(Session)
     if user_id is not None:
@@ -0,0 +1,297 @@
+"""
+ClassRec — speaker embeddings, a batch at a time
+================================================
+
+Step 4 of the pipeline asks, of every segment of a chunk, whether it is the
+professor. It used to ask one segment at a time: get_embedding built a tensor,
+ran ECAPA-TDNN's forward pass on it, and the answer was a dot product — then the
+same again for the next segment. A chunk has a handful of segments, so a handful
+of forward passes over a second or two of audio each, every one paying torch's
+per-call overhead and running its convolutions on a batch of one.
+
+SpeakerEncoder.embed takes all of them at once. The clips are zero-padded to a
+common length and passed with their relative lengths (`wav_lens`), which
+SpeechBrain threads through every length-aware layer: the feature normalisation,
+the squeeze-excitation means and the attentive statistics pooling all look only
+at each clip's own frames. What does see the padding is the convolution context
+at a clip's end, so an embedding can move from the one computed alone.
+scripts/bench-ecapa-batch.py reports by how much, and whether any decision at
+SIMILARITY_THRESHOLD moved with it — on untrained weights, a lowest cosine of
+0.997 at max_padding 0.5. Not measured on the trained model yet, so main.py
+batches only clips of equal length (ECAPA_MAX_PADDING=0) by default.
+
+Padding is compute: a 0.6s segment batched with an 11s one costs an 11s forward
+pass. Clips are sorted by length and a batch is closed once adding the next one
+would make more than `max_padding` of it padding, so a chunk of similar
+segments is one forward pass and a chunk with an outlier is two. Whether that
+is faster depends on the cores: on one vCPU it measured slower at every
+max_padding tried, the padding costing more than the calls it saved.
+
+The model runs one of two ways, behind the same `embed`:
+
+  TorchSpeakerEncoder  SpeechBrain's EncoderClassifier, as it always was.
+  OnnxSpeakerEncoder   the same network exported to ONNX
+                       (scripts/export-ecapa-onnx.py), optionally with INT8
+                       weights, run through ort_sessions like VAD and
+                       segmentation. SpeechBrain's filterbank front end is not
+                       in the export; `fbank` below is it in NumPy. Nothing on
+                       this path imports torch, so a server in this mode never
+                       loads torch or SpeechBrain — the bulk of a worker's
+                       footprint before any model is loaded.
+
+                       An export is only run once scripts/check-speaker-encoder.py
+                       has compared it with SpeechBrain on recordings and passed:
+                       the check writes a record next to the export, tied to the
+                       file's digest, and main.py falls back to torch without one
+                       (read_check below). A re-export needs a new check.
+
+EmbeddingBatcher goes one step further, across chunks: with `wait_ms` set, the
+first pipeline thread to ask waits that long for the others, and embeds every
+segment they brought in one call. Off by default — with two pipelines to
+a droplet, a second chunk arriving in the same few milliseconds is the exception,
+and the wait is paid by every chunk.
+
+Reported through metrics:
+    ecapa.batch_clips        clips per forward pass (timing)
+    ecapa.padding            fraction of each batch that was padding (timing)
+    ecapa.shared_batches     forward passes that served more than one caller (counter)
+"""
+
+import hashlib
+import json
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+
+import metrics
+
+# SpeechBrain's Fbank as spkrec-ecapa-voxceleb configures it: 25ms Hamming
+# windows every 10ms, 80 triangular mel filters from 0 to 8kHz, log power in dB
+# floored 80dB below each clip's peak — then each clip's mean subtracted
+# (InputNormalization, per sentence, no variance normalisation).
+FBANK_N_FFT  = 400
+FBANK_HOP    = 160
+FBANK_N_MELS = 80
+FBANK_TOP_DB = 80.0
+
+
+def length_groups(lengths: list[int], max_padding: float) -> list[list[int]]:
+    """
+    Indices into `lengths`, grouped into batches: shortest first, each batch
+    closed before padding would be more than `max_padding` of its samples.
+    """
+    order  = sorted(range(len(lengths)), key=lengths.__getitem__)
+    groups: list[list[int]] = []
+    for i in order:
+        if groups:
+            group  = groups[-1]
+            padded = lengths[i] * (len(group) + 1)
+            real   = sum(lengths[j] for j in group) + lengths[i]
+            if padded - real <= max_padding * padded:
+                group.append(i)
+                continue
+        groups.append([i])
+    return groups
+
+
+def _mel_filters(sample_rate: int) -> np.ndarray:
+    """(n_fft // 2 + 1, n_mels) triangular filters, built as SpeechBrain's
+    Filterbank builds them: one bandwidth for both slopes of each triangle."""
+    to_mel  = lambda hz: 2595 * np.log10(1 + hz / 700)
+    mel     = np.linspace(to_mel(0.0), to_mel(sample_rate / 2), FBANK_N_MELS + 2)
+    hz      = 700 * (10 ** (mel / 2595) - 1)
+    band    = (hz[1:] - hz[:-1])[:-1]
+    central = hz[1:-1]
+    freqs   = np.linspace(0, sample_rate // 2, FBANK_N_FFT // 2 + 1)
+    slope   = (freqs[None, :] - central[:, None]) / band[:, None]
+    return np.maximum(0.0, np.minimum(slope + 1, 1 - slope)).T.astype(np.float32)
+
+
+_FILTERS: dict[int, np.ndarray] = {}
+# Periodic, as torch.hamming_window makes it.
+_WINDOW = (0.54 - 0.46 * np.cos(2 * np.pi * np.arange(FBANK_N_FFT) / FBANK_N_FFT)).astype(np.float32)
+
+
+def fbank(batch: np.ndarray, lens: np.ndarray, sample_rate: int = 16000) -> np.ndarray:
+    """
+    (B, samples) zero-padded clips and their relative lengths → the (B, frames,
+    80) features ECAPA-TDNN reads: what EncoderClassifier.encode_batch computes
+    before the embedding model, in float32 rather than torch's arithmetic, so
+    equal to a rounding error.
+    """
+    filters = _FILTERS.get(sample_rate)
+    if filters is None:
+        filters = _FILTERS[sample_rate] = _mel_filters(sample_rate)
+    # torch.stft(center=True): half a window of zeros at each end, so frame i is
+    # centred on sample i * hop.
+    half   = FBANK_N_FFT // 2
+    padded = np.pad(batch, ((0, 0), (half, half)))
+    frames = np.lib.stride_tricks.sliding_window_view(padded, FBANK_N_FFT, axis=1)[:, ::FBANK_HOP]
+    spec   = np.fft.rfft(frames * _WINDOW, axis=-1)
+    power  = (spec.real ** 2 + spec.imag ** 2).astype(np.float32)
+    feats  = 10 * np.log10(np.maximum(power @ filters, 1e-10))
+    feats  = np.maximum(feats, feats.max(axis=(1, 2), keepdims=True) - FBANK_TOP_DB)
+    # Each clip's mean over its own frames — the padding's are still there,
+    # shifted with the rest, as SpeechBrain leaves them. Its own frames are
+    # counted as make_padding_mask counts them, rel * frames rounded up: a
+    # 1s clip padded to 1.9s is 101 frames of 188, not round()'s 100, and the
+    # mean over the wrong count was off by up to 0.6dB.
+    n = feats.shape[1]
+    for row, rel in enumerate(lens):
+        actual = int(np.ceil(rel * n - 1e-6))
+        feats[row] -= feats[row, :actual].mean(axis=0)
+    return feats.astype(np.float32)
+
+
+def file_digest(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def check_path(model_path) -> Path:
+    """Where scripts/check-speaker-encoder.py records an export's result:
+    models/ecapa_tdnn.onnx → models/ecapa_tdnn.check.json."""
+    return Path(model_path).with_suffix(".check.json")
+
+
+def read_check(model_path) -> dict | None:
+    """The passing check record for this export as it is now, or None — no
+    record, a failed one, or one written for a different file."""
+    try:
+        record = json.loads(check_path(model_path).read_text())
+    except (OSError, ValueError):
+        return None
+    if not record.get("passed") or record.get("sha256") != file_digest(model_path):
+        return None
+    return record
+
+
+class SpeakerEncoder(ABC):
+    """
+    A speaker model (ECAPA-TDNN), embedding many clips per forward pass.
+    Subclasses run the model (_run); this groups the clips and normalises what
+    comes back. Thread-safe as the models are: read-only during inference.
+    """
+
+    def __init__(self, *, max_padding: float = 0.5):
+        self.max_padding = max_padding
+
+    def embed(self, clips: list[np.ndarray]) -> np.ndarray:
+        """One L2-normalised embedding per clip, as rows, in the order given."""
+        out = None
+        for group in length_groups([len(c) for c in clips], self.max_padding):
+            emb = self._forward([clips[i] for i in group])
+            if out is None:
+                out = np.empty((len(clips), emb.shape[1]), dtype=np.float32)
+            out[group] = emb
+        if out is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+    def _forward(self, clips: list[np.ndarray]) -> np.ndarray:
+        longest = max(len(c) for c in clips)
+        batch   = np.zeros((len(clips), longest), dtype=np.float32)
+        for row, clip in enumerate(clips):
+            batch[row, :len(clip)] = clip
+        lens = np.array([len(c) / longest for c in clips], dtype=np.float32)
+        metrics.observe("ecapa.batch_clips", len(clips))
+        metrics.observe("ecapa.padding", 1 - float(lens.mean()))
+        return self._run(batch, lens).reshape(len(clips), -1)
+
+    @abstractmethod
+    def _run(self, batch: np.ndarray, lens: np.ndarray) -> np.ndarray:
+        """Padded clips (batch, samples) and their relative lengths → one
+        unnormalised embedding per row."""
+
+
+class TorchSpeakerEncoder(SpeakerEncoder):
+    """SpeechBrain's EncoderClassifier, under no_grad."""
+
+    def __init__(self, model, *, max_padding: float = 0.5):
+        super().__init__(max_padding=max_padding)
+        import torch
+        self._torch = torch
+        self.model  = model
+
+    def _run(self, batch: np.ndarray, lens: np.ndarray) -> np.ndarray:
+        torch = self._torch
+        with torch.no_grad():
+            return self.model.encode_batch(torch.from_numpy(batch), torch.from_numpy(lens)).numpy()
+
+
+class OnnxSpeakerEncoder(SpeakerEncoder):
+    """
+    The exported embedding model — inputs `feats` (B, frames, 80) and `lengths`
+    (B,), output `embedding` — behind the NumPy front end. No torch anywhere.
+    """
+
+    def __init__(self, session, *, sample_rate: int = 16000, max_padding: float = 0.5):
+        super().__init__(max_padding=max_padding)
+        self.session     = session
+        self.sample_rate = sample_rate
+
+    def _run(self, batch: np.ndarray, lens: np.ndarray) -> np.ndarray:
+        feats = fbank(batch, lens, self.sample_rate)
+        return self.session.run(["embedding"], {"feats": feats, "lengths": lens})[0]
+
+
+class EmbeddingBatcher:
+    """
+    Several threads' clips, embedded together. `embed` has SpeakerEncoder's
+    signature; with `wait_ms` at 0 it is a straight call to the encoder.
+
+    The first caller to find nothing pending leads: it waits up to `wait_ms`,
+    or until `max_clips` are pending, then embeds everything pending and hands
+    each caller its rows. Callers who arrive meanwhile only wait for theirs.
+    """
+
+    def __init__(self, encoder, *, wait_ms: int = 0, max_clips: int = 32):
+        self.encoder   = encoder
+        self.wait      = wait_ms / 1000
+        self.max_clips = max_clips
+        self._cond     = threading.Condition()
+        self._pending: list[dict] = []
+
+    def embed(self, clips: list[np.ndarray]) -> np.ndarray:
+        if self.wait <= 0 or not clips:
+            return self.encoder.embed(clips)
+
+        request = {"clips": clips, "done": threading.Event(), "result": None, "error": None}
+        with self._cond:
+            self._pending.append(request)
+            leader = len(self._pending) == 1
+            if leader:
+                self._cond.wait_for(lambda: self._queued() >= self.max_clips, timeout=self.wait)
+                batch, self._pending = self._pending, []
+            else:
+                self._cond.notify_all()
+        if leader:
+            self._run(batch)
+        request["done"].wait()
+        if request["error"] is not None:
+            raise request["error"]
+        return request["result"]
+
+    def _queued(self) -> int:
+        return sum(len(r["clips"]) for r in self._pending)
+
+    def _run(self, batch: list[dict]) -> None:
+        try:
+            emb = self.encoder.embed([c for r in batch for c in r["clips"]])
+            if len(batch) > 1:
+                metrics.incr("ecapa.shared_batches")
+            row = 0
+            for r in batch:
+                r["result"] = emb[row: row + len(r["clips"])]
+                row += len(r["clips"])
+        except Exception as e:
+            for r in batch:
+                r["error"] = e
+        finally:
+            for r in batch:
+                r["done"].set()
@@ -0,0 +1,648 @@
+"""
+ClassRec — transcription backends
+=================================
+
+Step 1 of every chunk, and every upload, is "turn this audio into timed words".
+That used to mean one thing: a POST to MODAL_WHISPER_URL. With Modal down, or the
+URL unset on a laptop, every chunk failed — there was nowhere else for it to go.
+
+A backend is anything that can answer:
+
+    await backend.transcribe(samples)            16kHz float32 chunk → words
+    await backend.transcribe_file(bytes, mime)   an uploaded file    → words
+
+where words is [{"word": str, "start": float, "end": float}, ...], seconds from
+the start of the audio it was given.
+
+transcribe also takes `on_partial`, an async callback for the words so far,
+called as a backend has them and before it returns. The live page shows them as
+interim text. A backend that cannot stream simply never calls it.
+
+    ModalBackend      the T4 endpoint in modal_whisper.py — batching, the codec,
+                      the upload transcode; everything that was in main.py
+    LocalBackend      faster-whisper on this machine's CPU, int8. Slower and
+                      smaller, but always there: a fallback when Modal is not, a
+                      stand-in for development without a Modal account, and a
+                      load-test target that costs no GPU time
+    ResilientBackend  a backend with deadlines, hedging, a retry budget and a
+                      circuit breaker — and another backend to fall back on
+
+Which backend serves which request is decided in main.py — per deployment, and
+per plan. Each is started once with the app and shared by every socket.
+
+faster-whisper is optional, like the models main.py loads at startup: imported
+only when a LocalBackend starts, so a deployment that only talks to Modal never
+needs it installed (pip install faster-whisper where one does).
+"""
+
+import asyncio
+import io
+import json
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import numpy as np
+import soundfile as sf
+
+import metrics
+from audio import PCM_CONTENT_TYPE, encode_pcm
+from logger import logger
+from whisper_batcher import WhisperBatcher
+
+SAMPLE_RATE = 16000
+
+
+class TranscriptionBackend(ABC):
+    """Audio in, timed words out. See the module docstring. A subclass missing
+    transcribe or transcribe_file fails when it is constructed, at startup."""
+
+    name = "backend"
+
+    async def start(self) -> None:
+        """Connect, load, warm — whatever has to happen once. Called at startup."""
+
+    async def aclose(self) -> None:
+        """Release what start() took. Called at shutdown."""
+
+    def warm(self) -> None:
+        """Get ready to answer soon — a lecture is starting. Returns at once."""
+
+    @abstractmethod
+    async def transcribe(self, samples: np.ndarray, on_partial=None) -> list[dict]:
+        """A 16kHz float32 chunk → words."""
+
+    @abstractmethod
+    async def transcribe_file(self, contents: bytes, mime: str) -> list[dict]:
+        """An uploaded file's bytes and MIME type → words."""
+
+
+# ======= MODAL =======
+# Uploads in one of these arrive uncompressed, and are re-encoded as FLAC on the
+# way to Modal. mp3, m4a and the rest are already compressed and go as they are.
+_UNCOMPRESSED_UPLOADS = {"audio/wav", "audio/x-wav", "audio/wave"}
+
+_CODECS = {   # name: (soundfile format, subtype, content type)
+    "flac": ("FLAC", "PCM_16", "audio/flac"),
+    "opus": ("OGG",  "OPUS",   "audio/ogg"),
+    "wav":  ("WAV",  "PCM_16", "audio/wav"),
+}
+
+
+def encode_for_modal(samples: np.ndarray, codec: str) -> tuple[bytes, str]:
+    """A chunk as a request body for Modal, in `codec`, with its content type.
+    flac and opus are CPU work — call those through the executor."""
+    if codec in _CODECS:
+        fmt, subtype, content_type = _CODECS[codec]
+        buf = io.BytesIO()
+        sf.write(buf, samples, SAMPLE_RATE, format=fmt, subtype=subtype)
+        return buf.getvalue(), content_type
+    dtype = np.float16 if codec == "f16" else np.int16
+    return encode_pcm(samples, SAMPLE_RATE, dtype), PCM_CONTENT_TYPE
+
+
+# The WAV subtypes FLAC holds losslessly: (dtype read as, FLAC subtype written).
+# Anything else — 32-bit integer, float, or a compressed WAV — goes as it came.
+_FLAC_FOR_WAV = {
+    "PCM_U8": ("int16", "PCM_16"),
+    "PCM_S8": ("int16", "PCM_16"),
+    "PCM_16": ("int16", "PCM_16"),
+    "PCM_24": ("int32", "PCM_24"),
+}
+
+
+def _wav_upload_to_flac(contents: bytes) -> tuple[bytes, str]:
+    """An uploaded WAV, losslessly as FLAC — same rate, channels and bit depth,
+    half the upload to Modal. One FLAC cannot hold exactly (see _FLAC_FOR_WAV),
+    or that soundfile cannot read, goes as it came."""
+    try:
+        subtype = sf.info(io.BytesIO(contents)).subtype
+        if subtype not in _FLAC_FOR_WAV:
+            return contents, "audio/wav"
+        dtype, flac_subtype = _FLAC_FOR_WAV[subtype]
+        audio, rate = sf.read(io.BytesIO(contents), dtype=dtype)
+        buf = io.BytesIO()
+        sf.write(buf, audio, rate, format="FLAC", subtype=flac_subtype)
+        return buf.getvalue(), "audio/flac"
+    except Exception as e:
+        logger.warning(f"[upload] could not re-encode WAV as FLAC, sending as is: {e}")
+        return contents, "audio/wav"
+
+
+class ModalBackend(TranscriptionBackend):
+    """
+    faster-whisper large-v3 + stable-ts on a Modal T4 — no GPU or Whisper model
+    on this server.
+
+    An async client, so the ~1.7s wait costs no thread. With a blocking client the
+    call had to be pushed to the executor purely to keep it off the event loop,
+    which meant one pool thread asleep per request in flight, and a dropped
+    connection left that thread stuck until Modal answered or the timeout fired.
+    An await can simply be cancelled.
+
+    Cold start: first request after idle spins up a T4 container. Measured at
+    42.9s for a 10s chunk — container boot and image pull, not just model load.
+    Warm requests: ~1-2s round-trip for the same chunk.
+    """
+
+    name = "modal"
+
+    # Modal keeps a container for scaledown_window (300s) after its last request.
+    # Within this long of the last answer it is still warm and a warm-up would
+    # be wasted; past it, one is sent.
+    WARM_FOR = 240.0
+
+    def __init__(self, url: str, *, codec: str = "flac", batch_ms: int = 50,
+                 batch_max: int = 8, stream: bool = False, timeout: float = 90.0):
+        self.url       = url
+        self.stream    = stream
+        self.codec     = codec
+        self.batch_ms  = batch_ms
+        self.batch_max = batch_max
+        self.timeout   = timeout
+        self._client: httpx.AsyncClient | None = None
+        self._batcher: WhisperBatcher | None = None
+        self._warming: asyncio.Task | None = None
+        self._last_answer = float("-inf")       # monotonic; any answer, warm-up or chunk
+
+    async def start(self) -> None:
+        # One client for the process, reusing connections; the timeout is
+        # generous because a cold container takes a few seconds.
+        self._client = httpx.AsyncClient(timeout=httpx.Timeout(self.timeout))
+        if not self.url:
+            logger.warning("MODAL_WHISPER_URL not set — Modal transcription will fail")
+            return
+        logger.info(f"Modal Whisper endpoint configured: {self.url}")
+        if self.batch_ms > 0:
+            self._batcher = WhisperBatcher(self._client, self.url,
+                                           max_items=self.batch_max,
+                                           window_ms=self.batch_ms)
+            self._batcher.start()
+            logger.info(f"Whisper batcher: up to {self.batch_max} chunks per request, "
+                        f"{self.batch_ms}ms window")
+            if self.stream:
+                logger.warning("WHISPER_STREAM is on too: streamed chunks go around "
+                               "the batcher, so it will batch nothing")
+
+    async def aclose(self) -> None:
+        # Without this the pool is torn down by garbage collection, which logs
+        # noisily and can leave sockets in TIME_WAIT.
+        if self._warming is not None:
+            self._warming.cancel()
+            self._warming = None
+        if self._batcher is not None:
+            await self._batcher.stop()
+            self._batcher = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def transcribe(self, samples: np.ndarray, on_partial=None) -> list[dict]:
+        if self.codec in ("flac", "opus"):
+            # A few ms of libsndfile per chunk — enough, across every socket, to
+            # matter on the loop.
+            body, content_type = await asyncio.get_running_loop().run_in_executor(
+                None, encode_for_modal, samples, self.codec)
+        else:
+            body, content_type = encode_for_modal(samples, self.codec)   # <1ms
+        metrics.incr(f"modal.bytes_sent.{self.codec}", len(body))
+
+        logger.debug(f"[whisper] calling Modal ({len(samples)/SAMPLE_RATE:.1f}s audio)")
+        if on_partial is not None and self.stream:
+            # Its own request, not the batcher's: a batch answers when its last
+            # clip is done, so there would be nothing to show early. Streaming
+            # trades the shared GPU pass for words on the page a segment at a
+            # time; with WHISPER_BATCH_MS set as well, the batcher sits idle.
+            words = await self._stream(body, content_type, on_partial)
+        elif self._batcher is not None:
+            # Possibly in one request with other recordings' chunks; the words
+            # that come back are this chunk's alone.
+            words = await self._batcher.transcribe(body, content_type)
+        else:
+            response = await self._client.post(
+                self.url, content=body, headers={"Content-Type": content_type})
+            response.raise_for_status()
+            words = response.json()
+        self._last_answer = time.monotonic()
+        return words
+
+    async def _stream(self, body: bytes, content_type: str, on_partial) -> list[dict]:
+        """/stream: each segment's words as Modal decodes them, then all of them."""
+        metrics.incr("modal.streams")
+        words: list[dict] = []
+        async with self._client.stream(
+                "POST", self.url.rstrip("/") + "/stream", content=body,
+                headers={"Content-Type": content_type}) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                message = json.loads(line)
+                if message.get("done"):
+                    return message["words"]
+                words.extend(message["words"])
+                await on_partial(list(words))
+        # The connection closed without the final line — the container died or
+        # the response was cut. What came so far is not the answer.
+        raise httpx.RemoteProtocolError("stream ended before its final line")
+
+    def warm(self) -> None:
+        """
+        Start a container now, so the cold start (42.9s measured) is paid while
+        the lecture's first chunk is still being recorded, not after it is sent.
+
+        Once for a burst: a warm-up already on its way, or any answer within
+        WARM_FOR, means a container is up or coming, and nothing is sent. Twenty
+        lectures starting at nine o'clock cost one /warmup, not twenty.
+        """
+        if not self.url or self._client is None:
+            return
+        if self._warming is not None and not self._warming.done():
+            metrics.incr("modal.warmup_skipped")
+            return
+        if time.monotonic() - self._last_answer < self.WARM_FOR:
+            metrics.incr("modal.warmup_skipped")
+            return
+        self._warming = asyncio.create_task(self._warm())
+
+    async def _warm(self) -> None:
+        t0 = time.monotonic()
+        metrics.incr("modal.warmups")
+        try:
+            response = await self._client.post(self.url.rstrip("/") + "/warmup")
+            response.raise_for_status()
+        except Exception as e:
+            # Only a head start was lost; the first chunk pays the cold start
+            # as it always did.
+            metrics.incr("modal.warmup_failed")
+            logger.warning(f"[whisper] warm-up failed: {e!r}")
+            return
+        self._last_answer = time.monotonic()
+        metrics.observe("modal.warmup_s", self._last_answer - t0)
+        logger.info(f"[whisper] Modal warm after {self._last_answer - t0:.1f}s "
+                    f"(model load {response.json().get('loaded_in', '?')}s)")
+
+    async def transcribe_file(self, contents: bytes, mime: str) -> list[dict]:
+        if mime in _UNCOMPRESSED_UPLOADS and self.codec != "wav":
+            contents, mime = await asyncio.get_running_loop().run_in_executor(
+                None, _wav_upload_to_flac, contents)
+        response = await self._client.post(
+            self.url, content=contents, headers={"Content-Type": mime}, timeout=120)
+        response.raise_for_status()
+        return response.json()
+
+
+# ======= LOCAL CPU =======
+class LocalBackend(TranscriptionBackend):
+    """
+    faster-whisper (CTranslate2) on this machine's CPU, int8.
+
+    Its own thread pool, `workers` wide, and not the inference pool: a chunk
+    here is seconds of every core it is given, and the inference pool is where
+    VAD, segmentation and ECAPA run for every other socket. `cpu_threads` is per
+    worker — workers x cpu_threads should not exceed the cores set aside for it.
+
+    Greedy decoding (beam_size=1) and no internal VAD: the silence gate has
+    already run, and on a CPU the beam is the difference between keeping up with
+    a lecture and not.
+    """
+
+    name = "local"
+
+    def __init__(self, model: str = "base.en", *, compute_type: str = "int8",
+                 cpu_threads: int = 2, workers: int = 1, download_root: str | None = None):
+        self.model_name    = model
+        self.compute_type  = compute_type
+        self.cpu_threads   = cpu_threads
+        self.workers       = workers
+        self.download_root = download_root
+        self._model = None
+        self._pool: ThreadPoolExecutor | None = None
+
+    async def start(self) -> None:
+        from faster_whisper import WhisperModel     # optional; see module docstring
+
+        self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                        thread_name_prefix="whisper-local")
+        # Loading can mean downloading the weights the first time; off the loop.
+        self._model = await asyncio.get_running_loop().run_in_executor(
+            self._pool, lambda: WhisperModel(
+                self.model_name, device="cpu", compute_type=self.compute_type,
+                cpu_threads=self.cpu_threads, num_workers=self.workers,
+                download_root=self.download_root))
+        logger.info(f"Local Whisper loaded: {self.model_name} {self.compute_type}, "
+                    f"{self.workers} x {self.cpu_threads} threads")
+
+    async def aclose(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        self._model = None
+
+    def _run(self, audio) -> list[dict]:
+        segments, _ = self._model.transcribe(
+            audio, language="en", beam_size=1, word_timestamps=True,
+            vad_filter=False, condition_on_previous_text=False)
+        return [{"word": w.word.strip(), "start": float(w.start), "end": float(w.end)}
+                for segment in segments for w in segment.words]
+
+    async def transcribe(self, samples: np.ndarray, on_partial=None) -> list[dict]:
+        # No partials: the pool thread would have to wait on the socket for each.
+        if self._model is None:
+            raise RuntimeError("local Whisper is not loaded")
+        metrics.incr("local_whisper.seconds", len(samples) / SAMPLE_RATE)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._pool, self._run, samples.astype(np.float32, copy=False))
+
+    async def transcribe_file(self, contents: bytes, mime: str) -> list[dict]:
+        if self._model is None:
+            raise RuntimeError("local Whisper is not loaded")
+        from faster_whisper import decode_audio
+
+        def run():
+            return self._run(decode_audio(io.BytesIO(contents), sampling_rate=SAMPLE_RATE))
+        return await asyncio.get_running_loop().run_in_executor(self._pool, run)
+
+
+# ======= RESILIENCE =======
+class CircuitOpenError(RuntimeError):
+    """The backend has been failing, and is not being asked for now."""
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Whether the same request, sent again, could be answered: a timeout, a
+    connection that failed or was cut, or a 5xx. A 4xx is the endpoint's answer
+    to this request — malformed audio, too large, not allowed — and will be the
+    same answer every time; so is anything else the backend raised on its own.
+    Only transient failures are retried or hedged, and only they say anything
+    about the backend's health to the breaker.
+    """
+    if isinstance(error, (asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return False
+
+
+class RetryBudget:
+    """
+    Retries and hedges as a fraction of real traffic, so they cannot multiply an
+    outage. Every request deposits `ratio` of a token, up to `cap`; a retry or a
+    hedge spends a whole one. At 0.1, a backend that fails everything sees at
+    most 10% more requests than it would have without retries — not the 2x or
+    3x of "retry every failure", which is what turns a slow Modal into a down one.
+    """
+
+    def __init__(self, ratio: float = 0.1, cap: float = 10.0):
+        self.ratio  = ratio
+        self.cap    = cap
+        self.tokens = cap
+
+    def deposit(self) -> None:
+        self.tokens = min(self.cap, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class CircuitBreaker:
+    """
+    closed     requests go through
+    open       `failures` requests in a row have failed; none go through for
+               `cooldown` seconds — they go to the fallback, or fail at once
+    half-open  the cooldown is over; ONE request goes through as a probe, and
+               its outcome closes the breaker or opens it for another cooldown
+    """
+
+    def __init__(self, failures: int = 5, cooldown: float = 30.0):
+        self.failures  = failures
+        self.cooldown  = cooldown
+        self._failed   = 0
+        self._opened_at: float | None = None
+        self._probing  = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self._failed, self._opened_at, self._probing = 0, None, False
+
+    def abandon(self) -> None:
+        """The request was cancelled — its socket went away — before it could
+        say anything about the backend. A probe lets the next request probe."""
+        self._probing = False
+
+    def record_failure(self) -> bool:
+        """Returns True if this failure opened the breaker."""
+        self._failed += 1
+        was_probe, self._probing = self._probing, False
+        if was_probe or (self._opened_at is None and self._failed >= self.failures):
+            self._opened_at = time.monotonic()
+            return True
+        return False
+
+
+class ResilientBackend(TranscriptionBackend):
+    """
+    `primary`, made to degrade instead of drop chunks — and `fallback`, if there
+    is one, for when it cannot be made to answer.
+
+    For each request:
+      deadline    the whole request, retries and hedges included, has `deadline`
+                  seconds; each attempt gets `attempt_timeout` of them, or what
+                  is left. A chunk is only worth words while the page is still
+                  waiting for them.
+      hedge       if the first attempt has not answered within the `hedge_quantile`
+                  of recent answer times, a second copy is sent and the first to
+                  answer wins — a request stuck behind a slow container no longer
+                  decides the chunk's latency.
+      retry       an attempt that fails transiently (is_transient) is tried
+                  again while time remains. Any other failure — a 4xx, say —
+                  ends the request at once: it would fail the same way again.
+    Hedges and retries both spend from one RetryBudget for the backend, so
+    together they stay a small fraction of real traffic.
+
+    Across requests, a CircuitBreaker: once `breaker_failures` requests in a row
+    have failed transiently, the primary is left alone for `breaker_cooldown`
+    seconds, and everything goes straight to the fallback instead of each chunk
+    spending its deadline finding out.
+
+    Reported through metrics, under resilience.<primary>.:
+        attempts, hedges, retries, budget_exhausted, timeouts, failures,
+        rejected, breaker_trips, short_circuited, fallbacks   (counters)
+        breaker_open                                (gauge, 1 while not closed)
+        latency_s                                   (timing, answered attempts)
+    """
+
+    def __init__(self, primary: TranscriptionBackend,
+                 fallback: TranscriptionBackend | None = None, *,
+                 deadline: float = 60.0, attempt_timeout: float = 45.0,
+                 hedge: bool = True, hedge_quantile: float = 0.95,
+                 hedge_min: float = 0.5, retry_ratio: float = 0.1,
+                 breaker_failures: int = 5, breaker_cooldown: float = 30.0):
+        self.primary         = primary
+        self.fallback        = fallback
+        self.name            = primary.name if fallback is None else f"{primary.name}+{fallback.name}"
+        self.deadline        = deadline
+        self.attempt_timeout = attempt_timeout
+        self.hedge           = hedge
+        self.hedge_quantile  = hedge_quantile
+        self.hedge_min       = hedge_min
+        self.budget          = RetryBudget(retry_ratio)
+        self.breaker         = CircuitBreaker(breaker_failures, breaker_cooldown)
+        self._latencies: deque[float] = deque(maxlen=200)
+        self._prefix         = f"resilience.{primary.name}."
+
+    def warm(self) -> None:
+        self.primary.warm()
+
+    def _metric(self, name: str, n: float = 1) -> None:
+        metrics.incr(self._prefix + name, n)
+
+    def _hedge_after(self) -> float | None:
+        """Seconds to wait before hedging — None until there are enough answer
+        times to say what slow is."""
+        if not self.hedge or len(self._latencies) < 20:
+            return None
+        ordered = sorted(self._latencies)
+        return max(self.hedge_min, ordered[int(self.hedge_quantile * (len(ordered) - 1))])
+
+    async def transcribe(self, samples: np.ndarray, on_partial=None) -> list[dict]:
+        # Every attempt gets the callback. A hedge racing the first attempt may
+        # show its own partials in between — each is the words so far, so the
+        # page only ever shows one attempt's progress, and the answer replaces it.
+        return await self._call(
+            lambda: self.primary.transcribe(samples, on_partial),
+            (lambda: self.fallback.transcribe(samples, on_partial)) if self.fallback else None,
+            hedge=True)
+
+    async def transcribe_file(self, contents: bytes, mime: str) -> list[dict]:
+        # One attempt, on the backend's own timeout: an upload is minutes of GPU,
+        # too long to share a chunk's deadline and too costly to send twice. The
+        # breaker and the fallback still apply.
+        return await self._call(
+            lambda: self.primary.transcribe_file(contents, mime),
+            (lambda: self.fallback.transcribe_file(contents, mime)) if self.fallback else None,
+            hedge=False, retry=False)
+
+    async def _call(self, attempt, fallback, *, hedge: bool, retry: bool = True):
+        if not self.breaker.allow():
+            self._metric("short_circuited")
+            if fallback is None:
+                raise CircuitOpenError(f"{self.primary.name} is failing; not asked")
+            self._metric("fallbacks")
+            return await fallback()
+        try:
+            if retry:
+                result = await self._attempts(attempt, hedge=hedge)
+            else:
+                result = await attempt()
+        except asyncio.CancelledError:
+            self.breaker.abandon()
+            raise
+        except Exception as e:
+            if is_transient(e):
+                self._metric("failures")
+                if self.breaker.record_failure():
+                    self._metric("breaker_trips")
+                    logger.warning(f"[transcribe] {self.primary.name} breaker open for "
+                                   f"{self.breaker.cooldown:.0f}s after {e!r}")
+                metrics.set_gauge(self._prefix + "breaker_open",
+                                  int(self.breaker.state != "closed"))
+            else:
+                # The backend answered; it did not like this request. Not a
+                # failure of the backend, so not the breaker's business.
+                self._metric("rejected")
+                self.breaker.abandon()
+            if fallback is None:
+                raise
+            logger.warning(f"[transcribe] {self.primary.name} failed ({e!r}); "
+                           f"using {self.fallback.name}")
+            self._metric("fallbacks")
+            return await fallback()
+        self.breaker.record_success()
+        metrics.set_gauge(self._prefix + "breaker_open", 0)
+        return result
+
+    async def _attempts(self, attempt, *, hedge: bool):
+        loop     = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        self.budget.deposit()
+        running: dict[asyncio.Task, float] = {}      # attempt → when it started
+        hedge_after = self._hedge_after() if hedge else None
+        hedged, last_error = False, None
+
+        def launch() -> None:
+            self._metric("attempts")
+            limit = min(self.attempt_timeout, deadline - loop.time())
+            running[asyncio.create_task(asyncio.wait_for(attempt(), limit))] = loop.time()
+
+        launch()
+        first_started = loop.time()
+        try:
+            while True:
+                wait = deadline - loop.time()
+                if hedge_after is not None and not hedged:
+                    wait = min(wait, first_started + hedge_after - loop.time())
+                done, _ = await asyncio.wait(running, timeout=max(0.0, wait),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    started = running.pop(task)
+                    if task.exception() is None:
+                        self._latencies.append(loop.time() - started)
+                        metrics.observe(self._prefix + "latency_s", loop.time() - started)
+                        return task.result()
+                    last_error = task.exception()
+                    if isinstance(last_error, asyncio.TimeoutError):
+                        self._metric("timeouts")
+                    elif not is_transient(last_error):
+                        raise last_error             # the same answer every time
+
+                if loop.time() >= deadline:
+                    raise last_error or asyncio.TimeoutError()
+                if not done:
+                    # The hedge timer, not an answer: the first attempt is slow.
+                    hedged = True
+                    if self.budget.withdraw():
+                        self._metric("hedges")
+                        launch()
+                    else:
+                        self._metric("budget_exhausted")
+                    continue
+                if running:
+                    continue                         # the other copy may yet answer
+                if deadline - loop.time() < 1.0:
+                    raise last_error                 # too little left to be answered in
+                if not self.budget.withdraw():
+                    self._metric("budget_exhausted")
+                    raise last_error
+                self._metric("retries")
+                # A little jitter, so the chunks that failed together do not all
+                # come back at the same instant.
+                await asyncio.sleep(min(0.1 + random.random() * 0.2,
+                                        max(0.0, deadline - loop.time())))
+                launch()
+        finally:
+            for task in running:
+                task.cancel()
@@ -0,0 +1,152 @@
+"""
+ClassRec — the usage meter (write-behind live_seconds)
+======================================================
+
+Billing a chunk used to be three round trips: an UPDATE adding ten seconds, a
+commit, and a SELECT to read the new total back — for every chunk of every
+recording. The total is needed at once, because it is what the ceiling is
+checked against; the write is not, as long as it is never lost.
+
+So the two are separated. The meter holds the total in memory, per user, and
+answers immediately:
+
+    total = what the database last said + what is being written + what is not yet
+
+and a background task writes the increments every `flush_interval` seconds —
+one UPDATE for every user with something owed, RETURNING the new totals, which
+become the next "what the database last said". A socket closing flushes too, as
+does shutdown.
+
+Shared by every socket in the process, so two tabs of one account read the same
+number the moment either is billed — tighter than before, when each socket
+learned of the other only when one of its own chunks was billed.
+
+Nothing is lost when a flush fails. An increment leaves `_pending` only for
+`_inflight`, and leaves `_inflight` only when the UPDATE has committed; a write
+that raises puts it back. The write itself is shielded, so cancelling the task
+that started it cannot stop it halfway and leave the outcome unknown. A crash of
+the PROCESS still loses up to `flush_interval` of usage — under-billing, never
+double billing, and the bound is the setting.
+
+ONE PROCESS ONLY, in the sense that other workers' increments appear here only
+as each flush reads back the database's total.
+"""
+
+import asyncio
+import math
+
+from sqlalchemy import case, update
+
+import metrics
+from logger import logger
+from models import User
+
+
+class UsageMeter:
+    """Per-user live seconds, answered from memory and written behind."""
+
+    def __init__(self, session_factory, *, flush_interval: float = 5.0):
+        self._session_factory = session_factory
+        self.flush_interval   = flush_interval
+        self._known:    dict[int, float] = {}      # the database's last word
+        self._inflight: dict[int, float] = {}      # being written right now
+        self._pending:  dict[int, float] = {}      # owed, not yet written
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    # ---- the socket's side ------------------------------------------------------
+
+    def seed(self, user_id: int, live_seconds: float) -> None:
+        """What the database says at connect. Replaces the known total only —
+        anything owed is still owed on top of it."""
+        self._known[user_id] = float(live_seconds)
+
+    def add(self, user_id: int, seconds: float) -> float:
+        """Bill `seconds` and return the account's total, all tabs included."""
+        if seconds > 0:
+            self._pending[user_id] = self._pending.get(user_id, 0.0) + seconds
+            metrics.incr("usage.billed_seconds", seconds)
+        self._ensure_running()
+        return self.total(user_id)
+
+    def total(self, user_id: int) -> float:
+        return (self._known.get(user_id, 0.0) + self._inflight.get(user_id, 0.0)
+                + self._pending.get(user_id, 0.0))
+
+    # ---- the writing side -------------------------------------------------------
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def _ensure_running(self) -> None:
+        """Restart the flush task if something killed it. _run survives failed
+        writes by itself; this covers whatever it did not anticipate."""
+        if self._task is not None and self._task.done():
+            if not self._task.cancelled() and self._task.exception() is not None:
+                logger.error(f"[usage] flush task died: {self._task.exception()!r}; restarting")
+                metrics.incr("usage.flush_task_restarts")
+            self.start()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"[usage] flush failed, will retry: {e}")
+
+    async def flush(self) -> None:
+        """Write everything owed. Whole seconds only — the column is an integer —
+        so a fraction stays pending until it adds up to one."""
+        async with self._flush_lock:
+            owed = {uid: math.floor(s) for uid, s in self._pending.items() if s >= 1}
+            if not owed:
+                return
+            for uid, n in owed.items():
+                self._pending[uid] -= n
+                if self._pending[uid] <= 0:
+                    del self._pending[uid]
+                self._inflight[uid] = self._inflight.get(uid, 0.0) + n
+            # Shielded: cancelling this coroutine leaves the write running to its
+            # end, where it settles _inflight one way or the other.
+            await asyncio.shield(self._write(owed))
+
+    async def _write(self, owed: dict[int, int]) -> None:
+        try:
+            async with self._session_factory() as db:
+                rows = (await db.execute(
+                    update(User)
+                    .where(User.id.in_(owed))
+                    .values(live_seconds=User.live_seconds
+                            + case(owed, value=User.id, else_=0))
+                    .returning(User.id, User.live_seconds)
+                    .execution_options(synchronize_session=False)
+                )).all()
+                await db.commit()
+        except BaseException:
+            # Not written, so still owed.
+            for uid, n in owed.items():
+                self._inflight[uid] -= n
+                if self._inflight[uid] <= 0:
+                    del self._inflight[uid]
+                self._pending[uid] = self._pending.get(uid, 0.0) + n
+            metrics.incr("usage.flush_failures")
+            raise
+        for uid, n in owed.items():
+            self._inflight[uid] -= n
+            if self._inflight[uid] <= 0:
+                del self._inflight[uid]
+        for uid, live_seconds in rows:
+            self._known[uid] = float(live_seconds)
+        metrics.incr("usage.flushes")
+        metrics.observe("usage.flush_users", len(owed))
@@ -0,0 +1,144 @@
+"""
+ClassRec — the Whisper batcher (one Modal request for chunks that arrive together)
+==================================================================================
+
+Every chunk used to be its own POST to Modal. The endpoint runs one request at a
+time per container and at most two containers, so when recordings' chunks land
+within the same second — which at a ten-second cadence and a few dozen sockets
+they routinely do — the third one queues behind the first two at ~1s a place.
+
+Chunks are now handed to one batcher for the whole process. The first to arrive
+opens a window of `window_ms`; whatever arrives from any socket before it closes,
+up to `max_items`, goes to Modal's /batch route as one request, and the GPU
+decodes them in one batched pass. A window that closes holding a single chunk
+sends it to the plain endpoint, exactly as before.
+
+`window_ms` is the cost, paid by every chunk: a few tens of milliseconds against
+a second of round trip. A batch is sent as its own task, so the next window opens
+while the last batch is still on the GPU.
+
+Each caller awaits its own future. A caller that goes away (its socket closed,
+its chunk cancelled) cancels only that future; the batch it was in is sent
+regardless, and its words are dropped.
+
+Reported through metrics:
+    whisper_batcher.batch_items      clips per request (timing)
+    whisper_batcher.requests / batched_requests / items   (counters)
+    whisper_batcher.failed_items     clips the endpoint could not decode (counter)
+"""
+
+import asyncio
+import json
+
+import httpx
+
+import metrics
+from logger import logger
+
+
+class WhisperBatcher:
+    """Clips from every socket, sent to Modal in batches by one task."""
+
+    def __init__(self, client: httpx.AsyncClient, url: str, *,
+                 max_items: int = 8, window_ms: int = 50):
+        self._client    = client
+        self._url       = url
+        self._batch_url = url.rstrip("/") + "/batch"
+        self.max_items  = max_items
+        self.window_ms  = window_ms
+        self._pending: list[tuple[bytes, str, asyncio.Future]] = []
+        self._arrived   = asyncio.Event()
+        self._full      = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._sending: set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop collecting, and cancel batches still waiting on Modal. Called at
+        shutdown, when every socket that was waiting for one has already gone."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._sending):
+            task.cancel()
+        await asyncio.gather(*list(self._sending), return_exceptions=True)
+        for _, _, fut in self._pending:
+            fut.cancel()
+        self._pending.clear()
+
+    async def transcribe(self, audio: bytes, content_type: str = "audio/wav") -> list[dict]:
+        """One clip's words, from whichever request it ends up in."""
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((audio, content_type, fut))
+        self._arrived.set()
+        if len(self._pending) >= self.max_items:
+            self._full.set()
+        return await fut
+
+    async def _run(self) -> None:
+        while True:
+            await self._arrived.wait()
+            # The window opens with the first clip, not on a clock: a clip that
+            # arrives to an idle batcher waits window_ms at most, never more.
+            if len(self._pending) < self.max_items:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.window_ms / 1000)
+                except asyncio.TimeoutError:
+                    pass
+            batch, self._pending = (self._pending[:self.max_items],
+                                    self._pending[self.max_items:])
+            self._full.clear()
+            if not self._pending:
+                self._arrived.clear()
+            batch = [item for item in batch if not item[2].done()]
+            if batch:
+                task = asyncio.create_task(self._send(batch))
+                self._sending.add(task)
+                task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: list[tuple[bytes, str, asyncio.Future]]) -> None:
+        metrics.incr("whisper_batcher.requests")
+        metrics.incr("whisper_batcher.items", len(batch))
+        metrics.observe("whisper_batcher.batch_items", len(batch))
+        try:
+            if len(batch) == 1:
+                audio, content_type, _ = batch[0]
+                response = await self._client.post(
+                    self._url, content=audio, headers={"Content-Type": content_type})
+                response.raise_for_status()
+                results = [response.json()]
+            else:
+                metrics.incr("whisper_batcher.batched_requests")
+                header = json.dumps({"items": [{"size": len(audio), "type": content_type}
+                                               for audio, content_type, _ in batch]})
+                body = b"".join([header.encode(), b"\n", *(audio for audio, _, _ in batch)])
+                response = await self._client.post(
+                    self._batch_url, content=body,
+                    headers={"Content-Type": "application/x-classrec-batch"})
+                response.raise_for_status()
+                results = response.json()
+                if len(results) != len(batch):
+                    raise ValueError(f"batch of {len(batch)} answered with {len(results)}")
+        except Exception as e:
+            # The request as a whole failed: every clip in it failed the same way,
+            # and each caller decides what that means for its own chunk.
+            for _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        for (_, _, fut), words in zip(batch, results):
+            if fut.done():
+                continue                      # its caller has gone
+            if isinstance(words, dict) and "error" in words:
+                metrics.incr("whisper_batcher.failed_items")
+                logger.warning(f"[batcher] clip rejected by the endpoint: {words['error']}")
+                fut.set_exception(RuntimeError(words["error"]))
+            else:
+                fut.set_result(words)
@@ -30,7 +30,8 @@ h1.addEventListener('keydown',e=>{if(e.key==='Enter'){e.preventDefault();h1.blur
 // mock readout so the rail shows live numbers while "recording"
 let tick=null,secs=0,words=0;
 const roT=document.getElementById('roT'),roW=document.getElementById('roW'),
-      roF=document.getElementById('roF'),roL=document.getElementById('roL');
+      roF=document.getElementById('roF'),roL=document.getElementById('roL'),
+      roC=document.getElementById('roC');
 const mmss=s=>String(Math.floor(s/60)).padStart(2,'0')+':'+String(s%60).padStart(2,'0');
 // The mic itself is the whole control: idle → recording → paused → recording → …
 /* Chunks arrive with the session instead of being there from the start, so the
@@ -784,6 +785,7 @@ function resetSession(){
   lastActiveSpan=null; playPauseBtn.textContent='▶';
   secs=0;words=0;
   roT.textContent='00:00';roW.textContent='0';roF.textContent='0';roL.textContent='—';
+  roC.textContent='—';roC.classList.add('dim');
   [roT,roW,roF].forEach(e=>e.classList.add('dim'));
   durTxt.textContent='0 min';   // nothing recorded yet, so say so rather than show a fake clock
   lectureContext='';
@@ -963,8 +965,26 @@ function chunkFor(){
   }
   return liveChunk;
 }
+/* Interim words, per chunk, from `partial` messages: what Whisper has decoded
+   of a chunk before the server has finished with it. Shown in chunk order under
+   the blocks, never inside them -- they are not speaker-filtered or saved, and a
+   chunk's `transcription` (or an empty partial) takes them away. */
+const partials=new Map();
+const interimEl=document.getElementById('interim');
+function renderInterim(){
+  const text=[...partials.keys()].sort((a,b)=>a-b).map(k=>partials.get(k)).join(' ');
+  interimEl.textContent=text;
+  interimEl.hidden=!text;
+}
 function onServer(d){
-  if(d.type==='transcription'){
+  if(d.type==='partial'){
+    if(d.text)partials.set(d.chunk,d.text);else partials.delete(d.chunk);
+    renderInterim();
+  }else if(d.type==='transcription'){
+    if(d.chunk!=null){
+      for(const k of [...partials.keys()])if(k<=d.chunk)partials.delete(k);
+      renderInterim();
+    }
     /* Where the reader is, measured before anything is added -- chunkFor may
        append a whole new block, which moves the bottom. Following the lecture
        means staying stuck to the bottom; reading something further up means
@@ -1003,6 +1023,18 @@ function onServer(d){
        the number, so this costs nothing and cannot be stale by more than a
        chunk. */
     showUsage(d.live_seconds);
+  }else if(d.type==='chunk_duration'){
+    /* How long this recording's chunks are -- the server lengthens them while
+       the transcription backend is slow or queueing and shortens them while it
+       is quick, so this is how far behind the words can drift. */
+    roC.textContent=`${d.seconds}s`;roC.classList.remove('dim');
+  }else if(d.type==='backpressure'){
+    /* The server has as much of this recording in flight as it lets through at
+       once -- usually Modal starting a cold container. Words are late, not lost,
+       unless the server is shedding; either way the page says it is behind
+       rather than looking stalled, and stops saying so when this clears. */
+    B.classList.toggle('behind',!!d.active);
+    B.classList.toggle('shedding',!!d.active&&d.policy==='shed');
   }else if(d.type==='session'){
     /* The row the server opened for this recording. Everything transcribed from
        here lands in it as it arrives, so the lecture is already stored and Save
@@ -1103,6 +1135,8 @@ function endLiveSession(){
   stopCapture();
   if(ws&&ws.readyState===1)ws.close();
   ws=null;live=false;setConn('off','Idle');
+  B.classList.remove('behind','shedding');   // nothing is in flight for a closed socket
+  partials.clear();renderInterim();
   roFill.style.width='0%';
 
   // Build final WAV URL and show player panel — stopRecording() does this too.